@@ -0,0 +1,45 @@
+"""Benchmarks for the split payment service.
+
+Each module is runnable on its own, e.g. ``python -m benchmarks.two_phase_payment``.
+They run against a throwaway test database created from ``DJANGO_SETTINGS_MODULE``
+(``configs.settings`` by default), so production data is never touched.
+"""
+import os
+import contextlib
+
+
+@contextlib.contextmanager
+def django_test_database(keepdb=False):
+    """Configure Django and yield while a migrated test database is active."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "configs.settings")
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    # Never reach the real gateway, whatever the environment says
+    settings.PAYMENT_GATEWAY = "fake"
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+@contextlib.contextmanager
+def fake_gateway(latency):
+    """Route every PaymentProcessor to an in-process FakeGateway that sleeps
+    ``latency`` seconds per charge (``asyncio.sleep`` on the async path)."""
+    from unittest.mock import patch
+
+    from src.gateways import FakeGateway
+
+    gateway = FakeGateway(latency=latency)
+    with patch("src.services.get_gateway", return_value=gateway):
+        yield gateway
@@ -0,0 +1,91 @@
+"""In-flight payments per process: sync DRF view vs ASGI-native async view.
+
+Both views are driven through Django's ASGI handler (``AsyncClient``) with
+``--concurrency`` requests in flight. Under ASGI a sync view runs in the
+single thread-sensitive executor, so every gateway round trip is serialized;
+the async view awaits the gateway and overlaps them. The in-process
+FakeGateway sleeps ``--latency-ms`` (``time.sleep`` on the sync path,
+``asyncio.sleep`` on the async one).
+
+Usage:
+    python -m benchmarks.async_pipeline --requests 500 --concurrency 200 --latency-ms 100
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import django_test_database, fake_gateway
+
+
+def build_urlpatterns():
+    from django.urls import path
+
+    from src.views import AsyncSplitPaymentView, SplitPaymentView
+
+    return [
+        path("sync/", SplitPaymentView.create_split_payment),
+        path("async/", AsyncSplitPaymentView.create_split_payment),
+    ]
+
+
+urlpatterns = []
+
+
+async def drive(client, url, total_requests, concurrency):
+    payload = {
+        "product_id": "prod_bench",
+        "product_name": "Benchmark Product",
+        "amount": 100.0,
+        "payment_method_id": "pm_card_visa",
+        "user_id": "user_bench",
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request():
+        async with semaphore:
+            response = await client.post(url, payload, content_type="application/json")
+            assert response.status_code == 201, response.content
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(total_requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total_requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(total_requests / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    with django_test_database():
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        from django.test.utils import override_settings
+
+        urlpatterns[:] = build_urlpatterns()
+        client = AsyncClient()
+
+        results = {}
+        with fake_gateway(args.latency_ms / 1000), \
+                override_settings(ROOT_URLCONF=__name__):
+            for pipeline in ("sync", "async"):
+                results[pipeline] = async_to_sync(drive)(
+                    client, f"/{pipeline}/", args.requests, args.concurrency
+                )
+
+        results["speedup"] = round(
+            results["async"]["requests_per_second"] / results["sync"]["requests_per_second"], 2
+        )
+        print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""1,000 calls to POST /api/v1/splits/ versus one POST /api/v1/splits/batch/.
+
+Both go through the full Django/DRF stack via the test client, with
+the in-process FakeGateway (``src.gateways``) sleeping ``--latency-ms``
+per charge.
+
+Usage:
+    python -m benchmarks.batch_vs_single --orders 1000 --latency-ms 20
+"""
+import argparse
+import json
+import time
+
+from benchmarks import django_test_database, fake_gateway
+
+
+def payload(index):
+    return {
+        "product_id": f"prod_{index % 50}",
+        "product_name": "Benchmark Product",
+        "amount": 100.0,
+        "payment_method_id": "pm_card_visa",
+        "user_id": f"user_{index % 200}",
+    }
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    with django_test_database():
+        from django.test import Client
+        from django.test.utils import override_settings
+
+        client = Client()
+        payloads = [payload(i) for i in range(args.orders)]
+
+        def single_calls():
+            for data in payloads:
+                response = client.post("/api/v1/splits/", data, content_type="application/json")
+                assert response.status_code == 201, response.content
+
+        def one_batch():
+            response = client.post("/api/v1/splits/batch/", {"orders": payloads}, content_type="application/json")
+            assert response.status_code == 201, response.content
+
+        with fake_gateway(args.latency_ms / 1000), \
+                override_settings(PAYMENT_BATCH_MAX_SIZE=max(args.orders, 1000)):
+            single = timed(single_calls)
+            batch = timed(one_batch)
+
+        print(json.dumps({
+            "config": vars(args),
+            "results": {
+                "single": {"seconds": round(single, 3), "orders_per_second": round(args.orders / single, 1)},
+                "batch": {"seconds": round(batch, 3), "orders_per_second": round(args.orders / batch, 1)},
+                "speedup": round(single / batch, 2),
+            },
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
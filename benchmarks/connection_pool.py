@@ -0,0 +1,148 @@
+"""Connection setup cost per request: a new Postgres connection per request
+(``CONN_MAX_AGE=0`` without a pool, the previous deployment), persistent
+connections per thread (``DB_CONN_MAX_AGE``) and the psycopg pool (``DB_POOL``).
+
+Each request goes through Django's WSGI handler, so connections are opened
+and released by the ``request_started``/``request_finished`` signals as
+under gunicorn. ``--threads`` runs requests concurrently; a pool smaller
+than that shows requests queueing for a connection. Reports, per mode,
+the median and p95 latency, the throughput, the connections opened and,
+for the pool, its wait statistics. ``--connect-only`` skips the view and
+only opens a connection, runs ``SELECT 1`` and releases it.
+
+Needs PostgreSQL (e.g. ``DJANGO_SETTINGS_MODULE`` pointing at a local
+server). Pass ``--host 127.0.0.1`` to measure TCP instead of the Unix socket.
+
+Usage:
+    python -m benchmarks.connection_pool --requests 2000 --threads 8 --pool-size 4
+"""
+import argparse
+import io
+import json
+import statistics
+import threading
+import time
+
+from benchmarks import django_test_database
+
+
+MODES = ("no_pool", "persistent", "pool")
+
+
+def configure(connection, mode, pool_size):
+    """Point every thread's connection at ``mode`` from the next request."""
+    from django.db import connections
+
+    connections.close_all()
+    connection.close_pool()
+    options = connection.settings_dict["OPTIONS"]
+    options.pop("pool", None)
+    connection.settings_dict["CONN_MAX_AGE"] = 0
+    if mode == "persistent":
+        connection.settings_dict["CONN_MAX_AGE"] = 600
+    elif mode == "pool":
+        options["pool"] = {"min_size": pool_size, "max_size": pool_size, "timeout": 30}
+
+
+def wsgi_request(handler, path):
+    from wsgiref.util import setup_testing_defaults
+
+    environ = {"PATH_INFO": path, "REQUEST_METHOD": "GET", "wsgi.input": io.BytesIO()}
+    setup_testing_defaults(environ)
+    response = handler(environ, lambda status, headers: None)
+    body = b"".join(response)
+    # The server's close() sends request_finished, which releases the connection
+    response.close()
+    assert response.status_code == 200, body
+
+
+def connect_only(handler, path):
+    from django.db import close_old_connections, connection
+
+    close_old_connections()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    close_old_connections()
+
+
+def run(mode, connection, request, requests, threads, pool_size):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    configure(connection, mode, pool_size)
+    handler = WSGIHandler()
+    path = "/api/v1/recipients/recipient_1/balance/"
+    request(handler, path)  # warm-up: URLconf, pool opening
+
+    opened = []
+    connection_created.connect(lambda **kwargs: opened.append(1), weak=False, dispatch_uid="bench")
+    per_thread = requests // threads
+    durations = [[] for _ in range(threads)]
+
+    def worker(index):
+        try:
+            for _ in range(per_thread):
+                started = time.perf_counter()
+                request(handler, path)
+                durations[index].append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    connection_created.disconnect(dispatch_uid="bench")
+
+    samples = sorted(duration for thread in durations for duration in thread)
+    result = {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+        "requests_per_second": round(len(samples) / elapsed, 1),
+    }
+    if mode == "pool":
+        stats = connection.pool.get_stats()
+        # Django reports every checkout as a new connection; the pool knows better
+        result["connections_opened"] = stats.get("connections_num", 0)
+        result["pool_requests_queued"] = stats.get("requests_queued", 0)
+        result["pool_wait_ms"] = stats.get("requests_wait_ms", 0)
+    else:
+        result["connections_opened"] = len(opened)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--host", help="Override DATABASES HOST (e.g. 127.0.0.1 for TCP)")
+    parser.add_argument("--connect-only", action="store_true", help="Open a connection and run SELECT 1, no view")
+    args = parser.parse_args()
+
+    with django_test_database() as connection:
+        if connection.vendor != "postgresql":
+            raise SystemExit("connection_pool needs PostgreSQL")
+        if args.host:
+            connection.close()
+            connection.settings_dict["HOST"] = args.host
+
+        request = connect_only if args.connect_only else wsgi_request
+        try:
+            results = {
+                mode: run(mode, connection, request, args.requests, args.threads, args.pool_size)
+                for mode in MODES
+            }
+        finally:
+            # The test database cannot be dropped while the pool holds connections to it
+            configure(connection, "no_pool", args.pool_size)
+
+        print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Throughput and latency of the main endpoints, as JSON for comparing commits.
+
+Seeds ``--orders`` completed orders with ``--rules-per-order`` split rules
+(bulk inserts), then drives ``create_split_payment``, ``get_split_rules``
+and ``list_all``:
+
+* ``client``: in-process through the Django test client, one request at a
+  time, so the numbers are the framework + ORM cost of each endpoint;
+* ``server``: over HTTP against a threaded WSGI server started on a free
+  port, with ``--concurrency`` clients in flight;
+* ``runserver`` and ``gunicorn``: the same over HTTP against
+  ``manage.py runserver`` (the development server, without autoreload)
+  and gunicorn with ``configs/gunicorn.py``, started in subprocesses on
+  the test database (``benchmarks.server``). Their queries are not
+  counted; ``GUNICORN_*`` variables apply as in production.
+
+Payments go through the FakeGateway (``--latency-ms`` per charge). Each
+endpoint reports p50/p95/p99 latency, requests per second, queries per
+request and errors; ``--output`` also writes the report to a file, tagged
+with the current git commit.
+
+Usage:
+    python -m benchmarks.load --orders 100000 --requests 2000 --concurrency 32 --output load.json
+    python -m benchmarks.load --mode runserver gunicorn --requests 2000 --concurrency 32
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import django_test_database, fake_gateway
+from benchmarks.settlement import seed
+
+
+ENDPOINTS = ("create_split_payment", "get_split_rules", "list_all")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(durations, queries, errors, elapsed):
+    return {
+        "requests": len(durations),
+        "errors": errors,
+        "requests_per_second": round(len(durations) / elapsed, 1),
+        "p50_ms": round(percentile(durations, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(durations, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 2),
+        "queries_per_request": round(queries / len(durations), 2),
+    }
+
+
+def request_for(endpoint, index):
+    """``(method, path, json body)`` of the ``index``-th request."""
+    if endpoint == "create_split_payment":
+        return "POST", "/api/v1/splits/", {
+            "product_id": f"prod_{index % 1000}",
+            "product_name": "Benchmark Product",
+            "amount": 100.0,
+            "payment_method_id": "pm_card_visa",
+            "user_id": f"user_{index % 200}",
+        }
+    if endpoint == "get_split_rules":
+        return "GET", f"/api/v1/splits/prod_{index % 1000}/", None
+    return "GET", "/api/v1/splits/all/?page_size=100&count=false", None
+
+
+def expected_status(endpoint):
+    return 201 if endpoint == "create_split_payment" else 200
+
+
+class QueryCounter:
+    """Counts queries on every connection, including the server threads'."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        def add_wrapper(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(add_wrapper, weak=False)
+        for connection in connections.all(initialized_only=True):
+            add_wrapper(None, connection)
+
+
+def run_client(endpoint, total_requests, counter):
+    from django.test import Client
+
+    client = Client()
+    durations, errors = [], 0
+    queries_before = counter.count
+    started = time.perf_counter()
+    for index in range(total_requests):
+        method, path, body = request_for(endpoint, index)
+        request_started = time.perf_counter()
+        if method == "POST":
+            response = client.post(path, body, content_type="application/json")
+        else:
+            response = client.get(path)
+        durations.append(time.perf_counter() - request_started)
+        errors += response.status_code != expected_status(endpoint)
+    elapsed = time.perf_counter() - started
+    return summarize(durations, counter.count - queries_before, errors, elapsed)
+
+
+def start_server():
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler, allow_reuse_address=True)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_process(kind, database_name, latency):
+    """``runserver`` or ``gunicorn`` serving the test database; returns
+    ``(process, base_url)`` once it answers."""
+    import httpx
+
+    port = free_port()
+    address = f"127.0.0.1:{port}"
+    if kind == "runserver":
+        command = [sys.executable, "-m", "benchmarks.server", "runserver", address, "--noreload"]
+    else:
+        command = [
+            sys.executable, "-m", "gunicorn", "-c", "python:configs.gunicorn",
+            "--bind", address, "benchmarks.server:application",
+        ]
+    env = dict(
+        os.environ,
+        BENCHMARK_DATABASE_NAME=database_name,
+        PAYMENT_GATEWAY="fake",
+        FAKE_GATEWAY_LATENCY=str(latency),
+        PAYMENT_PIPELINE="sync",
+    )
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base_url = f"http://{address}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} exited with status {process.returncode}")
+        try:
+            httpx.get(f"{base_url}/api/v1/splits/prod_0/", timeout=1)
+            return process, base_url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{kind} did not start listening on {address}")
+
+
+def stop_process(process):
+    # SIGTERM: both servers finish in-flight requests and close their connections
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_server(base_url, endpoint, total_requests, concurrency, counter):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    with httpx.Client(base_url=base_url, limits=limits, timeout=60) as client:
+        def one_request(index):
+            method, path, body = request_for(endpoint, index)
+            request_started = time.perf_counter()
+            response = client.request(method, path, json=body)
+            return time.perf_counter() - request_started, response.status_code
+
+        queries_before = counter.count
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(one_request, range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+    errors = sum(status != expected_status(endpoint) for _, status in outcomes)
+    return summarize([duration for duration, _ in outcomes], counter.count - queries_before, errors, elapsed)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=10_000)
+    parser.add_argument("--rules-per-order", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients in flight (server mode)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated gateway latency per charge")
+    parser.add_argument(
+        "--mode", nargs="+", choices=("client", "server", "both", "runserver", "gunicorn"), default=["both"],
+        help="both = client + server",
+    )
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with django_test_database() as connection:
+        from django.core.cache import cache
+
+        started = time.perf_counter()
+        seed(connection, args.orders, args.rules_per_order, recipients=1000)
+        seeded = time.perf_counter() - started
+
+        counter = QueryCounter()
+        counter.install()
+        modes = []
+        for mode in args.mode:
+            for name in (("client", "server") if mode == "both" else (mode,)):
+                if name not in modes:
+                    modes.append(name)
+
+        results = {}
+        with fake_gateway(args.latency_ms / 1000):
+            for mode in modes:
+                server = start_server() if mode == "server" else None
+                process = None
+                if mode in ("runserver", "gunicorn"):
+                    process, base_url = start_process(mode, connection.settings_dict["NAME"], args.latency_ms / 1000)
+                results[mode] = {}
+                for endpoint in args.endpoints:
+                    # Every endpoint starts from a cold cache (in this process)
+                    cache.clear()
+                    if server is not None:
+                        host, port = server.server_address[:2]
+                        results[mode][endpoint] = run_server(
+                            f"http://{host}:{port}", endpoint, args.requests, args.concurrency, counter
+                        )
+                    elif process is not None:
+                        results[mode][endpoint] = run_server(
+                            base_url, endpoint, args.requests, args.concurrency, counter
+                        )
+                        # Queries ran in the server processes
+                        results[mode][endpoint]["queries_per_request"] = None
+                    else:
+                        results[mode][endpoint] = run_client(endpoint, args.requests, counter)
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+                if process is not None:
+                    stop_process(process)
+
+        report = {
+            "commit": git_commit(),
+            "database": connection.vendor,
+            "config": vars(args),
+            "seed_seconds": round(seeded, 2),
+            "results": results,
+        }
+        print(json.dumps(report, indent=2))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as output:
+                json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Page latency of GET /api/v1/splits/all/ by depth: offset vs keyset.
+
+Seeds ``--rows`` orders (5M by default) with ``--rules-per-order`` split
+rules each, then times the same page depth through the legacy ``?page=N``
+paginator and through the keyset cursor, with and without the total count.
+On PostgreSQL the seed is a single ``INSERT ... SELECT generate_series``;
+other backends fall back to chunked bulk_create.
+
+Usage:
+    python -m benchmarks.pagination_depth --rows 5000000 --page-size 100
+"""
+import argparse
+import base64
+import json
+import statistics
+import time
+
+from urllib.parse import urlencode
+
+from benchmarks import django_test_database
+
+
+def seed(connection, rows, rules_per_order, chunk_size=50_000):
+    from src.models import Order, SplitRule
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO src_order (product_id, product_name, status, amount, created_at)
+                SELECT 'prod_' || (g % 1000), 'Benchmark Product', 'completed', 100.00,
+                       now() - (g || ' seconds')::interval
+                FROM generate_series(1, %s) AS g
+                """,
+                [rows],
+            )
+            if rules_per_order:
+                cursor.execute(
+                    """
+                    INSERT INTO src_splitrule (order_id, recipient_id, type, value, account_info, effective_date)
+                    SELECT o.id, 'recipient_' || r, 'percentage', 50.00, '{}'::jsonb, o.created_at
+                    FROM src_order o CROSS JOIN generate_series(1, %s) AS r
+                    """,
+                    [rules_per_order],
+                )
+            cursor.execute("ANALYZE src_order")
+            cursor.execute("ANALYZE src_splitrule")
+        return
+
+    for start in range(0, rows, chunk_size):
+        orders = Order.objects.bulk_create([
+            Order(product_id=f"prod_{i % 1000}", product_name="Benchmark Product",
+                  status=Order.COMPLETED, amount=100)
+            for i in range(start, min(start + chunk_size, rows))
+        ])
+        SplitRule.objects.bulk_create([
+            SplitRule(order=order, recipient_id=f"recipient_{r}", type=SplitRule.PERCENTAGE, value=50)
+            for order in orders for r in range(rules_per_order)
+        ])
+
+
+def cursor_for(position):
+    """Encode a KeysetPagination cursor pointing just after ``position``."""
+    return base64.b64encode(urlencode({"p": position}).encode("ascii")).decode("ascii")
+
+
+def median_ms(client, url, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, params)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.content
+    return round(statistics.median(timings), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--rules-per-order", type=int, default=2)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keepdb", action="store_true", help="Reuse an already seeded test database")
+    args = parser.parse_args()
+
+    with django_test_database(keepdb=args.keepdb) as connection:
+        from django.test import Client
+
+        from src.models import Order
+
+        if not Order.objects.exists():
+            started = time.perf_counter()
+            seed(connection, args.rows, args.rules_per_order)
+            print(f"Seeded {args.rows} orders in {time.perf_counter() - started:.1f}s")
+
+        ids = Order.objects.order_by("id").values_list("id", flat=True)
+        total_pages = args.rows // args.page_size
+        depths = sorted({1, 10, 100, 1_000, 10_000, total_pages // 2, total_pages} & set(range(1, total_pages + 1)))
+
+        client = Client()
+        url = "/api/v1/splits/all/"
+        results = []
+        for depth in depths:
+            position = ids[(depth - 1) * args.page_size - 1] if depth > 1 else None
+            keyset_params = {"page_size": args.page_size}
+            if position is not None:
+                keyset_params["cursor"] = cursor_for(position)
+
+            results.append({
+                "page": depth,
+                "offset_ms": median_ms(client, url, {"page": depth, "page_size": args.page_size}, args.repeat),
+                "keyset_ms": median_ms(client, url, keyset_params, args.repeat),
+                "keyset_no_count_ms": median_ms(client, url, dict(keyset_params, count="false"), args.repeat),
+            })
+
+        print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Cost of building and rendering a page of orders: model instances + DRF
+JSONRenderer (previous ``list_all``) vs ``.values()`` rows + FastJSONRenderer.
+
+Seeds ``--orders`` orders with ``--rules-per-order`` split rules (1,000 x 5
+by default, one full page), then for each path reports the median wall
+and CPU time per page, the tracemalloc peak and allocated blocks, and,
+with ``--profile``, the top functions of a cProfile run. The last line
+times the whole ``GET /api/v1/splits/all/`` request through the test client
+in each ``LIST_ALL_MODE`` (the SQL modes only on PostgreSQL) and checks
+that they return the same bytes.
+
+Usage:
+    python -m benchmarks.rendering --orders 1000 --rules-per-order 5 --repeat 20 --profile
+"""
+import argparse
+import cProfile
+import io
+import json
+import pstats
+import statistics
+import time
+import tracemalloc
+
+from benchmarks import django_test_database
+from benchmarks.settlement import seed
+
+
+def instances_page(page_size):
+    """The page as ``list_all`` built it before: prefetched model instances,
+    Decimal rendered as float by DRF's encoder."""
+    from rest_framework.renderers import JSONRenderer
+
+    from src.models import Order
+
+    orders = Order.objects.prefetch_related("split_rules").order_by("id")[:page_size]
+    data = [
+        {
+            "order_id": order.id,
+            "product_id": order.product_id,
+            "product_name": order.product_name,
+            "status": order.status,
+            "amount": order.amount,
+            "split_rules": [
+                {
+                    "recipient_id": rule.recipient_id,
+                    "type": rule.type,
+                    "value": rule.value,
+                    "amount": rule.amount,
+                    "account_info": rule.account_info,
+                    "effective_date": rule.effective_date,
+                }
+                for rule in order.split_rules.all()
+            ],
+        }
+        for order in orders
+    ]
+    return JSONRenderer().render({"results": data})
+
+
+def rows_page(page_size):
+    """The page as ``list_all`` builds it now."""
+    from src.exports import split_rules_by_order
+    from src.models import Order
+    from src.renderers import FastJSONRenderer
+
+    orders = list(Order.objects.values("id", "product_id", "product_name", "status", "amount").order_by("id")[:page_size])
+    rules = split_rules_by_order([order["id"] for order in orders])
+    data = [
+        {
+            "order_id": order["id"],
+            "product_id": order["product_id"],
+            "product_name": order["product_name"],
+            "status": order["status"],
+            "amount": order["amount"],
+            "split_rules": rules.get(order["id"], []),
+        }
+        for order in orders
+    ]
+    return FastJSONRenderer().render({"results": data})
+
+
+PATHS = {"instances": instances_page, "rows": rows_page}
+
+
+def measure(build, page_size, repeat):
+    wall, cpu = [], []
+    for _ in range(repeat):
+        started, cpu_started = time.perf_counter(), time.process_time()
+        body = build(page_size)
+        wall.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - cpu_started)
+
+    tracemalloc.start()
+    build(page_size)
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+
+    return {
+        "wall_ms": round(statistics.median(wall) * 1000, 2),
+        "cpu_ms": round(statistics.median(cpu) * 1000, 2),
+        "peak_kib": round(peak / 1024, 1),
+        "live_blocks_at_end": blocks,
+        "body_bytes": len(body),
+    }
+
+
+def profile(build, page_size, top):
+    profiler = cProfile.Profile()
+    profiler.runcall(build, page_size)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("tottime").print_stats(top)
+    return out.getvalue()
+
+
+def request_timings(connection, page_size, repeat):
+    from django.test import Client, override_settings
+
+    from src.listing import LIST_ALL_MODES
+
+    modes = LIST_ALL_MODES if connection.vendor == "postgresql" else ("rows",)
+    client = Client()
+    timings, bodies = {}, {}
+    for mode in modes:
+        with override_settings(LIST_ALL_MODE=mode):
+            durations = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get("/api/v1/splits/all/", {"page_size": page_size, "count": "false"})
+                durations.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.content
+        timings[mode] = round(statistics.median(durations) * 1000, 2)
+        bodies[mode] = response.content
+    assert len(set(bodies.values())) == 1, "LIST_ALL_MODE changed the response"
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--rules-per-order", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--profile", action="store_true", help="Print the top functions of each path")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    with django_test_database() as connection:
+        seed(connection, args.orders, args.rules_per_order, recipients=1000)
+
+        results = {name: measure(build, args.page_size, args.repeat) for name, build in PATHS.items()}
+        results["list_all_request_ms"] = request_timings(connection, args.page_size, args.repeat)
+
+        print(json.dumps({"database": connection.vendor, "config": vars(args), "results": results}, indent=2))
+        if args.profile:
+            for name, build in PATHS.items():
+                print(f"\n== {name} ==")
+                print(profile(build, args.page_size, args.top))
+
+
+if __name__ == "__main__":
+    main()
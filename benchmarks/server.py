@@ -0,0 +1,29 @@
+"""The WSGI application bound to a benchmark's test database, for servers
+that ``benchmarks.load`` starts in subprocesses (``--mode runserver gunicorn``).
+
+The database name comes from ``BENCHMARK_DATABASE_NAME``; everything else
+from ``DJANGO_SETTINGS_MODULE`` and the environment, as in production.
+
+Usage (started by benchmarks.load):
+    gunicorn -c python:configs.gunicorn benchmarks.server:application
+    python -m benchmarks.server runserver 127.0.0.1:8001 --noreload
+"""
+import os
+import sys
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "configs.settings")
+
+from django.conf import settings  # noqa: E402
+
+# Before django.setup(), so no connection is created with the real name
+settings.DATABASES["default"]["NAME"] = os.environ["BENCHMARK_DATABASE_NAME"]
+
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+
+application = get_wsgi_application()
+
+
+if __name__ == "__main__":
+    from django.core.management import execute_from_command_line
+
+    execute_from_command_line(["manage.py", *sys.argv[1:]])
@@ -0,0 +1,97 @@
+"""Settlement of ``--orders`` x ``--rules-per-order`` split rules (10M by default).
+
+Seeds completed orders whose rules spread over ``--recipients`` recipients,
+runs ``SettlementProcessor.settle`` and reports throughput and the peak
+Python heap (tracemalloc), which should stay flat as the rule count grows
+since only one ``--chunk-size`` id range is held at a time. On PostgreSQL
+the seed is a single ``INSERT ... SELECT generate_series``; other backends
+fall back to chunked bulk_create.
+
+Usage:
+    python -m benchmarks.settlement --orders 5000000 --rules-per-order 2 --chunk-size 5000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks import django_test_database
+
+
+def seed(connection, orders, rules_per_order, recipients, chunk_size=50_000):
+    from src.models import Order, SplitRule
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO src_order (product_id, product_name, status, amount, created_at, earnings_recorded)
+                SELECT 'prod_' || (g %% 1000), 'Benchmark Product', 'completed', 100.00,
+                       now() - (g || ' seconds')::interval, false
+                FROM generate_series(1, %s) AS g
+                """,
+                [orders],
+            )
+            cursor.execute(
+                """
+                INSERT INTO src_splitrule (order_id, recipient_id, type, value, amount, account_info, effective_date)
+                SELECT o.id, 'recipient_' || ((o.id * %s + r) %% %s), 'percentage', 50.00, 50.00,
+                       '{}'::jsonb, o.created_at
+                FROM src_order o CROSS JOIN generate_series(1, %s) AS r
+                """,
+                [rules_per_order, recipients, rules_per_order],
+            )
+            cursor.execute("ANALYZE src_order")
+            cursor.execute("ANALYZE src_splitrule")
+        return
+
+    for start in range(0, orders, chunk_size):
+        created = Order.objects.bulk_create([
+            Order(product_id=f"prod_{i % 1000}", product_name="Benchmark Product",
+                  status=Order.COMPLETED, amount=100)
+            for i in range(start, min(start + chunk_size, orders))
+        ])
+        SplitRule.objects.bulk_create([
+            SplitRule(order=order, recipient_id=f"recipient_{(order.id * rules_per_order + r) % recipients}",
+                      type=SplitRule.PERCENTAGE, value=50, amount=50)
+            for order in created for r in range(1, rules_per_order + 1)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5_000_000)
+    parser.add_argument("--rules-per-order", type=int, default=2)
+    parser.add_argument("--recipients", type=int, default=10_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with django_test_database() as connection:
+        from src.settlement import SettlementProcessor
+
+        started = time.perf_counter()
+        seed(connection, args.orders, args.rules_per_order, args.recipients)
+        seeded = time.perf_counter() - started
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        run = SettlementProcessor(chunk_size=args.chunk_size).settle()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(json.dumps({
+            "config": vars(args),
+            "results": {
+                "seed_seconds": round(seeded, 1),
+                "rules_settled": run.rules_settled,
+                "payouts": run.payouts.count(),
+                "seconds": round(elapsed, 1),
+                "rules_per_second": round(run.rules_settled / elapsed),
+                "peak_python_heap_mb": round(peak / 2**20, 1),
+            },
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
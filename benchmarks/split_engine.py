@@ -0,0 +1,116 @@
+"""Split computation for a payment batch: naive Decimal loop vs src.splits.
+
+Compares, for ``--orders`` orders with a fixed fee plus ``--recipients``
+percentage rules each:
+
+* ``decimal_loop``: the straightforward per-order ``Decimal`` loop,
+  quantizing each share and pushing the rounding difference onto the
+  last recipient;
+* ``compute_split``: the integer engine called once per order;
+* ``compute_splits``: what the batch endpoint runs, rule objects to padded
+  arrays and one vectorized NumPy call for all orders;
+* ``compute_splits_batch``: the vectorized call alone, on prebuilt arrays.
+
+No database is needed.
+
+Usage:
+    python -m benchmarks.split_engine --orders 100000 --recipients 4
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from decimal import ROUND_HALF_UP, Decimal
+
+
+def rule_sets(orders, recipients, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(orders):
+        amount = rng.randint(1_000, 5_000_000)
+        fee = rng.choice([0, 99, 250])
+        cuts = sorted(rng.randint(0, 10_000) for _ in range(recipients - 1))
+        bps = [b - a for a, b in zip([0] + cuts, cuts + [10_000])]
+        rows.append((amount, fee, bps))
+    return rows
+
+
+def decimal_loop(rows):
+    cent = Decimal("0.01")
+    results = []
+    for amount, fee, bps in rows:
+        total = Decimal(amount) / 100
+        fixed = Decimal(fee) / 100
+        remainder = total - fixed
+        shares = [
+            (remainder * Decimal(points) / Decimal(10_000)).quantize(cent, rounding=ROUND_HALF_UP)
+            for points in bps
+        ]
+        shares[-1] += remainder - sum(shares)
+        results.append([fixed] + shares)
+    return results
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--recipients", type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "configs.settings")
+    import django
+    django.setup()
+
+    import numpy as np
+
+    from src.models import SplitRule
+    from src.splits import Rule, compute_split, compute_splits, compute_splits_batch, from_cents
+
+    rows = rule_sets(args.orders, args.recipients)
+    rules = [
+        [Rule("fee", SplitRule.FIXED, from_cents(fee))] + [
+            Rule(f"r{i}", SplitRule.PERCENTAGE, Decimal(points) / 100) for i, points in enumerate(bps)
+        ]
+        for _, fee, bps in rows
+    ]
+    amounts = [amount for amount, _, _ in rows]
+
+    def engine_loop():
+        return [compute_split(amount, order_rules) for amount, order_rules in zip(amounts, rules)]
+
+    def engine_batch():
+        amounts = np.array([amount for amount, _, _ in rows], dtype=np.int64)
+        fixed = np.zeros((len(rows), args.recipients + 1), dtype=np.int64)
+        fixed[:, 0] = [fee for _, fee, _ in rows]
+        bps = np.zeros_like(fixed)
+        bps[:, 1:] = [row_bps for _, _, row_bps in rows]
+        return compute_splits_batch(amounts, fixed, bps)
+
+    naive, _ = timed(decimal_loop, rows)
+    single, expected = timed(engine_loop)
+    batch_rules, from_rules = timed(compute_splits, amounts, rules)
+    batch, result = timed(engine_batch)
+    assert result.tolist() == expected == from_rules
+
+    print(json.dumps({
+        "config": vars(args),
+        "results": {
+            "decimal_loop": {"seconds": round(naive, 3), "orders_per_second": round(args.orders / naive)},
+            "compute_split": {"seconds": round(single, 3), "orders_per_second": round(args.orders / single)},
+            "compute_splits": {"seconds": round(batch_rules, 3), "orders_per_second": round(args.orders / batch_rules)},
+            "compute_splits_batch": {"seconds": round(batch, 3), "orders_per_second": round(args.orders / batch)},
+            "batch_speedup_vs_compute_split": round(single / batch_rules, 1),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
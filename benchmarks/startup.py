@@ -0,0 +1,157 @@
+"""Cold start and memory of a worker per settings profile: the full
+``configs.settings`` vs the API-only ``configs.settings_api``.
+
+Each run is a fresh interpreter (``python -X importtime``) that does what a
+worker does before its first request: ``django.setup()``, builds the WSGI
+application and loads the URLconf (with its views). Reports, per profile,
+the median boot time, the resident memory (RSS) after boot, the number of
+modules loaded, which of the optional packages were imported and the
+packages with the most import time during the boot.
+
+The payment gateway's client (stripe) is not imported at boot but by the
+first payment, or once in gunicorn's master with ``preload_app``
+(``configs/gunicorn.py``); ``gateway_import_ms`` and ``gateway_rss_mib``
+are that deferred cost, for ``PAYMENT_GATEWAY`` (stripe by default).
+
+Nothing connects to the database, so it runs without one.
+
+Usage:
+    python -m benchmarks.startup --repeat 10
+    python -m benchmarks.startup --settings configs.settings configs.settings_api --top 15
+"""
+import argparse
+import collections
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+
+WATCHED = ("stripe", "drf_yasg", "log_hub", "django.contrib.admin", "django.contrib.sessions", "django.contrib.messages")
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Written to stderr between the boot's imports and the gateway's
+BOOT_DONE = "-- boot done --"
+
+
+def boot():
+    """Runs in the child interpreter; prints its measurements as JSON."""
+    started = time.perf_counter()
+
+    import django
+    django.setup()
+
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import get_resolver
+
+    get_wsgi_application()
+    get_resolver().url_patterns  # what the first request would load
+    elapsed = time.perf_counter() - started
+    measurements = {
+        "boot_ms": elapsed * 1000,
+        "rss_kib": rss_kib(),
+        "modules": len(sys.modules),
+        "imported": [name for name in WATCHED if name in sys.modules],
+    }
+
+    # Deferred to the first payment, or to the master with gunicorn's preload
+    print(BOOT_DONE, file=sys.stderr, flush=True)
+    from src.gateways import preload_gateway
+
+    started = time.perf_counter()
+    preload_gateway()
+    measurements["gateway_import_ms"] = (time.perf_counter() - started) * 1000
+    measurements["gateway_rss_kib"] = rss_kib() - measurements["rss_kib"]
+    print(json.dumps(measurements))
+
+
+def rss_kib():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+
+    # Peak rather than current; KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def packages(importtime_output):
+    """Import time (ms) of the boot per top-level package."""
+    totals = collections.Counter()
+    for line in importtime_output.splitlines():
+        if line == BOOT_DONE:
+            break
+        match = IMPORT_TIME.match(line)
+        if match:
+            # Self time, so nested imports are not counted twice
+            totals[match.group(4).split(".")[0]] += int(match.group(1)) / 1000
+    return totals
+
+
+def measure(settings_module, repeat):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    env.setdefault("DJANGO_SECRET_KEY", "startup-benchmark")
+    runs, imports = [], collections.Counter()
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "benchmarks.startup", "--child"],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        imports.update(packages(completed.stderr))
+    return runs, {name: total / repeat for name, total in imports.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--settings", nargs="+", default=["configs.settings", "configs.settings_api"])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="Packages listed by import time")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        boot()
+        return
+
+    results = {}
+    for settings_module in args.settings:
+        runs, imports = measure(settings_module, args.repeat)
+        results[settings_module] = {
+            "boot_ms": round(statistics.median(run["boot_ms"] for run in runs), 1),
+            "import_ms": round(sum(imports.values()), 1),
+            "rss_mib": round(statistics.median(run["rss_kib"] for run in runs) / 1024, 1),
+            "modules": runs[0]["modules"],
+            "imported": runs[0]["imported"],
+            "gateway_import_ms": round(statistics.median(run["gateway_import_ms"] for run in runs), 1),
+            "gateway_rss_mib": round(statistics.median(run["gateway_rss_kib"] for run in runs) / 1024, 1),
+            "top_imports_ms": {
+                name: round(total, 1) for name, total in sorted(imports.items(), key=lambda item: -item[1])[:args.top]
+            },
+        }
+
+    report = {"config": {"repeat": args.repeat}, "results": results}
+    if len(args.settings) > 1:
+        first, *others = args.settings
+        report["saved"] = {
+            other: {
+                "boot_ms": round(results[first]["boot_ms"] - results[other]["boot_ms"], 1),
+                "rss_mib": round(results[first]["rss_mib"] - results[other]["rss_mib"], 1),
+                "modules": results[first]["modules"] - results[other]["modules"],
+            }
+            for other in others
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
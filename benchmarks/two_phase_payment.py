@@ -0,0 +1,151 @@
+"""Concurrent throughput of PaymentProcessor against the psycopg pool that
+ships (``OPTIONS["pool"]``, ``DB_POOL``), per payment flow:
+
+* ``legacy``: one transaction around the order insert, the gateway call and
+  the split rules (before the two-phase flow);
+* ``held``: the two-phase flow with the connection kept checked out during
+  the gateway call;
+* ``released``: the two-phase flow giving the connection back to the pool
+  before the gateway call (``PaymentProcessor._release_connection``).
+
+The in-process FakeGateway (``src.gateways``) sleeps for ``--latency-ms``;
+``--concurrency`` threads share a pool of ``--pool-size`` connections, so
+a flow that holds its connection through the gateway call is capped at
+pool size / latency. Reports, per flow, the throughput and the time spent
+waiting for a pooled connection.
+
+Needs PostgreSQL (e.g. ``DJANGO_SETTINGS_MODULE`` pointing at a local server).
+
+Usage:
+    python -m benchmarks.two_phase_payment --requests 400 --concurrency 50 --pool-size 10
+"""
+import argparse
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import django_test_database, fake_gateway
+from benchmarks.connection_pool import configure
+
+
+def legacy_processor_class():
+    """PaymentProcessor as it was before the two-phase flow: one transaction
+    wrapped around the order insert, the gateway call and the split rules."""
+    from django.db import transaction
+
+    from src.models import Order, SplitRule
+    from src.services import PaymentProcessor
+
+    class LegacyPaymentProcessor(PaymentProcessor):
+        def process_payment(self, order_data):
+            self._validate_payment(order_data)
+            with transaction.atomic():
+                order = Order.objects.create(
+                    product_id=order_data["product_id"],
+                    product_name=order_data.get("product_name", ""),
+                    amount=order_data.get("amount", 100.00)
+                )
+                payment_intent = self._charge(order, order_data)
+                user_percentage = 100 - self.CAKTO_FEE_PERCENTAGE
+                for recipient_id, value in (
+                    (order_data["user_id"], user_percentage),
+                    (self.CAKTO_RECIPIENT_ID, self.CAKTO_FEE_PERCENTAGE),
+                ):
+                    SplitRule.objects.create(
+                        order=order, recipient_id=recipient_id,
+                        type=SplitRule.PERCENTAGE, value=value,
+                    )
+                order.status = Order.COMPLETED
+                order.stripe_payment_id = payment_intent.id
+                order.save()
+                return order
+
+    return LegacyPaymentProcessor
+
+
+def held_processor_class():
+    """The two-phase flow keeping its connection during the gateway call."""
+    from src.services import PaymentProcessor
+
+    class HeldConnectionPaymentProcessor(PaymentProcessor):
+        def _release_connection(self):
+            pass
+
+    return HeldConnectionPaymentProcessor
+
+
+def run(processor_class, connection, total_requests, concurrency):
+    from django.db import connections
+
+    order_data = {
+        "product_id": "prod_bench",
+        "product_name": "Benchmark Product",
+        "amount": 100.0,
+        "payment_method_id": "pm_card_visa",
+        "user_id": "user_bench",
+    }
+
+    def one_payment(_):
+        try:
+            processor_class().process_payment(order_data)
+        finally:
+            # What request_finished does: the connection goes back to the pool
+            connections.close_all()
+
+    one_payment(None)  # warm-up: pool opening, split configuration
+    stats_before = connection.pool.get_stats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_payment, range(total_requests)))
+    elapsed = time.perf_counter() - started
+    stats = connection.pool.get_stats()
+
+    return {
+        "requests": total_requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(total_requests / elapsed, 1),
+        "pool_requests_queued": stats.get("requests_queued", 0) - stats_before.get("requests_queued", 0),
+        "pool_wait_ms": stats.get("requests_wait_ms", 0) - stats_before.get("requests_wait_ms", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    with django_test_database() as connection:
+        if connection.vendor != "postgresql":
+            raise SystemExit("two_phase_payment needs PostgreSQL")
+        from src.services import PaymentProcessor
+
+        flows = {
+            "legacy": legacy_processor_class(),
+            "held": held_processor_class(),
+            "released": PaymentProcessor,
+        }
+        results = {}
+        configure(connection, "pool", args.pool_size)
+        # The legacy flow queues for long; do not time the waits out
+        connection.settings_dict["OPTIONS"]["pool"]["timeout"] = 600
+        try:
+            with fake_gateway(args.latency_ms / 1000):
+                for name, processor_class in flows.items():
+                    results[name] = run(processor_class, connection, args.requests, args.concurrency)
+        finally:
+            # The test database cannot be dropped while the pool holds connections to it
+            configure(connection, "no_pool", args.pool_size)
+
+        results["speedup"] = {
+            name: round(results[name]["requests_per_second"] / results["legacy"]["requests_per_second"], 2)
+            for name in ("held", "released")
+        }
+        print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Gunicorn config for the production server.
+
+    gunicorn -c python:configs.gunicorn
+
+Serves configs.wsgi with threaded workers, or configs.asgi with uvicorn
+workers when PAYMENT_PIPELINE=async. Workers and threads scale with the
+CPUs available to the process; every value can be overridden through the
+GUNICORN_* variables below (or the usual command-line flags).
+
+Signals to the master: HUP restarts the workers gracefully (in-flight
+requests finish within graceful_timeout). With preload_app the code is
+imported once by the master, so HUP does not pick up new code: restart
+the container, or send USR2 and then QUIT to the old master.
+"""
+
+import os
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))  # honours taskset/cpusets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+CPUS = _cpus()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8001')
+
+# One process per core (+1 to cover a worker blocked on the GIL or on
+# I/O); threads overlap the DB and gateway waits inside each process.
+# A payment gives its pooled connection back during the gateway call,
+# so threads can exceed DB_POOL_MAX_SIZE; each process has its own pool:
+# keep workers x DB_POOL_MAX_SIZE under Postgres' max_connections.
+workers = int(os.getenv('GUNICORN_WORKERS', CPUS + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+if os.getenv('PAYMENT_PIPELINE', 'sync') == 'async':
+    # The whole app is served over ASGI. Streaming responses must use
+    # async iterators (the export does, src.exports.aexport_lines): Django
+    # reads a sync one whole into memory before sending it
+    wsgi_app = 'configs.asgi:application'
+    worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+else:
+    wsgi_app = 'configs.wsgi:application'
+    worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Seconds an idle client connection stays open. Above the idle timeout of
+# the load balancer in front, so the balancer is the one closing it.
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 75))
+# Seconds without a heartbeat before the master kills a worker; gthread
+# workers keep beating while a slow request (e.g. a batch) runs
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Replace each worker after this many requests (spread by the jitter so
+# they do not restart together), bounding slow leaks and fragmentation
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Import Django once in the master: workers fork ready to serve and share
+# its memory pages. Logging queues restart their listener after fork
+# (src.logs.QueueLogHandler).
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None  # '-' for stdout; off by default
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+# Worker heartbeat files in memory rather than on the container's disk
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def when_ready(server):
+    # Load in the master what each worker would otherwise load on its first
+    # requests: the URLconf with the views, and the gateway client (stripe)
+    if not server.cfg.preload_app:
+        return
+    from django.urls import get_resolver
+    from src.gateways import preload_gateway
+
+    get_resolver().url_patterns
+    preload_gateway()
+
+
+def pre_fork(server, worker):
+    # Connections opened in the master (e.g. while preloading) would be
+    # shared by every worker; leave none, nor a pool whose threads do not
+    # survive the fork
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        pools = getattr(type(connection), '_connection_pools', {})
+        if connection.alias in pools:
+            pools.pop(connection.alias).close()
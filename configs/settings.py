@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from json_log_formatter import JSONFormatter
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django_prometheus.middleware.PrometheusBeforeMiddleware",
+    "src.profiling.RequestBudgetMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,14 +87,42 @@ WSGI_APPLICATION = 'configs.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# psycopg connection pool per process (DB_POOL=true, the default): requests
+# borrow an open connection instead of paying TCP + auth each time. Size
+# DB_POOL_MAX_SIZE for the concurrent requests of one process (threads,
+# outbox handlers) and keep workers x DB_POOL_MAX_SIZE under Postgres'
+# max_connections. Without the pool, DB_CONN_MAX_AGE keeps each thread's
+# connection open for that many seconds (0 closes it after every request).
+DB_POOL = os.getenv('DB_POOL', 'true').lower() in ('1', 'true', 'yes')
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))  # connections kept open
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))  # seconds waiting for a free connection before failing
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 10 * 60))  # seconds before an idle extra connection is closed
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 60 * 60))  # seconds before a connection is replaced
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))  # seconds, only without the pool
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
-        'HOST': 'db',
-        'PORT': '5432',
+        'HOST': os.getenv('POSTGRES_HOST', 'db'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        # The pool hands out connections per request; Django refuses to
+        # combine it with persistent connections
+        'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+        # Checks a reused connection before handing it out (pooled or persistent)
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': DB_POOL_MIN_SIZE,
+                'max_size': DB_POOL_MAX_SIZE,
+                'timeout': DB_POOL_TIMEOUT,
+                'max_idle': DB_POOL_MAX_IDLE,
+                'max_lifetime': DB_POOL_MAX_LIFETIME,
+            },
+        } if DB_POOL else {},
     }
 }
 
@@ -141,6 +171,89 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 
+# Adapter from src/gateways.py: "stripe" or "fake" (in-process, no network;
+# always used by manage.py test)
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "stripe")
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", 3))  # seconds
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", 20))  # seconds
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", os.getenv("PAYMENT_BATCH_MAX_WORKERS", 32)))  # kept-alive connections
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", 2))  # transient errors only
+STRIPE_RETRY_BASE = float(os.getenv("STRIPE_RETRY_BASE", 0.5))  # seconds, doubled per attempt
+STRIPE_RETRY_MAX = float(os.getenv("STRIPE_RETRY_MAX", 4))  # seconds
+PAYMENT_GATEWAY_BREAKER_FAILURES = int(os.getenv("PAYMENT_GATEWAY_BREAKER_FAILURES", 5))  # consecutive failures
+PAYMENT_GATEWAY_BREAKER_RESET = float(os.getenv("PAYMENT_GATEWAY_BREAKER_RESET", 30))  # seconds open before a trial call
+FAKE_GATEWAY_LATENCY = float(os.getenv("FAKE_GATEWAY_LATENCY", 0))  # seconds per simulated call
+
+TEST_RUNNER = "src.testing.OfflineTestRunner"
+
+# Payment pipeline: "sync" (WSGI, DRF views) or "async" (ASGI-native views)
+PAYMENT_PIPELINE = os.getenv("PAYMENT_PIPELINE", "sync")
+
+# POST /api/v1/splits/batch/
+PAYMENT_BATCH_MAX_SIZE = int(os.getenv("PAYMENT_BATCH_MAX_SIZE", 1000))
+PAYMENT_BATCH_MAX_WORKERS = int(os.getenv("PAYMENT_BATCH_MAX_WORKERS", 32))  # concurrent gateway calls
+
+# Idempotency-Key support for POST /api/v1/splits/
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))  # seconds
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10_000))
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 30))  # seconds
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 5 * 60))  # seconds
+
+# Outbox worker (manage.py run_outbox_worker)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", 4))  # handler threads
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", 2))  # seconds, doubled per attempt
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", 10 * 60))  # seconds
+OUTBOX_LEASE = int(os.getenv("OUTBOX_LEASE", 5 * 60))  # seconds a claimed batch stays invisible
+
+# Cache framework; set DJANGO_CACHE_BACKEND to the filebased backend
+# (DJANGO_CACHE_LOCATION=/var/tmp/django_cache) to share entries between workers
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django_prometheus.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'split-payments'),
+    }
+}
+
+# Read-through cache for GET /api/v1/splits/<product_id>/
+SPLIT_RULES_CACHE_ALIAS = os.getenv('SPLIT_RULES_CACHE_ALIAS', 'default')
+SPLIT_RULES_CACHE_TTL = int(os.getenv('SPLIT_RULES_CACHE_TTL', 5 * 60))  # seconds
+
+# Per-process cache of the active SplitConfiguration (platform fee)
+SPLIT_CONFIGURATION_CACHE_ALIAS = os.getenv('SPLIT_CONFIGURATION_CACHE_ALIAS', 'default')  # holds the version counter
+SPLIT_CONFIGURATION_MAX_AGE = int(os.getenv('SPLIT_CONFIGURATION_MAX_AGE', 60))  # seconds before a forced reload
+
+# Recipient earnings endpoints (served from RecipientDailyEarning)
+RECIPIENT_EARNINGS_DEFAULT_DAYS = int(os.getenv('RECIPIENT_EARNINGS_DEFAULT_DAYS', 30))
+RECIPIENT_EARNINGS_MAX_DAYS = int(os.getenv('RECIPIENT_EARNINGS_MAX_DAYS', 366))
+
+# How GET /api/v1/splits/all/ reads a page (src/listing.py): rows, json_agg or
+# prebuilt; the last two are PostgreSQL-only and fall back to rows elsewhere
+LIST_ALL_MODE = os.getenv('LIST_ALL_MODE', 'rows')
+
+# Per-request budgets by URL name (src.profiling.RequestBudgetMiddleware).
+# Requests over any limit are logged with their SQL; REQUEST_BUDGETS (JSON)
+# overrides or adds entries, e.g. '{"get_split_rules": {"queries": 2}}'
+REQUEST_BUDGETS = {
+    'create_split': {'queries': 12, 'db_ms': 100, 'total_ms': 2000},
+    'list_all_splits': {'queries': 3, 'db_ms': 250, 'total_ms': 500},
+    'get_split_rules': {'queries': 2, 'db_ms': 20, 'total_ms': 100},
+    'recipient_balance': {'queries': 1, 'db_ms': 20, 'total_ms': 100},
+    'recipient_daily_earnings': {'queries': 1, 'db_ms': 20, 'total_ms': 100},
+}
+REQUEST_BUDGETS.update(json.loads(os.getenv('REQUEST_BUDGETS', '{}')))
+REQUEST_PROFILE_MAX_STATEMENTS = int(os.getenv('REQUEST_PROFILE_MAX_STATEMENTS', 50))  # SQL kept per request for the log
+
+
+# Loggers only enqueue records; a background thread formats them and writes
+# the rotating files and the console (src.logs.QueueLogHandler)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # DEBUG also logs every SQL statement when DEBUG=True
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10_000))  # records; a full queue drops instead of blocking
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 50 * 1024 * 1024))  # per file before rotating
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+# Fraction of the records below WARNING kept per logger, e.g. '{"django.db.backends": 0.01}'
+LOG_SAMPLE_RATES = json.loads(os.getenv('LOG_SAMPLE_RATES', '{"django.db.backends": 0.01}'))
 
 LOGGING = {
     'version': 1,
@@ -150,17 +263,27 @@ LOGGING = {
             '()': JSONFormatter,
         },
     },
+    'filters': {
+        'sampling': {
+            '()': 'src.logs.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
+    },
     'handlers': {
         'info_file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.path.join(BASE_DIR, 'log/info.log'),
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
             'formatter': 'json',
         },
         'error_file': {
             'level': 'ERROR',
-            'class': 'logging.FileHandler',
+            'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.path.join(BASE_DIR, 'log/error.log'),
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
             'formatter': 'json',
         },
         'console': {
@@ -168,17 +291,33 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'json',
         },
+        'queue': {
+            '()': 'src.logs.QueueLogHandler',
+            'handlers': ['console', 'info_file', 'error_file'],
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling'],
+        },
+        'queue_errors': {
+            '()': 'src.logs.QueueLogHandler',
+            'handlers': ['error_file'],
+            'maxsize': LOG_QUEUE_SIZE,
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'info_file', 'error_file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': True,
         },
         'django.request': {
-            'handlers': ['error_file'],
+            'handlers': ['queue_errors'],
             'level': 'ERROR',
             'propagate': False,
         },
+        'src': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
@@ -0,0 +1,49 @@
+"""
+Settings for API-only workers: the payment, split and recipient endpoints
+and /metrics, without the admin, sessions, messages, Swagger (drf_yasg)
+and log_hub, which the API path never uses. Workers start faster and
+use less memory.
+
+    DJANGO_SETTINGS_MODULE=configs.settings_api gunicorn -c python:configs.gunicorn
+
+Swagger, /admin/ and /logs/ are served by a separate deployment on
+configs.settings, which is also the one that runs migrate (the admin
+and session tables belong to it).
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+API_EXCLUDED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'drf_yasg',
+    'log_hub',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS]
+
+# Sessions and messages are gone; DRF authenticates from the request itself
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    )
+]
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            'context_processors': [
+                processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if processor != 'django.contrib.messages.context_processors.messages'
+            ],
+        },
+    },
+]
+
+ROOT_URLCONF = 'configs.urls_api'
@@ -0,0 +1,12 @@
+"""
+URL configuration of the API-only profile (configs.settings_api): the API
+and the Prometheus metrics, without /admin/, /logs/ or Swagger.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('', include('src.urls')),
+
+    # Django - Prometheus
+    path('', include("django_prometheus.urls")),
+]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SrcConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'src'
+
+    def ready(self):
+        # Registers the signal receivers (cache invalidation, payout hooks)
+        from . import events  # noqa: F401
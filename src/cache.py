@@ -0,0 +1,78 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .metrics import split_rules_cache_evictions, split_rules_cache_hits, split_rules_cache_misses
+
+
+def compute_etag(payload):
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), cls=DjangoJSONEncoder)
+    return '"%s"' % hashlib.sha1(body.encode()).hexdigest()
+
+
+def etag_matches(etag, if_none_match):
+    """Weak comparison of an If-None-Match header against ``etag``."""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in (value.removeprefix("W/") for value in candidates)
+
+
+class SplitRulesCache:
+    """Read-through cache for the GET /api/v1/splits/<product_id>/ payload.
+
+    Entries are keyed by UPPER(product_id), matching the case-insensitive
+    lookup, and store the payload with its ETag. Payment and split-rule
+    events drop the entry once their transaction commits; the TTL bounds
+    staleness for writes that bypass signals (bulk_create, raw updates).
+    Missing products are not cached.
+    """
+
+    key_prefix = "split-rules"
+
+    def __init__(self, alias=None, ttl=None):
+        self.alias = alias or settings.SPLIT_RULES_CACHE_ALIAS
+        self.ttl = ttl if ttl is not None else settings.SPLIT_RULES_CACHE_TTL
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, product_id):
+        digest = hashlib.sha1(product_id.upper().encode()).hexdigest()
+        return f"{self.key_prefix}:{digest}"
+
+    def get_or_load(self, product_id, loader):
+        """Return ``(payload, etag)``, or None when ``loader`` finds nothing."""
+        key = self.key(product_id)
+        entry = self.cache.get(key)
+        if entry is not None:
+            split_rules_cache_hits.inc()
+            return entry
+
+        split_rules_cache_misses.inc()
+        payload = loader(product_id)
+        if payload is None:
+            return None
+
+        entry = (payload, compute_etag(payload))
+        self.cache.set(key, entry, self.ttl)
+        return entry
+
+    def invalidate(self, product_id, reason):
+        """Drop the entry after the current transaction commits, so a
+        concurrent reader cannot cache the pre-commit rows again."""
+        key = self.key(product_id)
+
+        def delete():
+            self.cache.delete(key)
+            split_rules_cache_evictions.labels(reason=reason).inc()
+
+        transaction.on_commit(delete)
+
+
+split_rules_cache = SplitRulesCache()
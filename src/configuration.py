@@ -0,0 +1,114 @@
+import threading
+import time
+
+from bisect import bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SplitConfiguration
+
+
+FeeConfiguration = namedtuple("FeeConfiguration", ["recipient_id", "fee_percentage"])
+
+
+class ConfigurationIndex:
+    """Sorted, non-overlapping intervals of the configuration in force.
+
+    Overlapping configurations are flattened at build time (the one with
+    the latest ``effective_from`` wins), so a lookup is a single bisect.
+    """
+
+    def __init__(self, configurations):
+        configurations = sorted(configurations, key=lambda config: (config.effective_from, config.pk))
+        bounds = sorted(
+            {config.effective_from for config in configurations}
+            | {config.effective_until for config in configurations if config.effective_until}
+        )
+
+        self.starts, self.values = [], []
+        for index, start in enumerate(bounds):
+            end = bounds[index + 1] if index + 1 < len(bounds) else None
+            value = None
+            for config in configurations:
+                if config.effective_from > start:
+                    break
+                if config.effective_until is None or (end is not None and config.effective_until >= end):
+                    value = FeeConfiguration(config.recipient_id, config.fee_percentage)
+            if self.values and self.values[-1] == value:
+                continue
+            self.starts.append(start)
+            self.values.append(value)
+
+    def at(self, when):
+        position = bisect_right(self.starts, when) - 1
+        return self.values[position] if position >= 0 else None
+
+
+class SplitConfigurationCache:
+    """Per-process copy of the active SplitConfiguration rows.
+
+    Every process keeps its own ConfigurationIndex, so resolving the fee
+    on the payment path costs a cache read, not a query. Saving a
+    configuration bumps a version counter in the Django cache (see
+    ``src.events``); a process reloads when it sees a new version, and
+    at least every ``max_age`` seconds in case the cache is not shared
+    between processes (locmem).
+    """
+
+    version_key = "split-configuration:version"
+
+    def __init__(self, alias=None, max_age=None):
+        self.alias = alias or settings.SPLIT_CONFIGURATION_CACHE_ALIAS
+        self.max_age = max_age if max_age is not None else settings.SPLIT_CONFIGURATION_MAX_AGE
+        self._index = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def current(self, when=None):
+        """The FeeConfiguration in force at ``when`` (default: now), or None."""
+        return self._get_index().at(when or timezone.now())
+
+    def invalidate(self):
+        """Bump the shared version once the transaction commits, so every
+        process reloads on its next lookup."""
+        def bump():
+            try:
+                self.cache.incr(self.version_key)
+            except ValueError:
+                if not self.cache.add(self.version_key, 1, timeout=None):
+                    self.cache.incr(self.version_key)
+            self.clear()
+
+        transaction.on_commit(bump)
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+
+    def _get_index(self):
+        version = self.cache.get(self.version_key, 0)
+        index = self._index
+        if index is not None and version == self._version and not self._expired():
+            return index
+
+        with self._lock:
+            if self._index is None or version != self._version or self._expired():
+                self._index = ConfigurationIndex(SplitConfiguration.objects.filter(is_active=True))
+                self._version = version
+                self._loaded_at = time.monotonic()
+            return self._index
+
+    def _expired(self):
+        return time.monotonic() - self._loaded_at > self.max_age
+
+
+split_configuration = SplitConfigurationCache()
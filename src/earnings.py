@@ -0,0 +1,127 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, RecipientDailyEarning, SplitRule
+
+
+def parse_day(value):
+    """A ``YYYY-MM-DD`` query parameter as a date; raises ValueError."""
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValueError(f"Invalid date: {value!r} (expected YYYY-MM-DD)")
+    return day
+
+
+def record_order_earnings(order_id, split_rules):
+    """Add an order's split amounts to the daily rollup, once.
+
+    ``split_rules`` are the ``payout_triggered`` payload entries. The
+    ``earnings_recorded`` flag is flipped in the same transaction as the
+    increments, so a redelivered event is a no-op. Returns False when the
+    order was already recorded.
+    """
+    increments = defaultdict(lambda: [Decimal("0"), 0])
+    for rule in split_rules:
+        if rule.get("amount") is None:
+            continue
+        day = timezone.localdate(parse_datetime(rule["effective_date"]))
+        increment = increments[(rule["recipient_id"], day)]
+        increment[0] += Decimal(rule["amount"])
+        increment[1] += 1
+
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, earnings_recorded=False).update(earnings_recorded=True):
+            return False
+        # Sorted so concurrent orders lock the shared rows in the same order
+        for (recipient_id, day), (total, count) in sorted(increments.items()):
+            _add_earning(recipient_id, day, total, count)
+    return True
+
+
+def _add_earning(recipient_id, day, total, count):
+    changes = {"total": F("total") + total, "split_count": F("split_count") + count}
+    rows = RecipientDailyEarning.objects.filter(recipient_id=recipient_id, day=day)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            RecipientDailyEarning.objects.create(recipient_id=recipient_id, day=day, total=total, split_count=count)
+    except IntegrityError:
+        # Another worker created the row first
+        rows.update(**changes)
+
+
+def rebuild_earnings(chunk_size=5000):
+    """Recompute the whole rollup from SplitRule. Returns the row count.
+
+    Every completed order is marked as recorded first, which also waits
+    for in-flight ``record_order_earnings`` calls; their events are
+    skipped afterwards instead of being counted twice.
+    """
+    with transaction.atomic():
+        Order.objects.filter(status=Order.COMPLETED, earnings_recorded=False).update(earnings_recorded=True)
+        RecipientDailyEarning.objects.all().delete()
+
+        rows = (
+            SplitRule.objects.filter(order__status=Order.COMPLETED, amount__isnull=False)
+            .annotate(day=TruncDate("effective_date"))
+            .values("recipient_id", "day")
+            .annotate(total=Sum("amount"), split_count=Count("id"))
+            .order_by()
+        )
+        created, batch = 0, []
+        for row in rows.iterator(chunk_size=chunk_size):
+            batch.append(RecipientDailyEarning(**row))
+            if len(batch) >= chunk_size:
+                created += len(RecipientDailyEarning.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(RecipientDailyEarning.objects.bulk_create(batch))
+    return created
+
+
+def recipient_balance(recipient_id, since=None, until=None):
+    """Total earned by ``recipient_id`` between two days (inclusive)."""
+    rows = _earnings(recipient_id, since, until)
+    totals = rows.aggregate(total=Sum("total"), split_count=Sum("split_count"), first_day=Min("day"), last_day=Max("day"))
+    return {
+        "recipient_id": recipient_id,
+        "total": totals["total"] or Decimal("0.00"),
+        "split_count": totals["split_count"] or 0,
+        "first_day": totals["first_day"],
+        "last_day": totals["last_day"],
+    }
+
+
+def daily_earnings(recipient_id, since=None, until=None):
+    """One entry per day with earnings; ``since`` defaults to
+    ``RECIPIENT_EARNINGS_DEFAULT_DAYS`` before ``until`` (today)."""
+    until = until or timezone.localdate()
+    since = since or until - timedelta(days=settings.RECIPIENT_EARNINGS_DEFAULT_DAYS - 1)
+    if since > until:
+        raise ValueError("'from' must not be after 'to'")
+    if (until - since).days >= settings.RECIPIENT_EARNINGS_MAX_DAYS:
+        raise ValueError(f"At most {settings.RECIPIENT_EARNINGS_MAX_DAYS} days per request")
+
+    rows = _earnings(recipient_id, since, until).order_by("day").values("day", "total", "split_count")
+    return {"recipient_id": recipient_id, "from": since, "to": until, "days": list(rows)}
+
+
+def _earnings(recipient_id, since, until):
+    rows = RecipientDailyEarning.objects.filter(recipient_id=recipient_id)
+    if since is not None:
+        rows = rows.filter(day__gte=since)
+    if until is not None:
+        rows = rows.filter(day__lte=until)
+    return rows
@@ -1,27 +1,108 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import Signal, receiver
 
+from . import outbox
+from .cache import split_rules_cache
+from .configuration import split_configuration
+from .earnings import record_order_earnings
+from .models import Order, SplitConfiguration, SplitRule
+
 
 # Define signals
 payment_processed = Signal()
 payment_failed = Signal()
 payout_triggered = Signal()
 
-# Event handlers
+logger = logging.getLogger(__name__)
+
+# Signal receivers only record the event in the outbox, in the same
+# transaction as the order change; run_outbox_worker delivers it
 @receiver(payment_processed)
-def handle_payment_processed(sender, order, **kwargs):
-    """Handle successful payment"""
-    print(f"Payment processed for order {order.id}")
+def record_payment_processed(sender, order, **kwargs):
+    outbox.publish("payment_processed", {
+        "order_id": order.id,
+        "product_id": order.product_id,
+        "amount": str(order.amount),
+        "stripe_payment_id": order.stripe_payment_id,
+    })
 
 @receiver(payment_failed)
-def handle_payment_failed(sender, order, error, **kwargs):
-    if order and hasattr(order, 'id'):
-        print(f"Payment failed for order {order.id}: {error}")
-    else:
-        print(f"Payment failed during creation: {error}")
+def record_payment_failed(sender, order, error, **kwargs):
+    outbox.publish("payment_failed", {
+        "order_id": order.id if order and hasattr(order, 'id') else None,
+        "error": str(error),
+    })
 
 @receiver(payout_triggered)
-def handle_payout(sender, order, split_rules, **kwargs):
+def record_payout(sender, order, split_rules, **kwargs):
+    outbox.publish("payout_triggered", {
+        "order_id": order.id,
+        "split_rules": [
+            {
+                "recipient_id": rule.recipient_id,
+                "type": rule.type,
+                "value": str(rule.value),
+                "amount": str(rule.amount) if rule.amount is not None else None,
+                "effective_date": rule.effective_date.isoformat(),
+            }
+            for rule in split_rules
+        ],
+    })
+
+# Outbox handlers
+@outbox.handler("payment_processed")
+def handle_payment_processed(payload):
+    """Handle successful payment"""
+    logger.info("Payment processed for order %s", payload["order_id"])
+
+@outbox.handler("payment_failed")
+def handle_payment_failed(payload):
+    if payload["order_id"] is not None:
+        logger.warning("Payment failed for order %s: %s", payload["order_id"], payload["error"])
+    else:
+        logger.warning("Payment failed during creation: %s", payload["error"])
+
+@outbox.handler("payout_triggered")
+def handle_payout(payload):
     """Handle payout to recipients"""
-    print(f"Triggering payout for order {order.id}")
-    for rule in split_rules:
-        print(f"Paying {rule.value}% to {rule.recipient_id}")
+    # Transfers are aggregated per recipient by manage.py settle_payouts;
+    # the earnings rollup is updated here
+    record_order_earnings(payload["order_id"], payload["split_rules"])
+    logger.info("Payout for order %s queued for settlement (%s recipients)",
+                payload["order_id"], len(payload["split_rules"]))
+
+# Split-rule cache invalidation
+@receiver(payment_processed)
+def invalidate_split_rules_on_payment(sender, order, **kwargs):
+    split_rules_cache.invalidate(order.product_id, reason="payment_processed")
+
+@receiver(payment_failed)
+def invalidate_split_rules_on_failure(sender, order, **kwargs):
+    if order is not None:
+        split_rules_cache.invalidate(order.product_id, reason="payment_failed")
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_split_rules_on_order_change(sender, instance, **kwargs):
+    reason = "order_deleted" if kwargs.get("signal") is post_delete else "order_saved"
+    split_rules_cache.invalidate(instance.product_id, reason=reason)
+
+@receiver(post_save, sender=SplitRule)
+@receiver(post_delete, sender=SplitRule)
+def invalidate_split_rules_on_rule_change(sender, instance, **kwargs):
+    reason = "split_rule_deleted" if kwargs.get("signal") is post_delete else "split_rule_saved"
+    if SplitRule.order.is_cached(instance):
+        product_id = instance.order.product_id
+    else:
+        # The order may already be gone when the rule is deleted in cascade
+        product_id = Order.objects.filter(pk=instance.order_id).values_list("product_id", flat=True).first()
+    if product_id is not None:
+        split_rules_cache.invalidate(product_id, reason=reason)
+
+# Fee configuration: every process reloads its cached copy
+@receiver(post_save, sender=SplitConfiguration)
+@receiver(post_delete, sender=SplitConfiguration)
+def invalidate_split_configuration(sender, **kwargs):
+    split_configuration.invalidate()
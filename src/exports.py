@@ -0,0 +1,191 @@
+import csv
+
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, SplitRule
+
+
+EXPORT_FORMATS = ("ndjson", "csv")
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+ORDER_FIELDS = ("order_id", "product_id", "product_name", "status", "amount", "stripe_payment_id", "created_at")
+SPLIT_RULE_FIELDS = ("recipient_id", "type", "value", "amount", "account_info", "effective_date")
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def parse_created_bound(value, end_of_day=False):
+    """Parse an ISO date or datetime filter value into an aware datetime.
+
+    A bare date means midnight, or the following midnight when
+    ``end_of_day`` is set, so it can be used as an exclusive upper bound.
+    """
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"Invalid date: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_orders(status=None, product_id=None, created_from=None, created_to=None):
+    """Orders matching the export filters; ``created_to`` is exclusive, and a
+    date-only ``created_to`` includes that whole day."""
+    orders = Order.objects.all()
+    if status:
+        orders = orders.filter(status=status)
+    if product_id:
+        orders = orders.filter(product_id=product_id)
+    if created_from:
+        orders = orders.filter(created_at__gte=parse_created_bound(created_from))
+    if created_to:
+        orders = orders.filter(created_at__lt=parse_created_bound(created_to, end_of_day=True))
+    return orders
+
+
+def split_rules_prefetch(created_from=None):
+    """Prefetch of the orders' split rules.
+
+    Rules are written after their order, so a lower bound on the order's
+    ``created_at`` also bounds ``effective_date``; repeating it lets
+    PostgreSQL prune the older SplitRule partitions.
+    """
+    rules = SplitRule.objects.all()
+    if created_from:
+        rules = rules.filter(effective_date__gte=parse_created_bound(created_from))
+    return Prefetch("split_rules", queryset=rules)
+
+
+def split_rules_by_order(order_ids, created_from=None):
+    """``{order_id: [rule dict, ...]}`` for a page of orders, read as
+    tuples in a single query (no model instances); rules keep their
+    creation order and ``created_from`` prunes partitions as in
+    ``split_rules_prefetch``."""
+    rules = SplitRule.objects.filter(order_id__in=order_ids)
+    if created_from:
+        rules = rules.filter(effective_date__gte=parse_created_bound(created_from))
+
+    grouped = defaultdict(list)
+    rows = rules.order_by("id").values_list("order_id", *SPLIT_RULE_FIELDS)
+    for order_id, recipient_id, rule_type, value, amount, account_info, effective_date in rows:
+        grouped[order_id].append({
+            "recipient_id": recipient_id,
+            "type": rule_type,
+            "value": value,
+            "amount": amount,
+            "account_info": account_info,
+            "effective_date": effective_date,
+        })
+    return grouped
+
+
+def iter_orders(orders, chunk_size=DEFAULT_CHUNK_SIZE, created_from=None):
+    """Yield one dict per order with its split rules.
+
+    Uses a server-side cursor; split rules are prefetched per chunk, so
+    memory is bounded by ``chunk_size`` regardless of the result size.
+    """
+    queryset = orders.prefetch_related(split_rules_prefetch(created_from)).order_by("id")
+    for order in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            "order_id": order.id,
+            "product_id": order.product_id,
+            "product_name": order.product_name,
+            "status": order.status,
+            "amount": order.amount,
+            "stripe_payment_id": order.stripe_payment_id,
+            "created_at": order.created_at,
+            "split_rules": [
+                {
+                    "recipient_id": rule.recipient_id,
+                    "type": rule.type,
+                    "value": rule.value,
+                    "amount": rule.amount,
+                    "account_info": rule.account_info,
+                    "effective_date": rule.effective_date,
+                }
+                for rule in order.split_rules.all()
+            ],
+        }
+
+
+def ndjson_lines(orders):
+    encoder = DjangoJSONEncoder(separators=(",", ":"), ensure_ascii=False)
+    for order in orders:
+        yield encoder.encode(order) + "\n"
+
+
+class _Echo:
+    """File-like object whose write() returns the row instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders):
+    """One CSV row per split rule, with the order columns repeated; orders
+    without rules produce a single row with empty rule columns."""
+    writer = csv.writer(_Echo())
+    encoder = DjangoJSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+    def cell(value):
+        if value is None:
+            return ""
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, (dict, list)):
+            return encoder.encode(value)
+        return value
+
+    yield writer.writerow(ORDER_FIELDS + SPLIT_RULE_FIELDS)
+    for order in orders:
+        order_cells = [cell(order[field]) for field in ORDER_FIELDS]
+        rules = order["split_rules"] or [{}]
+        for rule in rules:
+            yield writer.writerow(order_cells + [cell(rule.get(field)) for field in SPLIT_RULE_FIELDS])
+
+
+def export_lines(export_format, orders, chunk_size=DEFAULT_CHUNK_SIZE, created_from=None):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    rows = iter_orders(orders, chunk_size=chunk_size, created_from=created_from)
+    return ndjson_lines(rows) if export_format == "ndjson" else csv_lines(rows)
+
+
+async def aexport_lines(export_format, orders, chunk_size=None, created_from=None):
+    """``export_lines`` as an async iterator, for responses served over ASGI.
+
+    Django serves a sync streaming iterator under ASGI by collecting it with
+    ``sync_to_async(list)``, i.e. the whole export in memory before the first
+    byte. Here the sync lines are pulled ``chunk_size`` at a time on the
+    request's sync thread, where the server-side cursor lives, so memory
+    stays bounded by one chunk.
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    lines = export_lines(export_format, orders, chunk_size=chunk_size, created_from=created_from)
+    next_lines = sync_to_async(lambda: list(islice(lines, chunk_size)))
+    try:
+        while True:
+            chunk = await next_lines()
+            if not chunk:
+                return
+            for line in chunk:
+                yield line
+    finally:
+        # Releases the cursor when the client disconnects mid-export
+        await sync_to_async(lines.close)()
@@ -0,0 +1,331 @@
+"""Payment gateway adapters.
+
+``get_gateway()`` returns the adapter named by ``PAYMENT_GATEWAY``:
+``StripeGateway`` in production, ``FakeGateway`` for tests, benchmarks
+and local development without network access.
+"""
+import asyncio
+import functools
+import importlib
+import random
+import threading
+import time
+import uuid
+
+from collections import namedtuple
+
+from django.conf import settings
+
+from .metrics import payment_gateway_calls
+
+
+PaymentIntent = namedtuple("PaymentIntent", ["id", "status", "amount", "metadata"])
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or kept failing; the charge
+    outcome is unknown, so the order is left for recovery to resolve."""
+
+
+class GatewayUnavailable(GatewayError):
+    """Rejected without calling the gateway: the circuit breaker was open
+    before the first attempt."""
+
+
+class PaymentDeclined(Exception):
+    """The gateway answered and refused the charge."""
+
+
+class PaymentGateway:
+    """Operations the payment flow needs from a gateway.
+
+    ``create_payment`` must be idempotent on ``idempotency_key``: a retried
+    or recovered charge returns the original intent instead of charging
+    again. Returned intents expose at least ``id`` and ``status``.
+    """
+
+    def create_payment(self, params, idempotency_key):
+        raise NotImplementedError
+
+    async def acreate_payment(self, params, idempotency_key):
+        raise NotImplementedError
+
+    def find_payment(self, order_id):
+        """The intent created for ``order_id``, or None."""
+        raise NotImplementedError
+
+
+class CircuitBreaker:
+    """Fails fast after ``failure_threshold`` consecutive failures.
+
+    While open, calls are rejected for ``reset_timeout`` seconds; then a
+    single trial call is let through (half-open) and its outcome closes
+    or reopens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class StripeGateway(PaymentGateway):
+    """Stripe through a dedicated ``StripeClient``.
+
+    Sync calls share one ``requests`` session whose connection pool is
+    capped at ``pool_size``; async calls use an ``httpx`` client. Both
+    have separate connect and read timeouts. Stripe's own retries are
+    disabled: transient errors (network, 429, 5xx) and the retries Stripe
+    asks for (409 while a request with the same idempotency key is in
+    flight, ``Stripe-Should-Retry: true``) are retried here up to
+    ``max_retries`` times with jittered exponential backoff. Transient
+    errors count against the circuit breaker, so a slow gateway costs a
+    bounded amount of worker time.
+    """
+
+    # Imported on first use (see preload_gateway): stripe alone takes ~1s
+    modules = ("httpx", "requests", "stripe")
+
+    def __init__(self, api_key=None, connect_timeout=None, read_timeout=None, pool_size=None,
+                 max_retries=None, retry_base=None, retry_max=None, breaker=None):
+        import httpx
+        import requests
+        import stripe
+
+        from requests.adapters import HTTPAdapter
+
+        self.stripe = stripe
+        self.max_retries = max_retries if max_retries is not None else settings.STRIPE_MAX_RETRIES
+        self.retry_base = retry_base or settings.STRIPE_RETRY_BASE
+        self.retry_max = retry_max or settings.STRIPE_RETRY_MAX
+        self.breaker = breaker or CircuitBreaker(
+            settings.PAYMENT_GATEWAY_BREAKER_FAILURES, settings.PAYMENT_GATEWAY_BREAKER_RESET
+        )
+
+        connect_timeout = connect_timeout or settings.STRIPE_CONNECT_TIMEOUT
+        read_timeout = read_timeout or settings.STRIPE_READ_TIMEOUT
+        pool_size = pool_size or settings.STRIPE_POOL_SIZE
+
+        # Connections beyond pool_size are opened and discarded, never waited for
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        http_client = stripe.RequestsClient(
+            timeout=(connect_timeout, read_timeout),
+            session=session,
+            async_fallback_client=stripe.HTTPXClient(timeout=httpx.Timeout(read_timeout, connect=connect_timeout)),
+        )
+        self.client = stripe.StripeClient(
+            api_key or settings.STRIPE_SECRET_KEY or "",
+            http_client=http_client,
+            max_network_retries=0,
+        )
+
+    def create_payment(self, params, idempotency_key):
+        return self._call("create", lambda: self.client.v1.payment_intents.create(
+            params=params, options={"idempotency_key": idempotency_key}
+        ))
+
+    async def acreate_payment(self, params, idempotency_key):
+        return await self._acall("create", lambda: self.client.v1.payment_intents.create_async(
+            params=params, options={"idempotency_key": idempotency_key}
+        ))
+
+    def find_payment(self, order_id):
+        result = self._call("search", lambda: self.client.v1.payment_intents.search(
+            params={"query": f"metadata['order_id']:'{order_id}'", "limit": 1}
+        ))
+        return result.data[0] if result.data else None
+
+    def _call(self, operation, request):
+        attempt = 0
+        while True:
+            self._check_breaker(operation, attempt)
+            try:
+                result = request()
+            except Exception as e:
+                delay = self._handle_error(operation, attempt, e)
+            else:
+                return self._handle_success(operation, result)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _acall(self, operation, request):
+        attempt = 0
+        while True:
+            self._check_breaker(operation, attempt)
+            try:
+                result = await request()
+            except Exception as e:
+                delay = self._handle_error(operation, attempt, e)
+            else:
+                return self._handle_success(operation, result)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _check_breaker(self, operation, attempt):
+        if not self.breaker.allow():
+            self._record(operation, "short_circuited")
+            if attempt:
+                # An earlier attempt reached the gateway and may have been
+                # applied: the outcome is unknown, not a definite failure
+                raise GatewayError(f"Payment gateway {operation} interrupted (circuit opened during retries)")
+            raise GatewayUnavailable("Payment gateway unavailable (circuit open)")
+
+    def _handle_success(self, operation, result):
+        self.breaker.record_success()
+        self._record(operation, "succeeded")
+        return result
+
+    def _handle_error(self, operation, attempt, error):
+        """Seconds to wait before retrying ``error``; raises when it is
+        not transient or the retries are exhausted."""
+        if not self._is_transient(error):
+            # Declines and invalid requests are answers: the gateway is up
+            self.breaker.record_success()
+            self._record(operation, "rejected")
+            if isinstance(error, self.stripe.CardError):
+                raise PaymentDeclined(error.user_message or str(error)) from error
+            raise error
+
+        if self._gateway_failing(error):
+            self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            self._record(operation, "failed")
+            raise GatewayError(f"Payment gateway {operation} failed: {error}") from error
+        self._record(operation, "retried")
+        return self._backoff(attempt)
+
+    def _is_transient(self, error):
+        return self._gateway_failing(error) or self._retry_requested(error)
+
+    def _gateway_failing(self, error):
+        stripe = self.stripe
+        if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+            return True
+        return isinstance(error, stripe.APIError) and (error.http_status or 500) >= 500
+
+    def _retry_requested(self, error):
+        """Stripe answered but the request has to be sent again, as its
+        own client would: a 409 means a request with the same idempotency
+        key (e.g. one that timed out here) is still being processed."""
+        if not isinstance(error, self.stripe.StripeError):
+            return False
+        headers = {name.lower(): value for name, value in (error.headers or {}).items()}
+        return error.http_status == 409 or headers.get("stripe-should-retry") == "true"
+
+    def _backoff(self, attempt):
+        delay = min(self.retry_base * 2 ** attempt, self.retry_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _record(self, operation, result):
+        payment_gateway_calls.labels(gateway="stripe", operation=operation, result=result).inc()
+
+
+class FakeGateway(PaymentGateway):
+    """In-process gateway with Stripe's test payment methods semantics.
+
+    ``pm_card_chargeDeclined`` (and any method containing ``declined``)
+    raises, ``pm_card_authenticationRequired`` returns ``requires_action``
+    and everything else succeeds. Intents are kept in memory, keyed by
+    idempotency key, so retries and ``find_payment`` behave like Stripe.
+    ``latency`` (seconds) simulates the network round trip.
+    """
+
+    def __init__(self, latency=None):
+        self.latency = latency if latency is not None else settings.FAKE_GATEWAY_LATENCY
+        self._intents = {}
+        self._lock = threading.Lock()
+
+    def create_payment(self, params, idempotency_key):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._create(params, idempotency_key)
+
+    async def acreate_payment(self, params, idempotency_key):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._create(params, idempotency_key)
+
+    def find_payment(self, order_id):
+        with self._lock:
+            for intent in self._intents.values():
+                if str(intent.metadata.get("order_id")) == str(order_id):
+                    return intent
+        return None
+
+    def _create(self, params, idempotency_key):
+        payment_method = params.get("payment_method") or ""
+        if "declined" in payment_method.lower():
+            raise PaymentDeclined("Your card was declined.")
+        status = "requires_action" if payment_method == "pm_card_authenticationRequired" else "succeeded"
+
+        with self._lock:
+            intent = self._intents.get(idempotency_key)
+            if intent is None:
+                intent = PaymentIntent(
+                    id=f"pi_fake_{uuid.uuid4().hex[:24]}",
+                    status=status,
+                    amount=params.get("amount"),
+                    metadata=dict(params.get("metadata") or {}),
+                )
+                self._intents[idempotency_key or intent.id] = intent
+        payment_gateway_calls.labels(gateway="fake", operation="create", result="succeeded").inc()
+        return intent
+
+
+GATEWAYS = {
+    "stripe": StripeGateway,
+    "fake": FakeGateway,
+}
+
+
+def get_gateway():
+    """The process-wide adapter for ``PAYMENT_GATEWAY``; built once so its
+    connection pool and circuit breaker are shared by every request."""
+    return _build_gateway(settings.PAYMENT_GATEWAY)
+
+
+def preload_gateway():
+    """Import the client libraries of ``PAYMENT_GATEWAY`` without building
+    the adapter, whose connection pool must not be shared across a fork.
+    A preloading server master calls it so workers do not each pay the
+    import on their first payment."""
+    for module in getattr(GATEWAYS.get(settings.PAYMENT_GATEWAY), "modules", ()):
+        importlib.import_module(module)
+
+
+@functools.cache
+def _build_gateway(name):
+    try:
+        return GATEWAYS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown PAYMENT_GATEWAY: {name!r} (expected one of: {', '.join(GATEWAYS)})")
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different request payload."""
+
+
+class IdempotencyInProgress(Exception):
+    """Another execution for the key did not finish within the wait timeout."""
+
+
+def request_fingerprint(data):
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with per-entry expiry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= timezone.now():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class IdempotencyStore:
+    """Runs a request at most once per Idempotency-Key.
+
+    Completed responses live in the IdempotencyKey table (the unique
+    constraint arbitrates between processes) with an in-process LRU in
+    front of it. Concurrent duplicates in the same process wait on the
+    in-flight execution (a threading.Event, or an asyncio.Event for the
+    async views); duplicates in other processes poll the row until it
+    is completed.
+    """
+
+    def __init__(self, ttl=None, cache_size=None, wait_timeout=None, lock_timeout=None, poll_interval=0.05):
+        self.ttl = timedelta(seconds=ttl or settings.IDEMPOTENCY_KEY_TTL)
+        self.wait_timeout = wait_timeout or settings.IDEMPOTENCY_WAIT_TIMEOUT
+        self.lock_timeout = timedelta(seconds=lock_timeout or settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        self.poll_interval = poll_interval
+        self.cache = LRUCache(cache_size or settings.IDEMPOTENCY_CACHE_SIZE)
+        self._inflight = {}
+        self._ainflight = {}
+        self._lock = threading.Lock()
+
+    def execute(self, key, fingerprint, func):
+        """Return ``(replayed, status_code, body)`` for the key.
+
+        ``func`` returns ``(status_code, body)`` and is only called when no
+        stored response exists. If it raises or returns a server error
+        (5xx), the key is released so the client can retry.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            stored = self.cache.get(key)
+            if stored is not None:
+                return (True,) + self._check_fingerprint(stored, fingerprint)
+
+            with self._lock:
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    inflight = self._inflight[key] = threading.Event()
+                    break
+
+            if not inflight.wait(max(deadline - time.monotonic(), 0)):
+                raise IdempotencyInProgress(f"Request with Idempotency-Key {key} is still in progress")
+
+        try:
+            row = self._claim(key, fingerprint, deadline)
+            if row.state == IdempotencyKey.COMPLETED:
+                stored = self._remember(row)
+                return (True,) + self._check_fingerprint(stored, fingerprint)
+
+            try:
+                status_code, body = func()
+            except BaseException:
+                IdempotencyKey.objects.filter(pk=row.pk).delete()
+                raise
+            if not self._storable(status_code):
+                IdempotencyKey.objects.filter(pk=row.pk).delete()
+                return False, status_code, body
+
+            row.state = IdempotencyKey.COMPLETED
+            row.response_status = status_code
+            row.response_body = body
+            row.save(update_fields=["state", "response_status", "response_body"])
+            self._remember(row)
+            return False, status_code, body
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def purge_expired(self, batch_size=1000):
+        deleted = 0
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+    async def aexecute(self, key, fingerprint, func):
+        """Async counterpart of ``execute``; ``func`` is a coroutine function."""
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            stored = self.cache.get(key)
+            if stored is not None:
+                return (True,) + self._check_fingerprint(stored, fingerprint)
+
+            inflight = self._ainflight.get(key)
+            if inflight is None:
+                inflight = self._ainflight[key] = asyncio.Event()
+                break
+
+            try:
+                await asyncio.wait_for(inflight.wait(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise IdempotencyInProgress(f"Request with Idempotency-Key {key} is still in progress")
+
+        try:
+            while True:
+                row = await sync_to_async(self._try_claim)(key, fingerprint)
+                if row is not None:
+                    break
+                if time.monotonic() >= deadline:
+                    raise IdempotencyInProgress(f"Request with Idempotency-Key {key} is still in progress")
+                await asyncio.sleep(self.poll_interval)
+
+            if row.state == IdempotencyKey.COMPLETED:
+                stored = self._remember(row)
+                return (True,) + self._check_fingerprint(stored, fingerprint)
+
+            try:
+                status_code, body = await func()
+            except BaseException:
+                await IdempotencyKey.objects.filter(pk=row.pk).adelete()
+                raise
+            if not self._storable(status_code):
+                await IdempotencyKey.objects.filter(pk=row.pk).adelete()
+                return False, status_code, body
+
+            row.state = IdempotencyKey.COMPLETED
+            row.response_status = status_code
+            row.response_body = body
+            await row.asave(update_fields=["state", "response_status", "response_body"])
+            self._remember(row)
+            return False, status_code, body
+        finally:
+            self._ainflight.pop(key).set()
+
+    def _claim(self, key, fingerprint, deadline):
+        """Insert the key as IN_PROGRESS or return the row that already holds it."""
+        while True:
+            row = self._try_claim(key, fingerprint)
+            if row is not None:
+                return row
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(f"Request with Idempotency-Key {key} is still in progress")
+            time.sleep(self.poll_interval)
+
+    def _try_claim(self, key, fingerprint):
+        """Return the row we now own or a completed one; None while another
+        execution holds the key."""
+        while True:
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(
+                        key=key,
+                        request_fingerprint=fingerprint,
+                        locked_at=now,
+                        expires_at=now + self.ttl,
+                    )
+            except IntegrityError:
+                pass
+
+            row = IdempotencyKey.objects.filter(key=key).first()
+            if row is None:
+                continue
+
+            if row.expires_at <= now:
+                IdempotencyKey.objects.filter(pk=row.pk, expires_at__lte=now).delete()
+                continue
+
+            if row.state == IdempotencyKey.COMPLETED:
+                return row
+
+            if row.request_fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used with a different payload")
+
+            # The owner may have crashed; take the key over once its lock is
+            # stale. The payment views resume the order recorded on the row
+            # (PaymentProcessor._claimed_order) rather than charging a new one
+            taken_over = IdempotencyKey.objects.filter(
+                pk=row.pk,
+                state=IdempotencyKey.IN_PROGRESS,
+                locked_at__lte=now - self.lock_timeout,
+            ).update(locked_at=now)
+            if taken_over:
+                row.locked_at = now
+                return row
+
+            return None
+
+    def _storable(self, status_code):
+        # A server error says nothing about the request; the client retries
+        return status_code < 500
+
+    def _remember(self, row):
+        stored = (row.request_fingerprint, row.response_status, row.response_body)
+        self.cache.set(row.key, stored, row.expires_at)
+        return stored
+
+    def _check_fingerprint(self, stored, fingerprint):
+        stored_fingerprint, status_code, body = stored
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different payload")
+        return status_code, body
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,128 @@
+"""Pages of ``GET /api/v1/splits/all/``.
+
+``LIST_ALL_MODE`` picks how a page is read; all modes render the same bytes:
+
+* ``rows``: orders as ``.values()`` rows and their split rules as tuples,
+  two queries, no model instances;
+* ``json_agg``: one query, PostgreSQL aggregates each order's split rules
+  into a JSON array (``json_agg``) that is parsed and rendered as usual;
+* ``prebuilt``: one query, PostgreSQL builds each order's JSON document
+  and the renderer splices the documents into the response as they are.
+
+The SQL modes need PostgreSQL and fall back to ``rows`` elsewhere. They use
+``json`` rather than ``jsonb``, which would reorder the keys, and format
+money and dates in SQL exactly as ``FastJSONRenderer`` does in Python.
+"""
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import TextField
+from django.db.models.expressions import RawSQL
+
+from .exports import parse_created_bound, split_rules_by_order
+from .renderers import PrebuiltJSON
+
+
+LIST_ALL_MODES = ("rows", "json_agg", "prebuilt")
+
+ORDER_FIELDS = ("id", "product_id", "product_name", "status", "amount")
+
+# DRF's datetime format: isoformat() in UTC with "Z", microseconds only when set
+_EFFECTIVE_DATE = """
+    to_char(r.effective_date AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS')
+    || CASE WHEN to_char(r.effective_date, 'US') = '000000' THEN '' ELSE '.' || to_char(r.effective_date, 'US') END
+    || 'Z'
+"""
+
+
+def _rules_json_agg(rules_filter):
+    return f"""
+        SELECT json_agg(json_build_object(
+            'recipient_id', r.recipient_id,
+            'type', r.type,
+            'value', r.value::text,
+            'amount', r.amount::text,
+            'account_info', r.account_info,
+            'effective_date', {_EFFECTIVE_DATE}
+        ) ORDER BY r.id)::text
+        FROM src_splitrule r
+        WHERE r.order_id = src_order.id{rules_filter}
+    """
+
+
+def _order_prebuilt(rules_filter):
+    # src_json_compact() is created by migration 0013
+    rules = f"""
+        SELECT '[' || string_agg(
+            '{{"recipient_id":' || to_json(r.recipient_id)::text
+            || ',"type":' || to_json(r.type)::text
+            || ',"value":' || to_json(r.value::text)::text
+            || ',"amount":' || COALESCE(to_json(r.amount::text)::text, 'null')
+            || ',"account_info":' || src_json_compact(r.account_info)
+            || ',"effective_date":' || to_json({_EFFECTIVE_DATE})::text
+            || '}}',
+            ',' ORDER BY r.id
+        ) || ']'
+        FROM src_splitrule r
+        WHERE r.order_id = src_order.id{rules_filter}
+    """
+    return f"""
+        '{{"order_id":' || src_order.id
+        || ',"product_id":' || to_json(src_order.product_id)::text
+        || ',"product_name":' || to_json(src_order.product_name)::text
+        || ',"status":' || to_json(src_order.status)::text
+        || ',"amount":' || to_json(src_order.amount::text)::text
+        || ',"split_rules":' || COALESCE(({rules}), '[]')
+        || '}}'
+    """
+
+
+def list_all_mode():
+    """``LIST_ALL_MODE``, or ``rows`` where the SQL modes are unavailable."""
+    mode = settings.LIST_ALL_MODE
+    if mode not in LIST_ALL_MODES:
+        raise ValueError(f"Unknown LIST_ALL_MODE: {mode!r} (expected one of: {', '.join(LIST_ALL_MODES)})")
+    return mode if connection.vendor == "postgresql" else "rows"
+
+
+def page_queryset(orders, mode, created_from=None):
+    """``orders`` as the dict rows the paginator slices for ``mode``."""
+    if mode == "rows":
+        return orders.values(*ORDER_FIELDS).order_by("id")
+
+    rules_filter, params = "", []
+    if created_from:
+        # Rules are written after their order: the bound prunes partitions
+        rules_filter, params = " AND r.effective_date >= %s", [parse_created_bound(created_from)]
+
+    if mode == "json_agg":
+        rules = RawSQL(_rules_json_agg(rules_filter), params, output_field=TextField())
+        return orders.values(*ORDER_FIELDS).annotate(rules_json=rules).order_by("id")
+
+    document = RawSQL(_order_prebuilt(rules_filter), params, output_field=TextField())
+    return orders.annotate(document=document).values("id", "document").order_by("id")
+
+
+def page_results(page, mode, created_from=None):
+    """The ``results`` of a page read with ``page_queryset``."""
+    if mode == "prebuilt":
+        return PrebuiltJSON(order["document"] for order in page)
+
+    if mode == "json_agg":
+        rules = {order["id"]: json.loads(order["rules_json"]) if order["rules_json"] else [] for order in page}
+    else:
+        rules = split_rules_by_order([order["id"] for order in page], created_from)
+
+    return [
+        {
+            "order_id": order["id"],
+            "product_id": order["product_id"],
+            "product_name": order["product_name"],
+            "status": order["status"],
+            "amount": order["amount"],
+            "split_rules": rules.get(order["id"], []),
+        }
+        for order in page
+    ]
+
@@ -0,0 +1,115 @@
+"""Logging that keeps file and console I/O off the request path.
+
+``QueueLogHandler`` is the only handler the loggers use: ``emit`` puts
+the record on a bounded in-memory queue and returns, and a background
+``QueueListener`` thread formats it as JSON and writes it to the real
+handlers (rotating files, console). When the queue is full the record
+is dropped and counted instead of blocking the request.
+
+``SamplingFilter`` keeps a fraction of the low-level records of noisy
+loggers (e.g. ``django.db.backends``); warnings and errors always pass.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import weakref
+
+from logging.handlers import QueueHandler, QueueListener
+
+from .metrics import log_records_dropped
+
+
+def _handler_by_name(name):
+    get_handler = getattr(logging, "getHandlerByName", None)  # Python 3.12+
+    return get_handler(name) if get_handler else logging._handlers.get(name)
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Blocks instead of failing when the queue is full at shutdown
+        self.queue.put(self._sentinel)
+
+
+class QueueLogHandler(QueueHandler):
+    """Hands records to a listener thread that writes them to ``handlers``.
+
+    ``handlers`` are names of handlers defined in the same ``LOGGING``
+    dict; they are not attached to loggers themselves. The listener is
+    stopped (and the queue drained) on close and at exit, and restarted
+    in forked children, whose copy of the thread does not run.
+    """
+
+    def __init__(self, handlers=(), maxsize=10_000):
+        targets = []
+        for name in handlers:
+            handler = _handler_by_name(name)
+            if handler is None:
+                # dictConfig defers handlers failing with this message and
+                # retries them once the others are configured
+                raise ValueError(f"Handler {name!r} target not configured yet")
+            targets.append(handler)
+
+        super().__init__(queue.Queue(maxsize))
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = _Listener(self.queue, *targets, respect_handler_level=True)
+        self.listener.start()
+
+        reference = weakref.ref(self)
+        atexit.register(_call_if_alive, reference, "close")
+        os.register_at_fork(after_in_child=lambda: _call_if_alive(reference, "_restart_listener"))
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            log_records_dropped.inc()
+
+    def flush(self):
+        """Wait until every queued record has been written."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self.listener.start()
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+    def _restart_listener(self):
+        # The parent's queue lock may have been held by its listener thread
+        self.queue = queue.Queue(self.maxsize)
+        self.listener.queue = self.queue
+        self.listener._thread = None
+        self.listener.start()
+
+
+def _call_if_alive(reference, method):
+    handler = reference()
+    if handler is not None:
+        getattr(handler, method)()
+
+
+class SamplingFilter(logging.Filter):
+    """Passes ``rates[logger]`` of the records below ``WARNING``.
+
+    ``rates`` maps logger names to a fraction between 0 and 1 and also
+    applies to their children; other loggers are not sampled.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            if name in self.rates:
+                return random.random() < self.rates[name]
+            name = name.rpartition(".")[0]
+        return True
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.exports import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_lines, filter_orders
+
+
+class Command(BaseCommand):
+    help = "Stream orders and their split rules as NDJSON or CSV with constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--output", help="Destination file (default: stdout)")
+        parser.add_argument("--status", help="Only orders with this status")
+        parser.add_argument("--product-id", help="Only orders for this product")
+        parser.add_argument("--created-from", help="ISO date/datetime, inclusive")
+        parser.add_argument("--created-to", help="ISO date/datetime, exclusive (a date includes the whole day)")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"Rows fetched per server-side cursor round trip (default: {DEFAULT_CHUNK_SIZE})")
+
+    def handle(self, *args, **options):
+        try:
+            orders = filter_orders(
+                status=options["status"],
+                product_id=options["product_id"],
+                created_from=options["created_from"],
+                created_to=options["created_to"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        lines = export_lines(options["export_format"], orders, chunk_size=options["chunk_size"],
+                             created_from=options["created_from"])
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
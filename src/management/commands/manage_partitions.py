@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from src.partitions import (
+    PARTITIONED_TABLES,
+    add_months,
+    create_partition,
+    detach_month,
+    is_partitioned,
+    month_start,
+    monthly_partitions,
+    supports_partitioning,
+)
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions of src_order/src_splitrule and detach old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Make sure partitions exist up to N months after the current one (default: 3)",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=None,
+            help="Detach order months older than N months before the current one, with their split rules (default: keep all)",
+        )
+        parser.add_argument(
+            "--archive-schema",
+            default="archive",
+            help="Schema detached partitions are moved to (default: archive)",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop detached partitions instead of archiving them",
+        )
+
+    def handle(self, *args, **options):
+        if not supports_partitioning(connection):
+            raise CommandError("Table partitioning requires PostgreSQL")
+
+        current = month_start(datetime.now(timezone.utc))
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(connection, table):
+                raise CommandError(f"{table} is not partitioned; run migrate first")
+
+            for offset in range(options["months_ahead"] + 1):
+                month = add_months(current, offset)
+                with transaction.atomic():
+                    if create_partition(connection, table, month):
+                        self.stdout.write(f"Created {table} partition for {month:%Y-%m}")
+
+        if options["retain_months"] is not None:
+            # Both tables per order month, oldest first (see detach_month)
+            cutoff = add_months(current, -options["retain_months"])
+            for month in sorted(monthly_partitions(connection, "src_order")):
+                if month >= cutoff:
+                    break
+                with transaction.atomic():
+                    names = detach_month(
+                        connection, month,
+                        archive_schema=options["archive_schema"], drop=options["drop"],
+                    )
+                action = "Dropped" if options["drop"] else f"Archived to {options['archive_schema']}:"
+                self.stdout.write(f"{action} {', '.join(names)}")
+
+        self.stdout.write(self.style.SUCCESS("Partitions up to date"))
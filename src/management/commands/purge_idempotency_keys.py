@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from src.idempotency import idempotency_store
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key records"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows deleted per statement (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        deleted = idempotency_store.purge_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from src.earnings import rebuild_earnings
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-recipient daily earnings rollup from the split rules (repair)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="Rollup rows inserted per batch (default: 5000)")
+
+    def handle(self, *args, **options):
+        rows = rebuild_earnings(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} recipient-day rows"))
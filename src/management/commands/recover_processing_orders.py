@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from src.services import PaymentProcessor
+
+
+class Command(BaseCommand):
+    help = "Resolve orders left in PROCESSING after a crash between payment phases"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=15,
+            help="Only recover orders created more than N minutes ago (default: 15)",
+        )
+
+    def handle(self, *args, **options):
+        older_than = timedelta(minutes=options["older_than"])
+        recovered = PaymentProcessor().recover_stale_orders(older_than=older_than)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recovered orders: {recovered['completed']} completed, {recovered['failed']} failed, "
+            f"{recovered['processing']} left processing"
+        ))
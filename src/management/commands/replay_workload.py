@@ -0,0 +1,214 @@
+import json
+import re
+import time
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+
+from src.cache import split_rules_cache
+from src.configuration import split_configuration
+from src.idempotency import idempotency_store
+
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r"IN \((?:\?, )*\?\)")
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+REPLAY_CACHE_ALIAS = "replay_workload"
+
+
+def fingerprint(sql):
+    """The query with literals replaced by ``?``, so calls differing only
+    by parameters are grouped together."""
+    return IN_LISTS.sub("IN (...)", LITERALS.sub("?", sql))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+@contextmanager
+def isolated_caches():
+    """Point the shared caches at a throwaway locmem alias during the
+    replay, and empty the in-process ones afterwards: both get filled
+    from rows that are rolled back, and the rollback does not reach them."""
+    shared = (split_rules_cache, split_configuration)
+    aliases = [cache.alias for cache in shared]
+    replay_cache = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": REPLAY_CACHE_ALIAS}
+    with override_settings(CACHES={**settings.CACHES, REPLAY_CACHE_ALIAS: replay_cache}):
+        for cache in shared:
+            cache.alias = REPLAY_CACHE_ALIAS
+        try:
+            yield
+        finally:
+            for cache, alias in zip(shared, aliases):
+                cache.alias = alias
+            caches[REPLAY_CACHE_ALIAS].clear()
+            split_configuration.clear()
+            idempotency_store.cache.clear()
+
+
+def endpoint_name(method, path):
+    try:
+        return f"{method} {resolve(path).url_name}"
+    except Resolver404:
+        return f"{method} {path}"
+
+
+class Command(BaseCommand):
+    help = "Replay a JSONL workload through the API and report per-query timings and plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "workload",
+            help='JSONL file, one request per line: {"method", "path", "params", "body", "headers"}. '
+                 "Lines without a path are skipped.",
+        )
+        parser.add_argument("--repeat", type=int, default=1, help="Replay the workload N times (default: 1)")
+        parser.add_argument("--top", type=int, default=10, help="Query shapes to report, by total time (default: 10)")
+        parser.add_argument("--analyze", action="store_true",
+                            help="EXPLAIN ANALYZE the reported SELECTs (PostgreSQL; executes them again)")
+        parser.add_argument("--host", default="localhost", help="Host header sent with each request")
+        parser.add_argument("--allow-writes", action="store_true",
+                            help="Also replay POST/PUT/PATCH/DELETE requests; their changes are rolled back")
+
+    def handle(self, *args, **options):
+        requests = self.load(options["workload"], options["allow_writes"])
+        if not requests:
+            raise CommandError(f"No replayable requests in {options['workload']}")
+
+        # Never charge through the real gateway, and never keep what the
+        # replayed writes change, in the database or in the caches
+        with override_settings(PAYMENT_GATEWAY="fake"), isolated_caches(), transaction.atomic():
+            self.replay(requests, options)
+            transaction.set_rollback(True)
+
+    def replay(self, requests, options):
+        client = Client(HTTP_HOST=options["host"], raise_request_exception=False)
+        endpoints = defaultdict(lambda: {"durations": [], "queries": 0, "statuses": Counter()})
+        queries = defaultdict(lambda: {"calls": 0, "total": 0.0, "max": 0.0, "sample": None})
+
+        started = time.perf_counter()
+        for _ in range(options["repeat"]):
+            for request in requests:
+                with CaptureQueriesContext(connection) as captured:
+                    request_started = time.perf_counter()
+                    response = self.send(client, request)
+                    elapsed = time.perf_counter() - request_started
+
+                endpoint = endpoints[endpoint_name(request["method"], request["path"])]
+                endpoint["durations"].append(elapsed)
+                endpoint["queries"] += len(captured)
+                endpoint["statuses"][response.status_code] += 1
+
+                for query in captured:
+                    stats = queries[fingerprint(query["sql"])]
+                    seconds = float(query["time"] or 0)
+                    stats["calls"] += 1
+                    stats["total"] += seconds
+                    stats["max"] = max(stats["max"], seconds)
+                    stats["sample"] = stats["sample"] or query["sql"]
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Replayed {len(requests) * options['repeat']} requests "
+            f"({self.skipped} skipped lines, {self.writes_skipped} writes skipped) in {elapsed:.2f}s\n"
+        )
+        self.report_endpoints(endpoints)
+        self.report_queries(queries, options["top"], options["analyze"])
+
+    def load(self, path, allow_writes=False):
+        self.skipped = 0
+        self.writes_skipped = 0
+        try:
+            with open(path, encoding="utf-8") as workload:
+                lines = workload.readlines()
+        except OSError as e:
+            raise CommandError(str(e))
+
+        requests = []
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise CommandError(f"Line {number}: invalid JSON ({e})")
+            if not isinstance(entry, dict) or not entry.get("path"):
+                self.skipped += 1
+                continue
+            entry["method"] = entry.get("method", "GET").upper()
+            if entry["method"] not in READ_METHODS and not allow_writes:
+                self.writes_skipped += 1
+                continue
+            requests.append(entry)
+        return requests
+
+    def send(self, client, request):
+        path = request["path"]
+        if request.get("params"):
+            path = f"{path}?{urlencode(request['params'], doseq=True)}"
+        body = request.get("body")
+        return client.generic(
+            request["method"],
+            path,
+            data=json.dumps(body) if body is not None else "",
+            content_type="application/json",
+            headers=request.get("headers") or {},
+        )
+
+    def report_endpoints(self, endpoints):
+        self.stdout.write("Endpoints")
+        for name, endpoint in sorted(endpoints.items()):
+            durations = endpoint["durations"]
+            statuses = " ".join(f"{code}x{count}" for code, count in sorted(endpoint["statuses"].items()))
+            self.stdout.write(
+                f"  {name}: {len(durations)} req, "
+                f"p50 {percentile(durations, 0.5) * 1000:.1f} ms, p95 {percentile(durations, 0.95) * 1000:.1f} ms, "
+                f"{endpoint['queries'] / len(durations):.1f} queries/req [{statuses}]"
+            )
+
+    def report_queries(self, queries, top, analyze):
+        ranked = sorted(queries.values(), key=lambda stats: stats["total"], reverse=True)[:top]
+        self.stdout.write(f"\nQueries (top {len(ranked)} of {len(queries)} shapes by total time)")
+        for position, stats in enumerate(ranked, start=1):
+            self.stdout.write(
+                f"\n#{position} {stats['calls']} calls, {stats['total'] * 1000:.1f} ms total, "
+                f"{stats['max'] * 1000:.1f} ms max"
+            )
+            self.stdout.write(f"  {stats['sample']}")
+            for line in self.plan(stats["sample"], analyze):
+                self.stdout.write(f"    {line}")
+
+    def plan(self, sql, analyze):
+        # Only reads are explained: EXPLAIN ANALYZE would run writes again
+        if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            return []
+        try:
+            prefix = connection.ops.explain_query_prefix(**({"analyze": True} if analyze else {}))
+        except ValueError as e:
+            raise CommandError(f"--analyze is not supported on {connection.vendor}: {e}")
+
+        try:
+            # A savepoint each: on PostgreSQL a failed EXPLAIN would abort
+            # the replay's transaction and every statement after it
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}")
+                rows = cursor.fetchall()
+        except DatabaseError as e:
+            return [f"EXPLAIN failed: {e}".strip()]
+        if connection.vendor == "sqlite":
+            # EXPLAIN QUERY PLAN rows: (id, parent, notused, detail)
+            return [row[-1] for row in rows]
+        return [" ".join(str(column) for column in row) for row in rows]
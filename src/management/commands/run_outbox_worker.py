@@ -0,0 +1,78 @@
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from prometheus_client import start_http_server
+
+from src.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox events (payment and payout notifications)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Events claimed per batch (default: OUTBOX_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Handler threads (default: OUTBOX_CONCURRENCY)",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=None,
+            help="Attempts before an event is marked dead (default: OUTBOX_MAX_ATTEMPTS)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the outbox is empty (default: 1)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no event is ready instead of polling",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=None,
+            help="Expose Prometheus metrics on this port",
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+
+        # Finish the current batch on SIGINT/SIGTERM instead of abandoning it
+        stop_event = threading.Event()
+        previous = {
+            signum: signal.signal(signum, lambda *_: stop_event.set())
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+
+        worker = OutboxWorker(
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+            max_attempts=options["max_attempts"],
+        )
+        started = time.monotonic()
+        try:
+            handled = worker.run(once=options["once"], poll_interval=options["poll_interval"], stop_event=stop_event)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Handled {handled} outbox events in {elapsed:.1f}s ({handled / elapsed if elapsed else 0:.0f}/s)"
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from src.exports import parse_created_bound
+from src.models import SettlementRun
+from src.settlement import DEFAULT_CHUNK_SIZE, SettlementProcessor
+
+
+class Command(BaseCommand):
+    help = "Aggregate unsettled split rules into one payout per recipient (resumes an interrupted run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="ISO date/datetime, inclusive (default: no lower bound)")
+        parser.add_argument("--until", help="ISO date/datetime, exclusive; a date includes the whole day (default: now)")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"Split rule ids per transaction (default: {DEFAULT_CHUNK_SIZE})")
+
+    def handle(self, *args, **options):
+        try:
+            window_start = parse_created_bound(options["since"]) if options["since"] else None
+            window_end = parse_created_bound(options["until"], end_of_day=True) if options["until"] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        running = SettlementRun.objects.filter(status=SettlementRun.RUNNING).first()
+        if running is not None:
+            self.stdout.write(f"Resuming settlement run {running.pk} after rule {running.last_rule_id}")
+
+        run = SettlementProcessor(chunk_size=options["chunk_size"]).settle(window_end, window_start)
+        totals = run.payouts.aggregate(total=Sum("amount"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Settlement run {run.pk}: {run.rules_settled} rules, "
+            f"{run.payouts.count()} payouts, total {totals['total'] or 0}"
+        ))
@@ -0,0 +1,132 @@
+from django.db import connections
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+
+# Exposed through the django_prometheus /metrics endpoint (default registry)
+split_rules_cache_hits = Counter(
+    "split_rules_cache_hits",
+    "GET /api/v1/splits/<product_id>/ lookups served from the cache",
+)
+split_rules_cache_misses = Counter(
+    "split_rules_cache_misses",
+    "GET /api/v1/splits/<product_id>/ lookups that went to the database",
+)
+split_rules_cache_evictions = Counter(
+    "split_rules_cache_evictions",
+    "Split-rule cache entries invalidated by payment or split-rule events",
+    ["reason"],
+)
+
+outbox_events_processed = Counter(
+    "outbox_events_processed",
+    "Outbox events handled by run_outbox_worker",
+    ["event_type", "result"],
+)
+outbox_batch_seconds = Histogram(
+    "outbox_batch_seconds",
+    "Time to deliver and settle one outbox batch",
+)
+
+payment_gateway_calls = Counter(
+    "payment_gateway_calls",
+    "Payment gateway calls by outcome (retried, short_circuited: rejected by the open circuit)",
+    ["gateway", "operation", "result"],
+)
+
+# Per request, labelled by URL name (src.profiling.RequestBudgetMiddleware)
+request_queries = Histogram(
+    "request_queries",
+    "Database queries per request",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+request_db_seconds = Histogram(
+    "request_db_seconds",
+    "Time spent in database queries per request",
+    ["view"],
+)
+request_gateway_seconds = Histogram(
+    "request_gateway_seconds",
+    "Time spent in payment gateway calls per request",
+    ["view"],
+)
+request_budget_exceeded = Counter(
+    "request_budget_exceeded",
+    "Requests over their REQUEST_BUDGETS entry, by exceeded budget",
+    ["view", "budget"],
+)
+
+log_records_dropped = Counter(
+    "log_records_dropped",
+    "Log records discarded because the logging queue was full (src.logs.QueueLogHandler)",
+)
+
+
+class DatabasePoolCollector:
+    """Usage of the psycopg pools Django opened in this process, read from
+    ``pool.get_stats()`` on each scrape (``OPTIONS["pool"]`` in DATABASES).
+
+    ``db_pool_saturation`` is the fraction of ``max_size`` lent out; near 1
+    with ``db_pool_requests_waiting`` above 0, requests queue for a
+    connection and fail after the pool timeout (``db_pool_timeouts``).
+    """
+
+    def collect(self):
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Open connections in the pool", labels=["alias"]),
+            "max": GaugeMetricFamily("db_pool_max_size", "Maximum connections of the pool", labels=["alias"]),
+            "in_use": GaugeMetricFamily("db_pool_in_use", "Connections lent out by the pool", labels=["alias"]),
+            "waiting": GaugeMetricFamily(
+                "db_pool_requests_waiting", "Requests waiting for a connection", labels=["alias"],
+            ),
+            "saturation": GaugeMetricFamily(
+                "db_pool_saturation", "Connections lent out / pool max_size", labels=["alias"],
+            ),
+        }
+        counters = {
+            "requests": CounterMetricFamily("db_pool_requests", "Connections requested from the pool", labels=["alias"]),
+            "queued": CounterMetricFamily(
+                "db_pool_requests_queued", "Connection requests that had to wait", labels=["alias"],
+            ),
+            "wait": CounterMetricFamily(
+                "db_pool_wait_seconds", "Time spent waiting for a connection", labels=["alias"],
+            ),
+            "timeouts": CounterMetricFamily(
+                "db_pool_timeouts", "Connection requests that failed (pool timeout)", labels=["alias"],
+            ),
+            "connections": CounterMetricFamily(
+                "db_pool_connections_opened", "Connections opened to the database", labels=["alias"],
+            ),
+        }
+
+        for alias, pool in _open_pools():
+            stats = pool.get_stats()
+            # Counters are missing from the stats until they first move
+            size, available = stats.get("pool_size", 0), stats.get("pool_available", 0)
+            max_size = stats.get("pool_max", 0)
+            in_use = max(size - available, 0)
+            gauges["size"].add_metric([alias], size)
+            gauges["max"].add_metric([alias], max_size)
+            gauges["in_use"].add_metric([alias], in_use)
+            gauges["waiting"].add_metric([alias], stats.get("requests_waiting", 0))
+            gauges["saturation"].add_metric([alias], in_use / max_size if max_size else 0)
+            counters["requests"].add_metric([alias], stats.get("requests_num", 0))
+            counters["queued"].add_metric([alias], stats.get("requests_queued", 0))
+            counters["wait"].add_metric([alias], stats.get("requests_wait_ms", 0) / 1000)
+            counters["timeouts"].add_metric([alias], stats.get("requests_errors", 0))
+            counters["connections"].add_metric([alias], stats.get("connections_num", 0))
+
+        yield from gauges.values()
+        yield from counters.values()
+
+
+def _open_pools():
+    """(alias, pool) of the pools already created; scraping never opens one."""
+    for alias in connections:
+        pools = getattr(type(connections[alias]), "_connection_pools", {})
+        if alias in pools:
+            yield alias, pools[alias]
+
+
+REGISTRY.register(DatabasePoolCollector())
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:00
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Upper('product_id'), models.OrderBy(models.F('id'), descending=True), name='order_product_upper_id_idx'),
+        ),
+    ]
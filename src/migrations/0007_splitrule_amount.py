@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0006_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='splitrule',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:07
+
+import django.core.validators
+import django.utils.timezone
+import src.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0007_splitrule_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SplitConfiguration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_id', models.CharField(max_length=100, validators=[src.models.validate_not_empty, django.core.validators.MinLengthValidator(1)])),
+                ('fee_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('is_active', models.BooleanField(default=True)),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('effective_until', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('fee_percentage__gte', 0), ('fee_percentage__lte', 100)), name='split_configuration_fee_range'), models.CheckConstraint(condition=models.Q(('effective_until__isnull', True), ('effective_until__gt', models.F('effective_from')), _connector='OR'), name='split_configuration_valid_period')],
+            },
+        ),
+    ]
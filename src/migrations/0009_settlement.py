@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0008_splitconfiguration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_id', models.CharField(db_index=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PayoutItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SettlementRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField(blank=True, null=True)),
+                ('window_end', models.DateTimeField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=20)),
+                ('last_rule_id', models.BigIntegerField()),
+                ('max_rule_id', models.BigIntegerField()),
+                ('rules_settled', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='splitrule',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='splitrule',
+            index=models.Index(condition=models.Q(('settled_at__isnull', True)), fields=['id'], name='splitrule_unsettled_idx'),
+        ),
+        migrations.AddField(
+            model_name='payoutitem',
+            name='payout',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='src.payout'),
+        ),
+        migrations.AddField(
+            model_name='payoutitem',
+            name='split_rule',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='payout_item', to='src.splitrule'),
+        ),
+        migrations.AddConstraint(
+            model_name='settlementrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('status',), name='single_running_settlement'),
+        ),
+        migrations.AddField(
+            model_name='payout',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payouts', to='src.settlementrun'),
+        ),
+        migrations.AddConstraint(
+            model_name='payout',
+            constraint=models.UniqueConstraint(fields=('run', 'recipient_id'), name='unique_payout_recipient_per_run'),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class RunPostgreSQL(migrations.RunSQL):
+    """RunSQL on PostgreSQL only; other backends keep plain tables."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def partition_table_sql(table, key, indexes, months_ahead=3):
+    """Rebuild ``table`` as a table range-partitioned by month on ``key``,
+    keeping its rows and id sequence, then recreate ``indexes``.
+
+    One partition per UTC month from the oldest row up to ``months_ahead``
+    months after the current one, plus a DEFAULT partition. The partition
+    key must be part of the primary key, so it becomes ``(id, key)``, and
+    the id moves to a standalone sequence (identity columns are tied to the
+    old table).
+    """
+    return f"""
+DO $$
+DECLARE
+    first_row_at timestamptz;
+    max_id bigint;
+    month date;
+    last_month date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{months_ahead} months')::date;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = '{table}'::regclass) THEN
+        RETURN;
+    END IF;
+    SELECT min({key}), max(id) INTO first_row_at, max_id FROM {table};
+
+    CREATE TABLE {table}_partitioned (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE ({key});
+    ALTER TABLE {table}_partitioned ADD PRIMARY KEY (id, {key});
+    CREATE TABLE {table}_default PARTITION OF {table}_partitioned DEFAULT;
+
+    month := date_trunc('month', coalesce(first_row_at, now()) AT TIME ZONE 'UTC')::date;
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF {table}_partitioned FOR VALUES FROM (%L) TO (%L)',
+            '{table}_p' || to_char(month, 'YYYY_MM'),
+            month::timestamp AT TIME ZONE 'UTC',
+            (month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        month := (month + interval '1 month')::date;
+    END LOOP;
+
+    INSERT INTO {table}_partitioned SELECT * FROM {table};
+    DROP TABLE {table};
+    ALTER TABLE {table}_partitioned RENAME TO {table};
+
+    CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id;
+    ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq');
+    IF max_id IS NOT NULL THEN
+        PERFORM setval('{table}_id_seq', max_id);
+    END IF;
+
+{indexes}
+END
+$$;
+"""
+
+
+# The indexes of both tables as of migration 0009, names included, so the
+# later migrations find them
+ORDER_INDEXES = """
+    CREATE INDEX src_order_product_id_1f63e091 ON src_order (product_id);
+    CREATE INDEX src_order_product_id_1f63e091_like ON src_order (product_id varchar_pattern_ops);
+    CREATE INDEX order_product_upper_id_idx ON src_order (UPPER(product_id), id DESC);
+"""
+
+SPLITRULE_INDEXES = """
+    CREATE INDEX src_splitrule_order_id_3e9d5931 ON src_splitrule (order_id);
+    CREATE INDEX src_splitrule_recipient_id_c5b998a4 ON src_splitrule (recipient_id);
+    CREATE INDEX src_splitrule_recipient_id_c5b998a4_like ON src_splitrule (recipient_id varchar_pattern_ops);
+    CREATE INDEX splitrule_unsettled_idx ON src_splitrule (id) WHERE settled_at IS NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0009_settlement'),
+    ]
+
+    operations = [
+        # A foreign key must reference a unique key of the target, and the
+        # partitioned tables' keys include the partition column: the FKs
+        # are kept in Django only (see src/partitions.py on integrity)
+        migrations.AlterField(
+            model_name='payoutitem',
+            name='split_rule',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, related_name='payout_item', to='src.splitrule'),
+        ),
+        migrations.AlterField(
+            model_name='splitrule',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='split_rules', to='src.order'),
+        ),
+        # Partitioned tables stay compatible with the previous schema, so
+        # unapplying leaves them in place. One statement each, so the
+        # DO blocks are not split by sqlparse
+        RunPostgreSQL(
+            sql=[
+                partition_table_sql('src_order', 'created_at', ORDER_INDEXES),
+                partition_table_sql('src_splitrule', 'effective_date', SPLITRULE_INDEXES),
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
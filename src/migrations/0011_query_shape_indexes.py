@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:17
+
+import django.core.validators
+import src.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0010_partition_order_splitrule'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='splitrule',
+            name='recipient_id',
+            field=models.CharField(max_length=100, validators=[src.models.validate_not_empty, django.core.validators.MinLengthValidator(1)]),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'completed'), _negated=True), fields=['created_at'], name='order_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='splitrule',
+            index=models.Index(fields=['recipient_id', 'effective_date'], include=('value', 'amount'), name='splitrule_recipient_date_idx'),
+        ),
+    ]
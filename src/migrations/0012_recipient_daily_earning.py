@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0011_query_shape_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='earnings_recorded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RecipientDailyEarning',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_id', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('split_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('recipient_id', 'day'), name='unique_recipient_daily_earning')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations
+
+
+class RunPostgreSQL(migrations.RunSQL):
+    """RunSQL on PostgreSQL only; other backends have nothing to install."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+# jsonb as compact text for LIST_ALL_MODE=prebuilt (src/listing.py),
+# matching Python's json.loads + dumps round trip of JSONField values:
+# integers stay as written, other numbers become floats (1.50 -> 1.5,
+# 1.0 -> 1.0) and keys keep jsonb's order
+CREATE_JSON_COMPACT = r"""
+CREATE OR REPLACE FUNCTION src_json_compact(value jsonb) RETURNS text
+LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+-- Shortest round-trip float output whatever the session uses
+SET extra_float_digits = 1
+AS $$
+DECLARE
+    number text;
+    digits text;
+BEGIN
+    CASE jsonb_typeof(value)
+    WHEN 'object' THEN
+        RETURN '{' || COALESCE((
+            SELECT string_agg(to_json(entry.key)::text || ':' || src_json_compact(entry.item), ',' ORDER BY entry.position)
+            FROM jsonb_each(value) WITH ORDINALITY AS entry(key, item, position)
+        ), '') || '}';
+    WHEN 'array' THEN
+        RETURN '[' || COALESCE((
+            SELECT string_agg(src_json_compact(element.item), ',' ORDER BY element.position)
+            FROM jsonb_array_elements(value) WITH ORDINALITY AS element(item, position)
+        ), '') || ']';
+    WHEN 'number' THEN
+        number := value::text;
+        IF number ~ '^-?[0-9]+$' THEN
+            RETURN number;
+        END IF;
+        -- Same digits as Python's float repr
+        number := number::float8::text;
+        IF number ~ 'e\+15$' THEN
+            -- Python only switches to exponents from 1e16
+            digits := replace(replace(split_part(number, 'e', 1), '-', ''), '.', '');
+            digits := rpad(digits, greatest(length(digits), 16), '0');
+            RETURN CASE WHEN left(number, 1) = '-' THEN '-' ELSE '' END
+                || left(digits, 16) || '.' || COALESCE(NULLIF(substr(digits, 17), ''), '0');
+        END IF;
+        IF number !~ '[.e]' THEN
+            number := number || '.0';
+        END IF;
+        RETURN number;
+    ELSE
+        -- Strings (escaped as json), booleans and null
+        RETURN value::text;
+    END CASE;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0012_recipient_daily_earning'),
+    ]
+
+    operations = [
+        # One statement each, so the function body is not split by sqlparse
+        RunPostgreSQL(
+            sql=[CREATE_JSON_COMPACT],
+            reverse_sql=['DROP FUNCTION IF EXISTS src_json_compact(jsonb)'],
+        ),
+    ]
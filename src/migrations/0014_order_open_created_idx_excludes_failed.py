@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0013_json_compact_function'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_open_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['created_at'], name='order_open_created_idx'),
+        ),
+    ]
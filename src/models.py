@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Upper
 from django.core.validators import MinLengthValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -21,6 +24,19 @@ class OrderManager(models.Manager):
     def for_product(self, product_id):
         return self.get_queryset().filter(product_id=product_id)
 
+    def latest_for_product(self, product_id):
+        """Most recent order for a product, matched case-insensitively.
+
+        Filters on UPPER(product_id) so the lookup is served by
+        ``order_product_upper_id_idx`` instead of a sequential scan.
+        """
+        return (
+            self.get_queryset()
+            .alias(product_key=Upper("product_id"))
+            .filter(product_key=Upper(Value(product_id)))
+            .order_by("-id")[:1]
+        )
+
 
 class Order(models.Model):
     PENDING = 'pending'
@@ -71,8 +87,26 @@ class Order(models.Model):
         null=True
     )
 
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Set once the order's split amounts are added to RecipientDailyEarning
+    earnings_recorded = models.BooleanField(default=False)
+
     objects = OrderManager()
 
+    class Meta:
+        indexes = [
+            # Case-insensitive "latest order for product" lookups
+            models.Index(Upper("product_id"), F("id").desc(), name="order_product_upper_id_idx"),
+            # Dashboards: orders by status over a time range
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            # Open orders (pending/processing) are a small slice of the table;
+            # recovery and monitoring only ever look at those. Failed orders
+            # are final and grow without bound, so they stay out
+            models.Index(fields=["created_at"], condition=Q(status__in=["pending", "processing"]),
+                         name="order_open_created_idx"),
+        ]
+
     def clean(self):
         super().clean()
 
@@ -86,16 +120,19 @@ class SplitRule(models.Model):
         (FIXED, 'Fixed'),
     ]
     
+    # No database FK: src_order is partitioned; integrity is kept by the
+    # ORM and by detaching months in pairs (see src/partitions.py)
     order = models.ForeignKey(
         Order, 
         related_name='split_rules',
         on_delete=models.CASCADE, 
-        db_index=True
+        db_index=True,
+        db_constraint=False
     )
     
+    # Indexed by splitrule_recipient_date_idx (leading column)
     recipient_id = models.CharField(
         max_length=100, 
-        db_index=True,
         validators=[validate_not_empty, MinLengthValidator(1)]
     )
     
@@ -109,9 +146,250 @@ class SplitRule(models.Model):
         max_digits=10, 
         decimal_places=2,
     )
+
+    # Amount paid to the recipient, computed by src.splits
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+    )
     
     account_info = models.JSONField(default=dict)
     effective_date = models.DateTimeField(auto_now_add=True)
 
+    # Set when the rule is included in a Payout (manage.py settle_payouts)
+    settled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Settlement only scans rules that are still unsettled
+            models.Index(fields=['id'], condition=Q(settled_at__isnull=True), name='splitrule_unsettled_idx'),
+            # Recipient statements; INCLUDE makes it index-only (PostgreSQL)
+            models.Index(
+                fields=['recipient_id', 'effective_date'],
+                include=['value', 'amount'],
+                name='splitrule_recipient_date_idx',
+            ),
+        ]
+
     def clean(self):
         super().clean()
+
+
+class SplitConfiguration(models.Model):
+    """Platform fee in force between ``effective_from`` and ``effective_until``
+    (open-ended when null). Resolved through ``src.configuration``."""
+
+    recipient_id = models.CharField(
+        max_length=100,
+        validators=[validate_not_empty, MinLengthValidator(1)]
+    )
+
+    fee_percentage = models.DecimalField(max_digits=5, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+    effective_from = models.DateTimeField(default=timezone.now)
+    effective_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(fee_percentage__gte=0) & Q(fee_percentage__lte=100),
+                name='split_configuration_fee_range',
+            ),
+            models.CheckConstraint(
+                condition=Q(effective_until__isnull=True) | Q(effective_until__gt=F('effective_from')),
+                name='split_configuration_valid_period',
+            ),
+        ]
+
+
+class SettlementRun(models.Model):
+    """One execution of ``manage.py settle_payouts``.
+
+    Rules are processed in id order up to ``max_rule_id`` (fixed when the
+    run starts); ``last_rule_id`` is the checkpoint a crashed run resumes
+    from.
+    """
+
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+    ]
+
+    window_start = models.DateTimeField(null=True, blank=True)
+    window_end = models.DateTimeField()
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=RUNNING
+    )
+
+    last_rule_id = models.BigIntegerField()
+    max_rule_id = models.BigIntegerField()
+    rules_settled = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status'], condition=Q(status='running'), name='single_running_settlement'),
+        ]
+
+
+class Payout(models.Model):
+    """Total owed to a recipient by a settlement run."""
+
+    PENDING = 'pending'
+    PAID = 'paid'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PAID, 'Paid'),
+    ]
+
+    run = models.ForeignKey(
+        SettlementRun,
+        related_name='payouts',
+        on_delete=models.PROTECT
+    )
+
+    recipient_id = models.CharField(max_length=100, db_index=True)
+
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'recipient_id'], name='unique_payout_recipient_per_run'),
+        ]
+
+
+class PayoutItem(models.Model):
+    payout = models.ForeignKey(
+        Payout,
+        related_name='items',
+        on_delete=models.CASCADE
+    )
+
+    # One item per rule: a rule can never be paid twice
+    split_rule = models.OneToOneField(
+        SplitRule,
+        related_name='payout_item',
+        on_delete=models.PROTECT,
+        db_constraint=False
+    )
+
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+class RecipientDailyEarning(models.Model):
+    """Completed split amounts per recipient and day, maintained
+    incrementally by ``src.earnings``."""
+
+    recipient_id = models.CharField(max_length=100)
+    day = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    split_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for "recipient X between two days"
+            models.UniqueConstraint(fields=['recipient_id', 'day'], name='unique_recipient_daily_earning'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    IN_PROGRESS = 'in_progress'
+    COMPLETED = 'completed'
+
+    STATE_CHOICES = [
+        (IN_PROGRESS, 'In progress'),
+        (COMPLETED, 'Completed'),
+    ]
+
+    key = models.CharField(
+        max_length=255,
+        validators=[validate_not_empty, MinLengthValidator(1)]
+    )
+
+    request_fingerprint = models.CharField(max_length=64)
+
+    state = models.CharField(
+        max_length=20,
+        choices=STATE_CHOICES,
+        default=IN_PROGRESS
+    )
+
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+
+    # Order created under the key; an execution that takes over a stale
+    # lock resumes it instead of charging a new order. No database FK:
+    # src_order is partitioned (see src/partitions.py)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='+',
+    )
+
+    locked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key'], name='unique_idempotency_key'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """Payment event recorded in the same transaction as the order change
+    and delivered later by ``manage.py run_outbox_worker``."""
+
+    PENDING = 'pending'
+    DONE = 'done'
+    DEAD = 'dead'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+        (DEAD, 'Dead'),
+    ]
+
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+
+    attempts = models.PositiveIntegerField(default=0)
+    # Next time a worker may claim the event (retry backoff / claim lease)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers only ever scan the pending backlog
+            models.Index(fields=['available_at', 'id'], condition=Q(status='pending'), name='outbox_pending_idx'),
+        ]
@@ -0,0 +1,173 @@
+import logging
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import outbox_batch_seconds, outbox_events_processed
+from .models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_local = threading.local()
+
+
+def handler(event_type):
+    """Register the function that delivers ``event_type`` events."""
+    def register(func):
+        _handlers[event_type] = func
+        return func
+    return register
+
+
+def publish(event_type, payload):
+    """Record an event in the outbox, in the caller's transaction."""
+    event = OutboxEvent(event_type=event_type, payload=payload)
+    pending = getattr(_local, "pending", None)
+    if pending is not None:
+        pending.append(event)
+    else:
+        event.save()
+    return event
+
+
+@contextmanager
+def collect():
+    """Buffer the events published inside the block and insert them with a
+    single bulk_create when it exits without an error."""
+    if getattr(_local, "pending", None) is not None:
+        yield
+        return
+
+    _local.pending = pending = []
+    try:
+        yield
+    finally:
+        _local.pending = None
+    if pending:
+        OutboxEvent.objects.bulk_create(pending)
+
+
+class OutboxWorker:
+    """Drains the outbox in batches.
+
+    A batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` and
+    leased by pushing ``available_at`` forward, so the row locks are
+    released before the handlers run and several workers can share the
+    table. Handlers run on a thread pool; failures are retried with
+    exponential backoff until ``max_attempts``, then marked dead. Events
+    of a crashed worker become claimable again when the lease expires.
+    """
+
+    def __init__(self, batch_size=None, concurrency=None, max_attempts=None,
+                 lease=None, retry_base=None, retry_max=None):
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.concurrency = concurrency or settings.OUTBOX_CONCURRENCY
+        self.max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+        self.lease = timedelta(seconds=lease or settings.OUTBOX_LEASE)
+        self.retry_base = retry_base or settings.OUTBOX_RETRY_BASE
+        self.retry_max = retry_max or settings.OUTBOX_RETRY_MAX
+
+    def run(self, once=False, poll_interval=1.0, stop_event=None):
+        """Process batches until the outbox is empty (``once``) or
+        ``stop_event`` is set. Returns the number of events handled."""
+        stop_event = stop_event or threading.Event()
+        handled = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not stop_event.is_set():
+                processed = self.process_batch(pool)
+                handled += processed
+                if processed:
+                    continue
+                if once:
+                    break
+                stop_event.wait(poll_interval)
+        return handled
+
+    def process_batch(self, pool=None):
+        events = self._claim()
+        if not events:
+            return 0
+
+        started = time.monotonic()
+        if pool is None:
+            errors = [self._dispatch(event) for event in events]
+        else:
+            errors = list(pool.map(self._dispatch_in_thread, events))
+        self._settle(events, errors)
+        outbox_batch_seconds.observe(time.monotonic() - started)
+        return len(events)
+
+    def _claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxEvent.PENDING, available_at__lte=now)
+                .order_by("available_at", "id")[:self.batch_size]
+            )
+            if events:
+                OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                    available_at=now + self.lease,
+                    attempts=F("attempts") + 1,
+                )
+        for event in events:
+            event.attempts += 1
+        return events
+
+    def _dispatch(self, event):
+        try:
+            func = _handlers.get(event.event_type)
+            if func is None:
+                raise LookupError(f"No outbox handler for {event.event_type}")
+            func(event.payload)
+            return None
+        except Exception as e:
+            logger.warning("Outbox event %s (%s) failed: %s", event.pk, event.event_type, e)
+            return e
+
+    def _dispatch_in_thread(self, event):
+        try:
+            return self._dispatch(event)
+        finally:
+            # Pool threads keep their own connections; drop them per Django's
+            # CONN_MAX_AGE like a request would
+            close_old_connections()
+
+    def _settle(self, events, errors):
+        now = timezone.now()
+        done = [event for event, error in zip(events, errors) if error is None]
+        if done:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in done]).update(
+                status=OutboxEvent.DONE,
+                processed_at=now,
+                last_error="",
+            )
+            for event in done:
+                outbox_events_processed.labels(event_type=event.event_type, result="succeeded").inc()
+
+        for event, error in zip(events, errors):
+            if error is None:
+                continue
+            if event.attempts >= self.max_attempts:
+                changes, result = {"status": OutboxEvent.DEAD, "processed_at": now}, "dead"
+                logger.error("Outbox event %s (%s) gave up after %s attempts", event.pk, event.event_type, event.attempts)
+            else:
+                changes, result = {"available_at": now + self._backoff(event.attempts)}, "retried"
+            OutboxEvent.objects.filter(pk=event.pk).update(last_error=str(error), **changes)
+            outbox_events_processed.labels(event_type=event.event_type, result=result).inc()
+
+    def _backoff(self, attempts):
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        # Jitter keeps events that failed together from retrying together
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
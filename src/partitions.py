@@ -0,0 +1,159 @@
+"""Monthly range partitioning of the order tables (PostgreSQL only).
+
+``src_order`` is partitioned on ``created_at`` and ``src_splitrule`` on
+``effective_date``, one partition per UTC month (``src_order_p2026_10``)
+plus a DEFAULT partition that catches rows outside the created range.
+Migration 0010 converts the tables.
+
+Integrity trade-off: partitioned tables cannot be the target of a foreign
+key on ``id`` alone, so the relations pointing at them (SplitRule.order,
+PayoutItem.split_rule) are declared with ``db_constraint=False``. Django
+still cascades and protects deletes made through the ORM, but PostgreSQL
+no longer rejects a split rule whose order does not exist: raw SQL and
+partition maintenance must keep the pairs consistent themselves. That is
+why old months are detached with ``detach_month``, which archives an
+order month together with all of its split rules.
+"""
+import re
+
+from datetime import date, datetime, timezone
+
+
+PARTITIONED_TABLES = {
+    "src_order": "created_at",
+    "src_splitrule": "effective_date",
+}
+
+
+def supports_partitioning(connection):
+    return connection.vendor == "postgresql"
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def month_bounds(month):
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end_month = add_months(month, 1)
+    return start, datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc)
+
+
+def is_partitioned(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+        return cursor.fetchone() is not None
+
+
+def monthly_partitions(connection, table):
+    """Attached monthly partitions of ``table`` as ``{month: name}``."""
+    pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})_(\d{{2}})$")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(connection, table, month):
+    """Create the partition for ``month`` unless it exists.
+
+    Rows of that month that already landed in the DEFAULT partition are
+    moved into the new partition; otherwise attaching it would fail.
+    Returns True when a partition was created.
+    """
+    key = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    if month in monthly_partitions(connection, table):
+        return False
+
+    start, end = month_bounds(month)
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT 1 FROM {qn(table + '_default')} WHERE {qn(key)} >= %s AND {qn(key)} < %s LIMIT 1",
+            [start, end],
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+            return True
+
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(table + '_default')} WHERE {qn(key)} >= %s AND {qn(key)} < %s RETURNING *) "
+            f"INSERT INTO {qn(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    return True
+
+
+def detach_month(connection, month, archive_schema=None, drop=False):
+    """Detach the ``month`` partitions of src_order and src_splitrule
+    together, keyed on the orders' month, and drop them or move them to
+    ``archive_schema``.
+
+    A split rule is written right after its order, so the rules of an order
+    created at the end of a month can land in the next month's src_splitrule
+    partition. Those are moved into the detached split rule table with their
+    order: no rule is left pointing at an archived order, and the archived
+    pair holds whole orders. Detach months oldest first, so a month's
+    rules partition no longer holds rules of the previous month's orders.
+
+    Returns the detached table names, or an empty list when the month has
+    no src_order partition.
+    """
+    order_partition = monthly_partitions(connection, "src_order").get(month)
+    if order_partition is None:
+        return []
+    rules_partition = monthly_partitions(connection, "src_splitrule").get(month)
+
+    qn = connection.ops.quote_name
+    _, end = month_bounds(month)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE src_order DETACH PARTITION {qn(order_partition)}")
+        if rules_partition is None:
+            rules_partition = partition_name("src_splitrule", month)
+            cursor.execute(f"CREATE TABLE {qn(rules_partition)} (LIKE src_splitrule INCLUDING DEFAULTS)")
+        else:
+            cursor.execute(f"ALTER TABLE src_splitrule DETACH PARTITION {qn(rules_partition)}")
+
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM src_splitrule WHERE effective_date >= %s "
+            f"AND order_id IN (SELECT id FROM {qn(order_partition)}) RETURNING *) "
+            f"INSERT INTO {qn(rules_partition)} SELECT * FROM moved",
+            [end],
+        )
+
+        for name in (order_partition, rules_partition):
+            if drop:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+            elif archive_schema:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {qn(archive_schema)}")
+                cursor.execute(f"ALTER TABLE {qn(name)} SET SCHEMA {qn(archive_schema)}")
+    return [order_partition, rules_partition]
@@ -0,0 +1,170 @@
+"""Per-request query count, DB time and gateway time, with budgets.
+
+``RequestBudgetMiddleware`` opens a ``RequestProfile`` for each request
+in a context variable. A DB execute wrapper installed on every connection
+and ``gateway_call()`` around payment gateway calls add to it; context
+variables follow the request into ``sync_to_async`` threads and asyncio
+tasks, so the async pipeline is measured too. Each request is observed in
+the ``request_*`` histograms, labelled by URL name, and a request over
+its ``REQUEST_BUDGETS`` entry is logged with the SQL it ran.
+"""
+import contextvars
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import request_budget_exceeded, request_db_seconds, request_gateway_seconds, request_queries
+
+
+logger = logging.getLogger(__name__)
+
+_current_profile = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """What one request spent; shared by the threads serving it."""
+
+    def __init__(self, max_statements=None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.gateway_time = 0.0
+        self.statements = []
+        self.max_statements = max_statements if max_statements is not None else settings.REQUEST_PROFILE_MAX_STATEMENTS
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            if len(self.statements) < self.max_statements:
+                self.statements.append((duration, sql))
+
+    def record_gateway(self, duration):
+        with self._lock:
+            self.gateway_time += duration
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_request(profile=None):
+    """Attribute the queries and gateway calls of the block to ``profile``."""
+    profile = profile or RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def gateway_call():
+    """Time a payment gateway call into the current request, if any."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.record_gateway(time.perf_counter() - started)
+
+
+def record_queries(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder():
+    """Add ``record_queries`` to every connection, current and future."""
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_add_query_recorder, dispatch_uid="src.profiling.record_queries")
+    for connection in connections.all(initialized_only=True):
+        _add_query_recorder(None, connection)
+
+
+def _add_query_recorder(sender, connection, **kwargs):
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+class RequestBudgetMiddleware:
+    """Observes each request's profile and logs the ones over budget.
+
+    ``REQUEST_BUDGETS`` maps URL names to limits: ``queries``, ``db_ms``,
+    ``gateway_ms`` and ``total_ms``; missing keys are not checked.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budgets = settings.REQUEST_BUDGETS
+        install_query_recorder()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with profile_request() as profile:
+            response = self.get_response(request)
+        self.finish(request, profile, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with profile_request() as profile:
+            response = await self.get_response(request)
+        self.finish(request, profile, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, profile, elapsed):
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else "unresolved"
+
+        request_queries.labels(view=view).observe(profile.queries)
+        request_db_seconds.labels(view=view).observe(profile.db_time)
+        request_gateway_seconds.labels(view=view).observe(profile.gateway_time)
+
+        budget = self.budgets.get(view)
+        if budget:
+            self.check_budget(request, view, budget, profile, elapsed)
+
+    def check_budget(self, request, view, budget, profile, elapsed):
+        spent = {
+            "queries": profile.queries,
+            "db_ms": profile.db_time * 1000,
+            "gateway_ms": profile.gateway_time * 1000,
+            "total_ms": elapsed * 1000,
+        }
+        exceeded = [name for name, limit in budget.items() if name in spent and spent[name] > limit]
+        if not exceeded:
+            return
+
+        for name in exceeded:
+            request_budget_exceeded.labels(view=view, budget=name).inc()
+        statements = "\n".join(f"  {duration * 1000:8.2f} ms  {sql}" for duration, sql in profile.statements)
+        if profile.queries > len(profile.statements):
+            statements += f"\n  ... {profile.queries - len(profile.statements)} more"
+        logger.warning(
+            "Request budget exceeded (%s) for %s %s [%s]: %d queries, db %.1f ms, gateway %.1f ms, total %.1f ms\n%s",
+            ", ".join(exceeded), request.method, request.path, view,
+            profile.queries, spent["db_ms"], spent["gateway_ms"], spent["total_ms"], statements,
+        )
@@ -0,0 +1,84 @@
+import functools
+import json
+
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class MoneyJSONEncoder(JSONEncoder):
+    """DRF's encoder, except that Decimal is written as its exact string
+    (``"150.00"``) instead of going through float."""
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+class PrebuiltJSON(list):
+    """JSON documents (text) already built elsewhere, e.g. by the database,
+    rendered as an array of them without being parsed again. They must
+    already be in the renderer's output format (compact, non-ASCII as is)."""
+
+    def loaded(self):
+        return [json.loads(document) for document in self]
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer for the plain dict/list payloads of the read endpoints.
+
+    Payloads are built from ``.values()`` rows, so they hold only JSON
+    types, Decimal and datetime; one encoder, configured once from the
+    DRF settings, renders all of them. A ``PrebuiltJSON`` payload, or a
+    top-level dict holding one, is spliced in as text. Indented output
+    (``; indent=N`` in the Accept header) goes through the regular
+    JSONRenderer.
+    """
+
+    encoder_class = MoneyJSONEncoder
+
+    def __init__(self):
+        super().__init__()
+        self._encode = _encoder(self.encoder_class, self.ensure_ascii, self.compact, self.strict)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(_loaded(data), accepted_media_type, renderer_context)
+
+        # Same escaping as JSONRenderer: U+2028/2029 are invalid in JavaScript strings
+        return self._render(data).replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+
+    def _render(self, data):
+        if isinstance(data, PrebuiltJSON):
+            return "[" + ",".join(data) + "]"
+        if isinstance(data, dict) and any(isinstance(value, PrebuiltJSON) for value in data.values()):
+            # Top-level envelopes only (pagination): {"next": ..., "results": PrebuiltJSON}
+            item_separator, key_separator = (",", ":") if self.compact else (", ", ": ")
+            return "{" + item_separator.join(
+                self._encode(str(key)) + key_separator + self._render(value) for key, value in data.items()
+            ) + "}"
+        return self._encode(data)
+
+
+@functools.cache
+def _encoder(encoder_class, ensure_ascii, compact, strict):
+    """The bound ``encode`` of a shared encoder for these options."""
+    encoder = encoder_class(
+        ensure_ascii=ensure_ascii,
+        allow_nan=not strict,
+        separators=(",", ":") if compact else (", ", ": "),
+    )
+    return encoder.encode
+
+
+def _loaded(data):
+    """``data`` with its PrebuiltJSON values parsed, for the other renderers."""
+    if isinstance(data, PrebuiltJSON):
+        return data.loaded()
+    if isinstance(data, dict):
+        return {key: _loaded(value) for key, value in data.items()}
+    return data
@@ -0,0 +1,29 @@
+"""Swagger annotations for the views, imported from here instead of drf_yasg.
+
+Under the full profile (``configs.settings``) these are drf_yasg's
+``openapi`` and ``swagger_auto_schema``. Under the API-only profile
+(``configs.settings_api``, without drf_yasg in INSTALLED_APPS) drf_yasg
+is never imported: ``swagger_auto_schema`` returns the view unchanged and
+``openapi`` accepts the schema declarations and discards them.
+"""
+from django.apps import apps
+
+
+class _Discarded:
+    """Stands for ``drf_yasg.openapi``: any attribute or call is accepted."""
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+if apps.is_installed("drf_yasg"):
+    from drf_yasg import openapi  # noqa: F401
+    from drf_yasg.utils import swagger_auto_schema  # noqa: F401
+else:
+    openapi = _Discarded()
+
+    def swagger_auto_schema(**kwargs):
+        return lambda view: view
@@ -1,12 +1,35 @@
-import stripe
+import asyncio
+import contextvars
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
 
-from .models import Order, SplitRule
+from .models import IdempotencyKey, Order, SplitRule
+from .configuration import split_configuration
+from .splits import Rule, SplitError, compute_split, compute_splits, from_cents, to_cents
+from . import outbox
 from .events import payment_processed, payment_failed, payout_triggered
+from .gateways import GatewayError, GatewayUnavailable, get_gateway
+from .profiling import gateway_call
+
+
+logger = logging.getLogger(__name__)
+
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+class PaymentPending(GatewayError):
+    """The charge may have gone through: ``order`` stays PROCESSING until
+    recover_stale_orders gets the outcome from the gateway."""
+
+    def __init__(self, order, error):
+        super().__init__(str(error))
+        self.order = order
 
 
 # services.py
@@ -14,61 +37,373 @@ class PaymentProcessor:
     CAKTO_RECIPIENT_ID = "cakto_fee_account"
     CAKTO_FEE_PERCENTAGE = 5  # 5%
 
-    def process_payment(self, order_data):
+    def __init__(self, gateway=None):
+        # Defaults to the shared adapter for settings.PAYMENT_GATEWAY
+        self.gateway = gateway or get_gateway()
+
+    def process_payment(self, order_data, idempotency_key=None):
+        """Charge a new order for ``order_data``.
+
+        ``idempotency_key`` is the client's Idempotency-Key, already claimed
+        in the IdempotencyStore: the order is recorded on it, and an
+        execution that takes over a stale key resumes that order (same
+        gateway idempotency key) instead of charging a new one.
+        """
         order = None
+        timings = {"started": time.perf_counter()}
         try:
             # Validação primeiro
             self._validate_payment(order_data)
-            
-            # Se validação passar, processa o pagamento
-            with transaction.atomic():
-                order = Order.objects.create(
+
+            # Fase 1: persiste o pedido e as regras em uma transação curta
+            order, split_rules = self._resume_or_create_order(order_data, idempotency_key)
+            if order.status != Order.PROCESSING:
+                # Finished by the crashed execution or by recovery
+                return order
+            self._release_connection()
+
+            # Fase 2: chamada ao gateway sem transação (nem locks, nem conexão) abertos
+            timings["gateway_started"] = time.perf_counter()
+            payment_intent = self._charge(order, order_data)
+            timings["gateway_finished"] = time.perf_counter()
+
+            # Fase 3: finaliza o status em uma segunda transação curta
+            self._complete_order(order, payment_intent, split_rules)
+
+            self._log_payment("payment_completed", order, timings)
+            return order
+
+        except Exception as e:
+            if order and order.pk:
+                if not self._outcome_unknown(e):
+                    self._fail_order(order, str(e))
+            else:
+                payment_failed.send(sender=self.__class__, order=None, error=str(e))
+
+            self._log_payment(self._failure_event(order, e), order, timings, error=e)
+            self._raise_pending(order, e)
+            raise
+
+    def process_batch(self, orders_data, max_workers=None):
+        """Process many payments with bulk writes and concurrent gateway calls.
+
+        Returns one result dict per payload, in order. A failed item never
+        affects the others.
+        """
+        started = time.perf_counter()
+        results, accepted, splits = self._validate_batch(orders_data)
+        if not accepted:
+            return results
+
+        # Fase 1: todos os pedidos e regras em uma transação curta
+        orders, split_rules = self._create_orders_batch(accepted, splits)
+        self._release_connection()
+        gateway_started = time.perf_counter()
+
+        # Fase 2: chamadas ao gateway em paralelo, com pool limitado
+        def charge(item):
+            order, (_, order_data) = item
+            try:
+                return self._charge(order, order_data), None
+            except Exception as e:
+                return None, e
+
+        max_workers = max_workers or settings.PAYMENT_BATCH_MAX_WORKERS
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(orders))) as executor:
+            # Each call runs in a copy of the request's context, so its
+            # gateway time is attributed to the request being profiled
+            futures = [
+                executor.submit(contextvars.copy_context().run, charge, item)
+                for item in zip(orders, accepted)
+            ]
+            charges = [future.result() for future in futures]
+        gateway_seconds = time.perf_counter() - gateway_started
+
+        # Fase 3: finaliza todos os status em uma segunda transação curta
+        self._finalize_batch(orders, split_rules, charges)
+
+        self._log_batch(results, orders, charges, started, gateway_seconds)
+        return self._batch_results(results, accepted, orders, charges)
+
+    # PaymentIntent statuses after which the charge can no longer succeed
+    # on its own; any other status may still change (processing,
+    # requires_action, requires_capture...)
+    FAILED_INTENT_STATUSES = ("canceled", "requires_payment_method")
+
+    def recover_stale_orders(self, older_than=timedelta(minutes=15)):
+        """Resolve orders left in PROCESSING by a crash between phases.
+
+        The gateway is the source of truth: an order whose PaymentIntent
+        succeeded is completed; one without an intent, or whose intent was
+        canceled or declined, is marked as failed. Orders whose intent is
+        still in progress, or that could not be looked up, are left for the
+        next pass. Returns the counts per outcome (``processing`` for the
+        ones left).
+        """
+        cutoff = timezone.now() - older_than
+        stale_orders = Order.objects.filter(
+            status=Order.PROCESSING,
+            created_at__lt=cutoff,
+        ).order_by("id")
+
+        recovered = {Order.COMPLETED: 0, Order.FAILED: 0, Order.PROCESSING: 0}
+        for order in stale_orders.iterator():
+            try:
+                payment_intent = self._find_payment(order)
+            except Exception as e:
+                logger.warning(
+                    "payment_recovery_failed (order %s)", order.pk,
+                    extra={"event": "payment_recovery_failed", "order_id": order.pk, "error": str(e)},
+                )
+                recovered[Order.PROCESSING] += 1
+                continue
+
+            if payment_intent is not None and payment_intent.status == "succeeded":
+                if self._complete_order(order, payment_intent):
+                    recovered[Order.COMPLETED] += 1
+            elif payment_intent is None or payment_intent.status in self.FAILED_INTENT_STATUSES:
+                if self._fail_order(order, "Payment not confirmed by the gateway"):
+                    recovered[Order.FAILED] += 1
+            else:
+                recovered[Order.PROCESSING] += 1
+
+        return recovered
+
+    def _validate_batch(self, orders_data):
+        """Validate every payload and split all of them in one vectorized call.
+
+        Returns the results with the rejected payloads filled in, the
+        accepted ``(index, order_data)`` pairs and, for each of them, its
+        ``(rule_specs, cents)``. When some rule set does not add up, the
+        payloads are split one at a time to tell which.
+        """
+        results = [None] * len(orders_data)
+        accepted, rule_sets = [], []
+        with outbox.collect():
+            for index, order_data in enumerate(orders_data):
+                try:
+                    self._validate_fields(order_data)
+                    rule_specs = self._split_rule_specs(order_data)
+                except Exception as e:
+                    self._reject(results, index, e)
+                else:
+                    accepted.append((index, order_data))
+                    rule_sets.append(rule_specs)
+
+            try:
+                amounts = self._split_amounts_batch(accepted, rule_sets)
+            except SplitError:
+                checked = []
+                for (index, order_data), rule_specs in zip(accepted, rule_sets):
+                    try:
+                        cents = self._split_amounts(order_data["amount"], rule_specs)
+                    except SplitError as e:
+                        self._reject(results, index, e)
+                    else:
+                        checked.append(((index, order_data), rule_specs, cents))
+                accepted = [item for item, _, _ in checked]
+                rule_sets = [rule_specs for _, rule_specs, _ in checked]
+                amounts = [cents for _, _, cents in checked]
+        return results, accepted, list(zip(rule_sets, amounts))
+
+    def _reject(self, results, index, error):
+        results[index] = {"index": index, "status": Order.FAILED, "error": str(error)}
+        payment_failed.send(sender=self.__class__, order=None, error=str(error))
+
+    def _create_orders_batch(self, accepted, splits):
+        with transaction.atomic():
+            orders = Order.objects.bulk_create([
+                Order(
                     product_id=order_data["product_id"],
                     product_name=order_data.get("product_name", ""),
-                    amount=order_data.get("amount", 100.00)
+                    amount=order_data.get("amount", 100.00),
+                    status=Order.PROCESSING,
                 )
+                for _, order_data in accepted
+            ])
+            split_rules = [
+                self._split_rule_objects(order, rule_specs, amounts)
+                for order, (rule_specs, amounts) in zip(orders, splits)
+            ]
+            SplitRule.objects.bulk_create([rule for rules in split_rules for rule in rules])
 
-                payment_intent = self._charge_via_stripe(order, order_data)
-
-                user_percentage = 100 - self.CAKTO_FEE_PERCENTAGE
-                split_rules = [
-                    SplitRule.objects.create(
-                        order=order,
-                        recipient_id=order_data.get("user_id", "unknown_user"),
-                        type=SplitRule.PERCENTAGE,
-                        value=user_percentage,
-                        account_info=order_data.get("user_account_info", {})
-                    ),
-                    SplitRule.objects.create(
-                        order=order,
-                        recipient_id=self.CAKTO_RECIPIENT_ID,
-                        type=SplitRule.PERCENTAGE,
-                        value=self.CAKTO_FEE_PERCENTAGE,
-                        account_info={"platform": "cakto"}
-                    )
-                ]
+        return orders, split_rules
 
+    def _finalize_batch(self, orders, split_rules, charges):
+        completed, failed = [], []
+        for order, rules, (payment_intent, error) in zip(orders, split_rules, charges):
+            if error is None:
                 order.status = Order.COMPLETED
                 order.stripe_payment_id = payment_intent.id
-                order.save()
+                completed.append((order, rules))
+            elif self._outcome_unknown(error):
+                continue
+            else:
+                order.status = Order.FAILED
+                failed.append((order, error))
 
+        with transaction.atomic(), outbox.collect():
+            Order.objects.bulk_update([order for order, _ in completed], ["status", "stripe_payment_id"])
+            Order.objects.filter(pk__in=[order.pk for order, _ in failed]).update(status=Order.FAILED)
+
+            for order, rules in completed:
                 payment_processed.send(sender=self.__class__, order=order)
-                payout_triggered.send(sender=self.__class__, order=order, split_rules=split_rules)
+                payout_triggered.send(sender=self.__class__, order=order, split_rules=rules)
+            for order, error in failed:
+                payment_failed.send(sender=self.__class__, order=order, error=str(error))
 
-                return order
+    def _batch_results(self, results, accepted, orders, charges):
+        for order, (index, _), (_, error) in zip(orders, accepted, charges):
+            results[index] = {"index": index, "order_id": order.id, "status": order.status}
+            if error is not None:
+                results[index]["error"] = str(error)
+        return results
 
-        except Exception as e:
-            if order and order.pk:
-                order.status = Order.FAILED
-                order.save()
-                payment_failed.send(sender=self.__class__, order=order, error=str(e))
-            else:
-                payment_failed.send(sender=self.__class__, order=None, error=str(e))
+    def _resume_or_create_order(self, order_data, idempotency_key):
+        order = self._claimed_order(idempotency_key)
+        if order is not None:
+            return order, None
+        return self._create_order(order_data, idempotency_key)
 
-            raise
+    def _claimed_order(self, idempotency_key):
+        """The order an earlier execution created under ``idempotency_key``,
+        or None."""
+        if not idempotency_key:
+            return None
+        return Order.objects.filter(
+            pk__in=IdempotencyKey.objects.filter(key=idempotency_key).values("order_id")
+        ).first()
+
+    def _create_order(self, order_data, idempotency_key=None):
+        with transaction.atomic():
+            order = Order.objects.create(
+                product_id=order_data["product_id"],
+                product_name=order_data.get("product_name", ""),
+                amount=order_data.get("amount", 100.00),
+                status=Order.PROCESSING,
+            )
+            split_rules = SplitRule.objects.bulk_create(self._build_split_rules(order, order_data))
+            if idempotency_key:
+                # Committed with the order: a takeover always finds it
+                IdempotencyKey.objects.filter(key=idempotency_key).update(order=order)
+
+        return order, split_rules
+
+    def _release_connection(self):
+        """Give the pooled connection back before the gateway call.
+
+        Otherwise each payment holds a pool slot for the whole round trip
+        and throughput is capped at pool size / gateway latency. The next
+        query (phase 3) checks a connection out again. Persistent
+        connections (no pool) are per thread and kept: closing them would
+        only add a reconnect.
+        """
+        if connection.settings_dict["OPTIONS"].get("pool") and not connection.in_atomic_block:
+            connection.close()
+
+    def _build_split_rules(self, order, order_data):
+        rule_specs = self._split_rule_specs(order_data)
+        return self._split_rule_objects(order, rule_specs, self._split_amounts(order.amount, rule_specs))
+
+    def _split_rule_objects(self, order, rule_specs, amounts):
+        return [
+            SplitRule(
+                order=order,
+                recipient_id=spec["recipient_id"],
+                type=spec["type"],
+                value=spec["value"],
+                account_info=spec.get("account_info") or {},
+                amount=from_cents(cents),
+            )
+            for spec, cents in zip(rule_specs, amounts)
+        ]
+
+    def _split_rule_specs(self, order_data):
+        """Recipient rules followed by the platform fee.
+
+        The fee comes from the SplitConfiguration in force (class constants
+        as fallback). Without ``split_rules`` in the payload the user
+        receives the remaining share; explicit percentage rules must leave
+        exactly the platform fee to reach 100%.
+        """
+        fee_recipient_id, fee_percentage = self._fee_configuration()
+        rule_specs = order_data.get("split_rules")
+        if not rule_specs:
+            rule_specs = [{
+                "recipient_id": order_data.get("user_id", "unknown_user"),
+                "type": SplitRule.PERCENTAGE,
+                "value": 100 - fee_percentage,
+                "account_info": order_data.get("user_account_info", {}),
+            }]
+        return [
+            *rule_specs,
+            {
+                "recipient_id": fee_recipient_id,
+                "type": SplitRule.PERCENTAGE,
+                "value": fee_percentage,
+                "account_info": {"platform": "cakto"},
+            },
+        ]
+
+    def _fee_configuration(self):
+        # Served from the per-process cache; never queries on the hot path
+        return split_configuration.current() or (self.CAKTO_RECIPIENT_ID, self.CAKTO_FEE_PERCENTAGE)
+
+    def _split_amounts(self, amount, rule_specs):
+        return compute_split(to_cents(amount), self._rules(rule_specs))
+
+    def _split_amounts_batch(self, accepted, rule_sets):
+        return compute_splits(
+            [to_cents(order_data["amount"]) for _, order_data in accepted],
+            [self._rules(rule_specs) for rule_specs in rule_sets],
+        )
+
+    def _rules(self, rule_specs):
+        return [Rule(spec["recipient_id"], spec["type"], spec["value"]) for spec in rule_specs]
+
+    def _complete_order(self, order, payment_intent, split_rules=None):
+        """Mark ``order`` COMPLETED unless it was already finalized; returns
+        whether it was."""
+        with transaction.atomic(), outbox.collect():
+            # Single targeted UPDATE; the status guard keeps a concurrent
+            # recovery run from finalizing the same order twice.
+            updated = Order.objects.filter(pk=order.pk, status=Order.PROCESSING).update(
+                status=Order.COMPLETED,
+                stripe_payment_id=payment_intent.id,
+            )
+            if not updated:
+                order.refresh_from_db(fields=["status", "stripe_payment_id"])
+                return False
+
+            order.status = Order.COMPLETED
+            order.stripe_payment_id = payment_intent.id
+
+            if split_rules is None:
+                split_rules = list(order.split_rules.all())
+            payment_processed.send(sender=self.__class__, order=order)
+            payout_triggered.send(sender=self.__class__, order=order, split_rules=split_rules)
+        return True
+
+    def _fail_order(self, order, error_message):
+        """Mark ``order`` FAILED unless it was already finalized (e.g. a
+        late phase 3 completed it during recovery); returns whether it was."""
+        with transaction.atomic():
+            updated = Order.objects.filter(pk=order.pk, status=Order.PROCESSING).update(status=Order.FAILED)
+            if not updated:
+                order.refresh_from_db(fields=["status"])
+                return False
+
+            order.status = Order.FAILED
+            payment_failed.send(sender=self.__class__, order=order, error=error_message)
+        return True
 
     def _validate_payment(self, order_data):
         """Validação rigorosa antes de qualquer operação de banco"""
+        self._validate_fields(order_data)
+        # Rejects rule sets that do not add up before anything is persisted
+        self._split_amounts(order_data["amount"], self._split_rule_specs(order_data))
+
+    def _validate_fields(self, order_data):
         if not order_data.get("payment_method_id"):
             raise ValueError("Payment method ID is required")
         
@@ -94,9 +429,24 @@ class PaymentProcessor:
         if not order_data.get("user_id"):
             raise ValueError("User ID is required")
 
-    def _charge_via_stripe(self, order, order_data):
-        amount_cents = int(float(order.amount) * 100)
-        payment_intent = stripe.PaymentIntent.create(
+        split_rules = order_data.get("split_rules")
+        if split_rules is not None:
+            if not isinstance(split_rules, list) or not all(
+                isinstance(rule, dict) and rule.get("recipient_id") and "type" in rule and "value" in rule
+                for rule in split_rules
+            ):
+                raise ValueError("split_rules must be a list of {recipient_id, type, value}")
+
+    def _charge(self, order, order_data):
+        with gateway_call():
+            payment_intent = self.gateway.create_payment(
+                self._payment_intent_params(order, order_data), self._idempotency_key(order)
+            )
+        return self._check_payment_intent(payment_intent)
+
+    def _payment_intent_params(self, order, order_data):
+        amount_cents = to_cents(order.amount)
+        return dict(
             amount=amount_cents,
             currency="brl",
             payment_method=order_data["payment_method_id"],
@@ -106,10 +456,67 @@ class PaymentProcessor:
             payment_method_types=["card"],
             setup_future_usage="off_session" if order_data.get("save_payment_method") else None,
         )
+
+    def _idempotency_key(self, order):
+        # Lets a retried or recovered charge reuse the original intent
+        return f"order-{order.id}"
+
+    def _check_payment_intent(self, payment_intent):
         if payment_intent.status != "succeeded":
             raise Exception(f"Payment failed with status: {payment_intent.status}")
         return payment_intent
 
+    def _outcome_unknown(self, error):
+        # The charge may have gone through (e.g. read timeout): the order
+        # stays PROCESSING and recover_stale_orders asks the gateway later
+        return isinstance(error, GatewayError) and not isinstance(error, GatewayUnavailable)
+
+    def _raise_pending(self, order, error):
+        # Carries the order out, so the caller can answer with its id
+        if order and order.pk and self._outcome_unknown(error):
+            raise PaymentPending(order, error) from error
+
+    def _find_payment(self, order):
+        with gateway_call():
+            return self.gateway.find_payment(order.id)
+
+    def _failure_event(self, order, error):
+        if order is None or not order.pk:
+            return "payment_rejected"
+        return "payment_pending" if self._outcome_unknown(error) else "payment_failed"
+
+    def _log_payment(self, event, order, timings, error=None):
+        """One structured record per payment: ``event``, ``order_id`` and
+        the total and gateway durations in milliseconds."""
+        finished = time.perf_counter()
+        fields = {
+            "event": event,
+            "order_id": order.pk if order else None,
+            "duration_ms": round((finished - timings["started"]) * 1000, 2),
+        }
+        if "gateway_started" in timings:
+            gateway_finished = timings.get("gateway_finished", finished)
+            fields["gateway_ms"] = round((gateway_finished - timings["gateway_started"]) * 1000, 2)
+        if error is not None:
+            fields["error"] = str(error)
+        level = logging.WARNING if event in ("payment_failed", "payment_pending") else logging.INFO
+        logger.log(level, "%s (order %s)", event, fields["order_id"], extra=fields)
+
+    def _log_batch(self, results, orders, charges, started, gateway_seconds):
+        failed = sum(1 for _, error in charges if error is not None and not self._outcome_unknown(error))
+        pending = sum(1 for _, error in charges if self._outcome_unknown(error))
+        fields = {
+            "event": "payment_batch_processed",
+            "size": len(results),
+            "rejected": len(results) - len(orders),
+            "completed": len(orders) - failed - pending,
+            "failed": failed,
+            "pending": pending,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "gateway_ms": round(gateway_seconds * 1000, 2),
+        }
+        logger.info("payment_batch_processed (%s payments)", fields["size"], extra=fields)
+
     def _handle_error(self, order, error_message, original_exception=None):
         if order and order.pk:
             order.status = Order.FAILED
@@ -122,3 +529,80 @@ class PaymentProcessor:
             raise ValueError(error_message) from original_exception
         else:
             raise Exception(error_message) from original_exception
+
+
+class AsyncPaymentProcessor(PaymentProcessor):
+    """PaymentProcessor for ASGI deployments.
+
+    The gateway call is awaited on the adapter's async HTTP client, so
+    a single process can keep hundreds of payments in flight. The short
+    transactional phases reuse the sync implementation through
+    sync_to_async, since the async ORM cannot open transactions.
+    """
+
+    async def process_payment(self, order_data, idempotency_key=None):
+        order = None
+        timings = {"started": time.perf_counter()}
+        try:
+            # Off the event loop: a cold or stale split_configuration
+            # cache reloads its index with a query
+            await sync_to_async(self._validate_payment)(order_data)
+
+            order, split_rules = await sync_to_async(self._resume_or_create_order)(order_data, idempotency_key)
+            if order.status != Order.PROCESSING:
+                return order
+            await sync_to_async(self._release_connection)()
+            timings["gateway_started"] = time.perf_counter()
+            payment_intent = await self._acharge(order, order_data)
+            timings["gateway_finished"] = time.perf_counter()
+            await sync_to_async(self._complete_order)(order, payment_intent, split_rules)
+
+            self._log_payment("payment_completed", order, timings)
+            return order
+
+        except Exception as e:
+            if order and order.pk:
+                if not self._outcome_unknown(e):
+                    await sync_to_async(self._fail_order)(order, str(e))
+            else:
+                await payment_failed.asend(sender=self.__class__, order=None, error=str(e))
+
+            self._log_payment(self._failure_event(order, e), order, timings, error=e)
+            self._raise_pending(order, e)
+            raise
+
+    async def process_batch(self, orders_data, max_workers=None):
+        started = time.perf_counter()
+        results, accepted, splits = await sync_to_async(self._validate_batch)(orders_data)
+        if not accepted:
+            return results
+
+        orders, split_rules = await sync_to_async(self._create_orders_batch)(accepted, splits)
+        await sync_to_async(self._release_connection)()
+        gateway_started = time.perf_counter()
+
+        semaphore = asyncio.Semaphore(max_workers or settings.PAYMENT_BATCH_MAX_WORKERS)
+
+        async def charge(order, order_data):
+            async with semaphore:
+                try:
+                    return await self._acharge(order, order_data), None
+                except Exception as e:
+                    return None, e
+
+        charges = await asyncio.gather(*(
+            charge(order, order_data) for order, (_, order_data) in zip(orders, accepted)
+        ))
+        gateway_seconds = time.perf_counter() - gateway_started
+
+        await sync_to_async(self._finalize_batch)(orders, split_rules, charges)
+
+        self._log_batch(results, orders, charges, started, gateway_seconds)
+        return self._batch_results(results, accepted, orders, charges)
+
+    async def _acharge(self, order, order_data):
+        with gateway_call():
+            payment_intent = await self.gateway.acreate_payment(
+                self._payment_intent_params(order, order_data), self._idempotency_key(order)
+            )
+        return self._check_payment_intent(payment_intent)
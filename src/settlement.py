@@ -0,0 +1,120 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Order, Payout, PayoutItem, SettlementRun, SplitRule
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class SettlementProcessor:
+    """Aggregates unsettled split rules into one Payout per recipient.
+
+    A run walks the eligible rules (completed orders, amount computed,
+    ``effective_date`` inside the window) in primary-key chunks. Each chunk
+    commits in its own transaction: PayoutItems for its rules, the rules
+    marked settled and the run checkpoint advanced. When the last chunk is
+    done, each Payout is set to the ``GROUP BY`` total of its items in a
+    single UPDATE. Memory is bounded by the chunk size; a crashed run
+    resumes from its checkpoint, and a rule is never paid twice
+    (unsettled filter plus the PayoutItem one-to-one).
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def settle(self, window_end=None, window_start=None):
+        """Run (or resume) a settlement and return the finished SettlementRun."""
+        run = self.start_run(window_end or timezone.now(), window_start)
+        while run.status == SettlementRun.RUNNING:
+            run = self.settle_chunk(run.pk)
+        return run
+
+    def start_run(self, window_end, window_start=None):
+        """The run in progress, if any, otherwise a new one for the window."""
+        running = SettlementRun.objects.filter(status=SettlementRun.RUNNING).first()
+        if running is not None:
+            return running
+
+        bounds = self._eligible_rules(window_start, window_end).aggregate(first=Min("id"), last=Max("id"))
+        try:
+            with transaction.atomic():
+                return SettlementRun.objects.create(
+                    window_start=window_start,
+                    window_end=window_end,
+                    last_rule_id=(bounds["first"] or 1) - 1,
+                    max_rule_id=bounds["last"] or 0,
+                )
+        except IntegrityError:
+            # Another process started a run concurrently
+            return SettlementRun.objects.get(status=SettlementRun.RUNNING)
+
+    def settle_chunk(self, run_id):
+        """Settle the next id range of the run and return the updated run."""
+        now = timezone.now()
+        with transaction.atomic():
+            run = SettlementRun.objects.select_for_update().get(pk=run_id)
+            if run.status != SettlementRun.RUNNING:
+                return run
+
+            if run.last_rule_id >= run.max_rule_id:
+                self._total_payouts(run)
+                run.status = SettlementRun.COMPLETED
+                run.completed_at = now
+                run.save(update_fields=["status", "completed_at"])
+                return run
+
+            first_id = run.last_rule_id + 1
+            last_id = min(run.last_rule_id + self.chunk_size, run.max_rule_id)
+            rules = list(
+                self._eligible_rules(run.window_start, run.window_end)
+                .filter(pk__range=(first_id, last_id))
+                .values_list("pk", "recipient_id", "amount")
+            )
+
+            if rules:
+                payouts = self._payout_ids(run, {recipient_id for _, recipient_id, _ in rules})
+                PayoutItem.objects.bulk_create([
+                    PayoutItem(payout_id=payouts[recipient_id], split_rule_id=pk, amount=amount)
+                    for pk, recipient_id, amount in rules
+                ])
+                SplitRule.objects.filter(pk__in=[pk for pk, _, _ in rules]).update(settled_at=now)
+
+            run.last_rule_id = last_id
+            run.rules_settled += len(rules)
+            run.save(update_fields=["last_rule_id", "rules_settled"])
+            return run
+
+    def _payout_ids(self, run, recipient_ids):
+        """``{recipient_id: payout_id}``, creating the missing Payouts."""
+        Payout.objects.bulk_create(
+            [Payout(run=run, recipient_id=recipient_id) for recipient_id in recipient_ids],
+            ignore_conflicts=True,
+        )
+        return dict(
+            Payout.objects.filter(run=run, recipient_id__in=recipient_ids).values_list("recipient_id", "pk")
+        )
+
+    def _total_payouts(self, run):
+        """Set every Payout of the run to the GROUP BY total of its items."""
+        totals = (
+            PayoutItem.objects.filter(payout=OuterRef("pk"))
+            .values("payout")
+            .annotate(total=Sum("amount"), count=Count("id"))
+        )
+        Payout.objects.filter(run=run).update(
+            amount=Subquery(totals.values("total")),
+            item_count=Subquery(totals.values("count")),
+        )
+
+    def _eligible_rules(self, window_start, window_end):
+        rules = SplitRule.objects.filter(
+            settled_at__isnull=True,
+            amount__isnull=False,
+            order__status=Order.COMPLETED,
+            effective_date__lt=window_end,
+        )
+        if window_start is not None:
+            rules = rules.filter(effective_date__gte=window_start)
+        return rules
@@ -0,0 +1,165 @@
+"""Split computation in integer cents.
+
+Fixed rules are paid first; percentage rules share what is left and must
+add up to exactly 100%. Percentages are handled as basis points, so the
+whole computation is integer arithmetic. Cents lost to rounding go to the
+largest fractional parts (ties broken by rule order), which makes the
+result deterministic and always sum to the order amount.
+"""
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from .models import SplitRule
+
+
+CENT = Decimal("0.01")
+FULL_SHARE_BPS = 10_000  # 100% in basis points
+
+Rule = namedtuple("Rule", ["recipient_id", "type", "value"])
+
+
+class SplitError(ValueError):
+    """The rule set cannot split the amount."""
+
+
+def to_cents(amount):
+    """Currency amount (Decimal, str, int or float) to integer cents."""
+    try:
+        value = Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, TypeError, ValueError):
+        raise SplitError(f"Invalid amount: {amount}")
+    return int(value * 100)
+
+
+def from_cents(cents):
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+def to_basis_points(percentage):
+    try:
+        value = Decimal(str(percentage)) * 100
+    except (InvalidOperation, TypeError, ValueError):
+        raise SplitError(f"Invalid percentage: {percentage}")
+    if value != value.to_integral_value():
+        raise SplitError(f"Percentage {percentage} has more than 2 decimal places")
+    return int(value)
+
+
+def _rule_arrays(rules):
+    """Per-rule (fixed cents, basis points); exactly one of them is set."""
+    fixed, bps = [], []
+    for rule in rules:
+        if rule.type == SplitRule.FIXED:
+            cents, points = to_cents(rule.value), 0
+        elif rule.type == SplitRule.PERCENTAGE:
+            cents, points = 0, to_basis_points(rule.value)
+        else:
+            raise SplitError(f"Unknown split type: {rule.type}")
+        if cents < 0 or points < 0:
+            raise SplitError(f"Split value for {rule.recipient_id} cannot be negative")
+        fixed.append(cents)
+        bps.append(points)
+    return fixed, bps
+
+
+def _check_totals(amount_cents, fixed_total, bps_total, has_percentage):
+    if amount_cents <= 0:
+        raise SplitError("Amount must be greater than zero")
+    if fixed_total > amount_cents:
+        raise SplitError("Fixed splits exceed the order amount")
+    if has_percentage and bps_total != FULL_SHARE_BPS:
+        raise SplitError("Percentage splits must sum to 100%")
+    if not has_percentage and fixed_total != amount_cents:
+        raise SplitError("Fixed splits must sum to the order amount")
+
+
+def compute_split(amount_cents, rules):
+    """Cents for each rule, in rule order, summing to ``amount_cents``.
+
+    ``rules`` are SplitRule instances or anything with ``recipient_id``,
+    ``type`` and ``value`` (see ``Rule``). Raises SplitError when the
+    rules do not cover exactly the whole amount.
+    """
+    if not rules:
+        raise SplitError("At least one split rule is required")
+
+    fixed, bps = _rule_arrays(rules)
+    has_percentage = any(points > 0 for points in bps)
+    _check_totals(amount_cents, sum(fixed), sum(bps), has_percentage)
+
+    remainder = amount_cents - sum(fixed)
+    shares, fractions = [], []
+    for points in bps:
+        share, fraction = divmod(remainder * points, FULL_SHARE_BPS)
+        shares.append(share)
+        fractions.append(fraction)
+
+    leftover = remainder - sum(shares)
+    for index in sorted(range(len(rules)), key=lambda i: -fractions[i])[:leftover]:
+        shares[index] += 1
+
+    return [cents + share for cents, share in zip(fixed, shares)]
+
+
+def compute_splits(amounts_cents, rule_sets):
+    """``compute_split`` for many orders in one ``compute_splits_batch`` call.
+
+    Returns one list of cents per rule set. Raises SplitError when any
+    order cannot be split, without telling which: ``compute_split`` on
+    each order gives the per-order error.
+    """
+    if not rule_sets:
+        return []
+    if not all(rule_sets):
+        raise SplitError("At least one split rule is required")
+
+    arrays = [_rule_arrays(rules) for rules in rule_sets]
+    width = max(len(fixed) for fixed, _ in arrays)
+    fixed_cents = [fixed + [0] * (width - len(fixed)) for fixed, _ in arrays]
+    basis_points = [bps + [0] * (width - len(bps)) for _, bps in arrays]
+    cents = compute_splits_batch(amounts_cents, fixed_cents, basis_points).tolist()
+    # Padding slots never get a cent: their fractional part is zero
+    return [row[:len(rules)] for row, rules in zip(cents, rule_sets)]
+
+
+def compute_splits_batch(amounts_cents, fixed_cents, basis_points):
+    """Vectorized ``compute_split``, used for the batch endpoint.
+
+    ``amounts_cents`` has shape (n,); ``fixed_cents`` and ``basis_points``
+    have shape (n, k), one column per rule slot, zero-padded for orders
+    with fewer than k rules (a slot is percentage when its basis points
+    are non-zero). Returns an (n, k) int64 array of cents. NumPy is only
+    imported here, on the first batch, so single payments do not pay for it.
+    """
+    import numpy as np
+
+    amounts = np.asarray(amounts_cents, dtype=np.int64)
+    fixed = np.asarray(fixed_cents, dtype=np.int64)
+    bps = np.asarray(basis_points, dtype=np.int64)
+    if fixed.shape != bps.shape or fixed.shape[:1] != amounts.shape:
+        raise SplitError("amounts, fixed and basis point arrays do not line up")
+
+    remainder = amounts - fixed.sum(axis=1)
+    has_percentage = (bps > 0).any(axis=1)
+    invalid = (
+        (amounts <= 0)
+        | (fixed < 0).any(axis=1)
+        | (bps < 0).any(axis=1)
+        | (remainder < 0)
+        | (has_percentage & (bps.sum(axis=1) != FULL_SHARE_BPS))
+        | (~has_percentage & (remainder != 0))
+    )
+    if invalid.any():
+        rows = np.flatnonzero(invalid)
+        raise SplitError(f"{rows.size} orders have invalid splits (first at index {rows[0]})")
+
+    shares, fractions = np.divmod(remainder[:, None] * bps, FULL_SHARE_BPS)
+    leftover = remainder - shares.sum(axis=1)
+
+    # Rank rule slots by fractional part (stable, so ties go to the earlier
+    # rule) and give one extra cent to the first ``leftover`` of each row
+    order = np.argsort(-fractions, axis=1, kind="stable")
+    rank = np.argsort(order, axis=1)
+    shares += rank < leftover[:, None]
+
+    return fixed + shares
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class OfflineTestRunner(DiscoverRunner):
+    """Runs the suite against the in-process FakeGateway, the same way
+    Django swaps in the locmem email backend: tests never reach Stripe."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._payment_gateway = settings.PAYMENT_GATEWAY
+        settings.PAYMENT_GATEWAY = "fake"
+
+    def teardown_test_environment(self, **kwargs):
+        settings.PAYMENT_GATEWAY = self._payment_gateway
+        super().teardown_test_environment(**kwargs)
@@ -1,14 +1,78 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
+from prometheus_client import REGISTRY
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from unittest.mock import patch, MagicMock
+import stripe
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from unittest import skipUnless
+from unittest.mock import patch, AsyncMock, MagicMock
+from datetime import timedelta
 from decimal import Decimal
 
-from .models import Order, SplitRule
-from .services import PaymentProcessor
+from .models import (
+    IdempotencyKey,
+    Order,
+    OutboxEvent,
+    Payout,
+    PayoutItem,
+    RecipientDailyEarning,
+    SettlementRun,
+    SplitConfiguration,
+    SplitRule,
+)
+from .cache import split_rules_cache
+from .earnings import rebuild_earnings
+from .gateways import (
+    CircuitBreaker,
+    FakeGateway,
+    GatewayError,
+    GatewayUnavailable,
+    PaymentDeclined,
+    StripeGateway,
+    preload_gateway,
+)
+from .events import payment_processed, payout_triggered
+from .metrics import split_rules_cache_evictions, split_rules_cache_hits
+from .profiling import profile_request
+from .services import AsyncPaymentProcessor, PaymentPending, PaymentProcessor
+from .views import AsyncSplitPaymentView
+from .idempotency import IdempotencyStore, idempotency_store, request_fingerprint
+from .logs import QueueLogHandler, SamplingFilter
+from .renderers import PrebuiltJSON
+from .outbox import OutboxWorker
+from .configuration import ConfigurationIndex, FeeConfiguration, SplitConfigurationCache, split_configuration
+from .settlement import SettlementProcessor
+from .partitions import (
+    PARTITIONED_TABLES,
+    add_months,
+    create_partition,
+    is_partitioned,
+    month_bounds,
+    month_start,
+    monthly_partitions,
+    partition_name,
+)
+from .splits import Rule, SplitError, compute_split, compute_splits, compute_splits_batch, to_basis_points, to_cents
+from . import exports, outbox
 
 
 class PaymentProcessorTest(TestCase):
@@ -32,6 +96,28 @@ class PaymentProcessorTest(TestCase):
         self.assertIn('user_creator', split_recipients)
         self.assertIn(PaymentProcessor.CAKTO_RECIPIENT_ID, split_recipients)
 
+    def test_process_payment_logs_lifecycle_record(self):
+        with self.assertLogs('src.services', level='INFO') as logs:
+            order = self.processor.process_payment(self.valid_order_data)
+
+        record = logs.records[-1]
+        self.assertEqual(record.event, 'payment_completed')
+        self.assertEqual(record.order_id, order.pk)
+        self.assertGreaterEqual(record.duration_ms, record.gateway_ms)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_process_payment_logs_failure_record(self, mock_create):
+        mock_create.side_effect = PaymentDeclined("Your card was declined.")
+
+        with self.assertLogs('src.services', level='WARNING') as logs:
+            with self.assertRaises(PaymentDeclined):
+                self.processor.process_payment(self.valid_order_data)
+
+        record = logs.records[-1]
+        self.assertEqual(record.event, 'payment_failed')
+        self.assertEqual(record.error, "Your card was declined.")
+        self.assertEqual(record.order_id, Order.objects.get().pk)
+
     def test_process_payment_missing_payment_method(self):
         invalid_data = self.valid_order_data.copy()
         invalid_data.pop('payment_method_id')
@@ -59,7 +145,7 @@ class PaymentProcessorTest(TestCase):
         
         self.assertIn("Amount must be greater than zero", str(context.exception))
     
-    @patch('stripe.PaymentIntent.create')
+    @patch('src.gateways.FakeGateway.create_payment')
     def test_process_payment_stripe_error(self, mock_stripe_create):
         mock_stripe_create.side_effect = Exception("Stripe API error")
         
@@ -72,7 +158,7 @@ class PaymentProcessorTest(TestCase):
         self.assertIsNotNone(order)
         self.assertEqual(order.status, Order.FAILED)
 
-    @patch('stripe.PaymentIntent.create')
+    @patch('src.gateways.FakeGateway.create_payment')
     def test_process_payment_stripe_failed_status(self, mock_stripe_create):
         mock_intent = MagicMock()
         mock_intent.status = "failed"
@@ -86,6 +172,29 @@ class PaymentProcessorTest(TestCase):
         order = Order.objects.filter(product_id='prod_abc123').first()
         self.assertEqual(order.status, Order.FAILED)
 
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_query_count_constant_per_recipient_count(self, mock_stripe_create):
+        mock_stripe_create.return_value = MagicMock(id='pi_123', status='succeeded')
+
+        def build_rules(recipients):
+            def build(order, order_data):
+                return [
+                    SplitRule(order=order, recipient_id=f'recipient_{i}', type=SplitRule.PERCENTAGE, value=Decimal('1.00'))
+                    for i in range(recipients)
+                ]
+            return build
+
+        split_configuration.current()  # warm the per-process fee configuration
+        query_counts = []
+        for recipients in (2, 20):
+            with patch.object(self.processor, '_build_split_rules', build_rules(recipients)):
+                with CaptureQueriesContext(connection) as queries:
+                    order = self.processor.process_payment(self.valid_order_data)
+            self.assertEqual(order.split_rules.count(), recipients)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
     def test_process_payment_empty_product_id(self):
         invalid_data = self.valid_order_data.copy()
         invalid_data['product_id'] = ''
@@ -124,8 +233,280 @@ class PaymentProcessorTest(TestCase):
         self.assertIn("Amount must be greater than zero", str(context.exception))
 
 
+class PaymentGatewayTest(TestCase):
+    def setUp(self):
+        self.order_data = {
+            'product_id': 'prod_gateway',
+            'product_name': 'Test Product',
+            'payment_method_id': 'pm_card_visa',
+            'amount': 100.0,
+            'user_id': 'user_creator',
+        }
+
+    def stripe_gateway(self, **kwargs):
+        kwargs = {"api_key": "sk_test_offline", "max_retries": 2, "retry_base": 0.001, **kwargs}
+        return StripeGateway(**kwargs)
+
+    def test_fake_gateway_is_idempotent(self):
+        gateway = FakeGateway()
+        params = {"amount": 1000, "payment_method": "pm_card_visa", "metadata": {"order_id": 7}}
+
+        first = gateway.create_payment(params, "order-7")
+        self.assertEqual(gateway.create_payment(params, "order-7"), first)
+        self.assertEqual(gateway.find_payment(7), first)
+        self.assertIsNone(gateway.find_payment(8))
+        with self.assertRaises(PaymentDeclined):
+            gateway.create_payment(dict(params, payment_method="pm_card_chargeDeclined"), "order-8")
+
+    def test_declined_payment_fails_order(self):
+        with self.assertRaisesMessage(PaymentDeclined, "declined"):
+            PaymentProcessor().process_payment(dict(self.order_data, payment_method_id='pm_card_chargeDeclined'))
+        self.assertEqual(Order.objects.get().status, Order.FAILED)
+
+    def test_stripe_gateway_retries_transient_errors(self):
+        gateway = self.stripe_gateway()
+        intent = MagicMock(id='pi_retried', status='succeeded')
+
+        with patch.object(gateway.client.v1.payment_intents, 'create',
+                          side_effect=[stripe.APIConnectionError("reset"), stripe.APIError("bad gateway", http_status=502), intent]) as create:
+            order = PaymentProcessor(gateway=gateway).process_payment(self.order_data)
+
+        self.assertEqual(create.call_count, 3)
+        self.assertEqual({call.kwargs['options']['idempotency_key'] for call in create.call_args_list}, {f"order-{order.id}"})
+        self.assertEqual(order.stripe_payment_id, 'pi_retried')
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_idempotency_conflict_after_timeout_is_retried(self):
+        gateway = self.stripe_gateway(max_retries=3)
+        # The timed-out attempt is still being processed under the same key
+        in_flight = stripe.IdempotencyError("Another request with this key is in progress", http_status=409)
+        lock_timeout = stripe.APIError("Lock timeout", http_status=400, headers={"Stripe-Should-Retry": "true"})
+        intent = MagicMock(id='pi_first_attempt', status='succeeded')
+
+        with patch.object(gateway.client.v1.payment_intents, 'create',
+                          side_effect=[stripe.APIConnectionError("read timeout"), in_flight, lock_timeout, intent]) as create:
+            order = PaymentProcessor(gateway=gateway).process_payment(self.order_data)
+
+        self.assertEqual(create.call_count, 4)
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(order.stripe_payment_id, 'pi_first_attempt')
+
+    def test_idempotency_conflict_until_retries_run_out_leaves_order_processing(self):
+        gateway = self.stripe_gateway(max_retries=2)
+        in_flight = stripe.IdempotencyError("Another request with this key is in progress", http_status=409)
+
+        with patch.object(gateway.client.v1.payment_intents, 'create',
+                          side_effect=[stripe.APIConnectionError("read timeout"), in_flight, in_flight]):
+            with self.assertRaises(PaymentPending):
+                PaymentProcessor(gateway=gateway).process_payment(self.order_data)
+
+        self.assertEqual(Order.objects.get().status, Order.PROCESSING)
+
+    def test_stripe_gateway_does_not_retry_declines(self):
+        gateway = self.stripe_gateway()
+        declined = stripe.CardError("Your card was declined.", param=None, code="card_declined")
+
+        with patch.object(gateway.client.v1.payment_intents, 'create', side_effect=declined) as create:
+            with self.assertRaises(PaymentDeclined):
+                gateway.create_payment({"amount": 100}, "order-1")
+        self.assertEqual(create.call_count, 1)
+
+    def test_unknown_outcome_leaves_order_processing(self):
+        gateway = self.stripe_gateway()
+
+        with patch.object(gateway.client.v1.payment_intents, 'create', side_effect=stripe.APIConnectionError("read timeout")):
+            with self.assertRaises(PaymentPending) as raised:
+                PaymentProcessor(gateway=gateway).process_payment(self.order_data)
+
+        # Stripe may have charged the card; recover_stale_orders decides later
+        self.assertEqual(raised.exception.order, Order.objects.get())
+        self.assertEqual(Order.objects.get().status, Order.PROCESSING)
+
+    def test_circuit_breaker_fails_fast(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        gateway = self.stripe_gateway(max_retries=0, breaker=breaker)
+
+        with patch.object(gateway.client.v1.payment_intents, 'create', side_effect=stripe.APIConnectionError("down")) as create:
+            for _ in range(2):
+                with self.assertRaises(GatewayError):
+                    gateway.create_payment({"amount": 100}, "order-1")
+            with self.assertRaises(GatewayUnavailable):
+                PaymentProcessor(gateway=gateway).process_payment(self.order_data)
+
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        # Never sent to the gateway, so the order can be failed right away
+        self.assertEqual(Order.objects.get().status, Order.FAILED)
+
+    def test_circuit_opened_mid_retry_leaves_order_processing(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        gateway = self.stripe_gateway(max_retries=2, breaker=breaker)
+
+        def timeout_then_other_failures(**kwargs):
+            # Other requests fail while this one waits for its retry
+            breaker.record_failure()
+            raise stripe.APIConnectionError("read timeout")
+
+        with patch.object(gateway.client.v1.payment_intents, 'create', side_effect=timeout_then_other_failures) as create:
+            with self.assertRaises(GatewayError) as raised:
+                PaymentProcessor(gateway=gateway).process_payment(self.order_data)
+
+        self.assertNotIsInstance(raised.exception, GatewayUnavailable)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        # The first attempt may have charged the card: left for recovery
+        self.assertEqual(Order.objects.get().status, Order.PROCESSING)
+
+    def test_circuit_breaker_half_open_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TwoPhasePaymentTest(TransactionTestCase):
+    def setUp(self):
+        self.processor = PaymentProcessor()
+        self.valid_order_data = {
+            'product_id': 'prod_two_phase',
+            'product_name': 'Test Product',
+            'payment_method_id': 'pm_card_visa',
+            'amount': 100.0,
+            'user_id': 'user_creator',
+        }
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_gateway_called_outside_transaction(self, mock_stripe_create):
+        def charge(params, idempotency_key):
+            self.assertFalse(connection.in_atomic_block)
+            order = Order.objects.get(pk=params['metadata']['order_id'])
+            self.assertEqual(order.status, Order.PROCESSING)
+            return MagicMock(id='pi_123', status='succeeded')
+
+        mock_stripe_create.side_effect = charge
+
+        order = self.processor.process_payment(self.valid_order_data)
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(order.stripe_payment_id, 'pi_123')
+        self.assertEqual(order.split_rules.count(), 2)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_pooled_connection_released_during_gateway_call(self, mock_stripe_create):
+        calls = []
+
+        def charge(params, idempotency_key):
+            calls.append('charge')
+            return MagicMock(id='pi_123', status='succeeded')
+
+        mock_stripe_create.side_effect = charge
+        with patch.dict(connection.settings_dict['OPTIONS'], {'pool': {'min_size': 1}}), \
+                patch.object(connection, 'close', side_effect=lambda: calls.append('release')):
+            order = self.processor.process_payment(self.valid_order_data)
+
+        self.assertEqual(calls, ['release', 'charge'])
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.COMPLETED)
+
+    def test_recover_stale_orders(self):
+        stale = timezone.now() - timedelta(hours=1)
+        paid = Order.objects.create(
+            product_id='prod_paid', product_name='Paid', amount=Decimal('10.00'), status=Order.PROCESSING
+        )
+        unpaid = Order.objects.create(
+            product_id='prod_unpaid', product_name='Unpaid', amount=Decimal('10.00'), status=Order.PROCESSING
+        )
+        recent = Order.objects.create(
+            product_id='prod_recent', product_name='Recent', amount=Decimal('10.00'), status=Order.PROCESSING
+        )
+        Order.objects.filter(pk__in=[paid.pk, unpaid.pk]).update(created_at=stale)
+
+        paid_query = f"metadata['order_id']:'{paid.pk}'"
+
+        def search(params):
+            found = [MagicMock(id='pi_paid', status='succeeded')] if params['query'] == paid_query else []
+            return MagicMock(data=found)
+
+        gateway = StripeGateway(api_key='sk_test_offline', max_retries=0)
+        with patch.object(gateway.client.v1.payment_intents, 'search', side_effect=search) as stripe_search:
+            recovered = PaymentProcessor(gateway=gateway).recover_stale_orders(older_than=timedelta(minutes=15))
+
+        self.assertEqual(
+            [call.kwargs['params']['query'] for call in stripe_search.call_args_list],
+            [paid_query, f"metadata['order_id']:'{unpaid.pk}'"],
+        )
+        self.assertEqual(recovered, {Order.COMPLETED: 1, Order.FAILED: 1, Order.PROCESSING: 0})
+        paid.refresh_from_db()
+        unpaid.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual(paid.status, Order.COMPLETED)
+        self.assertEqual(paid.stripe_payment_id, 'pi_paid')
+        self.assertEqual(unpaid.status, Order.FAILED)
+        self.assertEqual(recent.status, Order.PROCESSING)
+
+    @patch('src.gateways.FakeGateway.find_payment')
+    def test_recovery_leaves_pending_intents_and_lookup_errors_for_next_pass(self, mock_find_payment):
+        stale = timezone.now() - timedelta(hours=1)
+        orders = [
+            Order.objects.create(product_id=f'prod_{i}', product_name='Stale', amount=Decimal('10.00'), status=Order.PROCESSING)
+            for i in range(4)
+        ]
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(created_at=stale)
+        intents = {
+            orders[0].pk: GatewayError("Payment gateway search failed: read timeout"),
+            orders[1].pk: MagicMock(id='pi_action', status='requires_action'),
+            orders[2].pk: MagicMock(id='pi_canceled', status='canceled'),
+            orders[3].pk: MagicMock(id='pi_paid', status='succeeded'),
+        }
+
+        def find_payment(order_id):
+            if isinstance(intents[order_id], Exception):
+                raise intents[order_id]
+            return intents[order_id]
+
+        mock_find_payment.side_effect = find_payment
+
+        with self.assertLogs('src.services', level='WARNING') as logs:
+            recovered = self.processor.recover_stale_orders()
+
+        self.assertEqual(recovered, {Order.COMPLETED: 1, Order.FAILED: 1, Order.PROCESSING: 2})
+        self.assertIn(f"payment_recovery_failed (order {orders[0].pk})", logs.output[0])
+        self.assertEqual(
+            [Order.objects.get(pk=order.pk).status for order in orders],
+            [Order.PROCESSING, Order.PROCESSING, Order.FAILED, Order.COMPLETED],
+        )
+
+    @patch('src.gateways.FakeGateway.find_payment')
+    def test_recovery_does_not_fail_an_order_completed_meanwhile(self, mock_find_payment):
+        order = Order.objects.create(product_id='prod_late', product_name='Late', amount=Decimal('10.00'), status=Order.PROCESSING)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+        def late_phase_three(order_id):
+            # The original request finishes while recovery looks it up
+            Order.objects.filter(pk=order_id).update(status=Order.COMPLETED, stripe_payment_id='pi_late')
+            return None
+
+        mock_find_payment.side_effect = late_phase_three
+
+        recovered = self.processor.recover_stale_orders()
+
+        self.assertEqual(recovered, {Order.COMPLETED: 0, Order.FAILED: 0, Order.PROCESSING: 0})
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(order.stripe_payment_id, 'pi_late')
+        self.assertFalse(OutboxEvent.objects.filter(event_type='payment_failed').exists())
+
+
 class SplitPaymentAPITest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.url = reverse('create_split')
         self.valid_data = {
             "product_id": "prod_abc123",
@@ -199,6 +580,30 @@ class SplitPaymentAPITest(APITestCase):
         self.assertIn("split_rules", response.data)
         self.assertEqual(len(response.data["split_rules"]), 2)
 
+    def test_get_split_rules_latest_order_case_insensitive(self):
+        older = Order.objects.create(product_id="Prod_Case", product_name="Test Product", amount=Decimal('10.00'))
+        SplitRule.objects.create(order=older, recipient_id="old_recipient", type=SplitRule.PERCENTAGE, value=100)
+        latest = Order.objects.create(product_id="PROD_case", product_name="Test Product", amount=Decimal('10.00'))
+        SplitRule.objects.create(order=latest, recipient_id="new_a", type=SplitRule.PERCENTAGE, value=60)
+        SplitRule.objects.create(order=latest, recipient_id="new_b", type=SplitRule.PERCENTAGE, value=40)
+
+        url = reverse('get_split_rules', kwargs={'product_id': 'prod_CASE'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["product_id"], "PROD_case")
+        self.assertEqual([r["recipient_id"] for r in response.data["split_rules"]], ["new_a", "new_b"])
+
+    def test_get_split_rules_order_without_rules(self):
+        Order.objects.create(product_id="prod_empty", product_name="Test Product", amount=Decimal('10.00'))
+
+        response = self.client.get(reverse('get_split_rules', kwargs={'product_id': 'prod_empty'}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["split_rules"], [])
+
     def test_list_all_payments_empty(self):
         url = reverse('list_all_splits')
         response = self.client.get(url)
@@ -215,6 +620,100 @@ class SplitPaymentAPITest(APITestCase):
         self.assertEqual(response.data['count'], 1)
         self.assertEqual(len(response.data['results']), 1)
 
+    def test_list_all_keyset_pagination(self):
+        orders = [
+            Order.objects.create(product_id=f"prod_{i}", product_name="Test Product", amount=Decimal('10.00'))
+            for i in range(5)
+        ]
+        url = reverse('list_all_splits')
+
+        seen = []
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        while True:
+            seen.extend(item['order_id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(seen, [order.id for order in orders])
+
+    def test_list_all_count_opt_out(self):
+        Order.objects.create(product_id="prod_1", product_name="Test Product", amount=Decimal('10.00'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('list_all_splits'), {'count': 'false'})
+
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries))
+
+    def test_list_all_legacy_page_number(self):
+        for i in range(3):
+            Order.objects.create(product_id=f"prod_{i}", product_name="Test Product", amount=Decimal('10.00'))
+
+        response = self.client.get(reverse('list_all_splits'), {'page': 2, 'page_size': 2})
+
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_list_all_created_range(self):
+        old, recent = [
+            Order.objects.create(product_id=f"prod_{i}", product_name="Test Product", amount=Decimal('10.00'))
+            for i in range(2)
+        ]
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=60))
+        SplitRule.objects.create(order=recent, recipient_id="recipient_a", type=SplitRule.PERCENTAGE, value=100)
+        created_from = (timezone.now() - timedelta(days=1)).date().isoformat()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('list_all_splits'), {'created_from': created_from})
+
+        self.assertEqual([item['order_id'] for item in response.data['results']], [recent.id])
+        self.assertEqual(len(response.data['results'][0]['split_rules']), 1)
+        # The split-rule query repeats the bound so partitions can be pruned
+        rules_query = next(q['sql'] for q in queries if 'FROM "src_splitrule"' in q['sql'])
+        self.assertIn('"effective_date" >=', rules_query)
+
+    def test_list_all_invalid_created_range(self):
+        response = self.client.get(reverse('list_all_splits'), {'created_to': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_all_renders_money_as_exact_strings(self):
+        order = Order.objects.create(product_id="prod_money", product_name="Ação", amount=Decimal('150.10'))
+        SplitRule.objects.create(order=order, recipient_id="recipient_a", type=SplitRule.PERCENTAGE,
+                                 value=Decimal('33.33'), amount=Decimal('50.03'))
+        SplitRule.objects.create(order=order, recipient_id="recipient_b", type=SplitRule.FIXED,
+                                 value=Decimal('0.10'), amount=Decimal('0.10'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('list_all_splits'), {'count': 'false'})
+
+        self.assertEqual(len(queries), 2)
+        item = response.json()['results'][0]
+        self.assertEqual(item['amount'], "150.10")
+        self.assertEqual(item['product_name'], "Ação")
+        self.assertEqual([(r['value'], r['amount']) for r in item['split_rules']], [("33.33", "50.03"), ("0.10", "0.10")])
+        self.assertTrue(item['split_rules'][0]['effective_date'].endswith("Z"))
+
+    def test_get_split_rules_renders_money_as_exact_strings(self):
+        order = Order.objects.create(product_id="prod_money", product_name="Test Product", amount=Decimal('10.00'))
+        SplitRule.objects.create(order=order, recipient_id="recipient_a", type=SplitRule.PERCENTAGE,
+                                 value=Decimal('33.33'), amount=Decimal('3.33'))
+
+        response = self.client.get(reverse('get_split_rules', kwargs={'product_id': 'prod_money'}))
+
+        rule = response.json()['split_rules'][0]
+        self.assertEqual((rule['value'], rule['amount']), ("33.33", "3.33"))
+
+    def test_indented_json_falls_back_to_the_default_renderer(self):
+        Order.objects.create(product_id="prod_indent", product_name="Test Product", amount=Decimal('10.00'))
+
+        response = self.client.get(reverse('list_all_splits'), HTTP_ACCEPT='application/json; indent=2')
+
+        self.assertIn(b'\n  "results": [', response.content)
+        self.assertEqual(json.loads(response.content)['results'][0]['amount'], "10.00")
+
     def test_invalid_json_format(self):
         response = self.client.post(self.url, "invalid json", content_type='application/json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -228,6 +727,1462 @@ class SplitPaymentAPITest(APITestCase):
             self.assertIn("error", response.data)
 
 
+class SplitRulesCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.order = Order.objects.create(product_id="prod_cached", product_name="Test Product", amount=Decimal('10.00'))
+        self.rule = SplitRule.objects.create(order=self.order, recipient_id="recipient_a", type=SplitRule.PERCENTAGE, value=100)
+        self.url = reverse('get_split_rules', kwargs={'product_id': 'PROD_CACHED'})
+
+    def test_repeat_lookup_served_from_cache(self):
+        first = self.client.get(self.url)
+        hits = split_rules_cache_hits._value.get()
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('get_split_rules', kwargs={'product_id': 'prod_cached'}))
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(split_rules_cache_hits._value.get(), hits + 1)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+    def test_split_rule_save_invalidates(self):
+        etag = self.client.get(self.url)["ETag"]
+        evictions = split_rules_cache_evictions.labels(reason="split_rule_saved")._value.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rule.value = Decimal('90.00')
+            self.rule.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["split_rules"][0]["value"], 90.0)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(split_rules_cache_evictions.labels(reason="split_rule_saved")._value.get(), evictions + 1)
+
+    def test_payment_processed_invalidates(self):
+        self.client.get(self.url)
+        # Rows written without signals stay hidden until the payment event
+        SplitRule.objects.bulk_create([
+            SplitRule(order=self.order, recipient_id="recipient_b", type=SplitRule.PERCENTAGE, value=0),
+        ])
+        self.assertEqual(len(self.client.get(self.url).data["split_rules"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment_processed.send(sender=PaymentProcessor, order=self.order)
+
+        self.assertEqual(len(self.client.get(self.url).data["split_rules"]), 2)
+
+    def test_missing_product_not_cached(self):
+        url = reverse('get_split_rules', kwargs={'product_id': 'prod_later'})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        Order.objects.create(product_id="prod_later", product_name="Test Product", amount=Decimal('10.00'))
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+class SplitPaymentBatchAPITest(APITestCase):
+    def setUp(self):
+        self.url = reverse('create_split_batch')
+        self.valid_data = {
+            "product_id": "prod_batch",
+            "product_name": "Test Product",
+            "amount": 150.0,
+            "payment_method_id": "pm_card_visa",
+            "user_id": "user_creator",
+        }
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_batch_partial_failure(self, mock_stripe_create):
+        def charge(params, idempotency_key):
+            if params['payment_method'] == 'pm_card_declined':
+                raise Exception("Your card was declined")
+            return MagicMock(id=f"pi_{params['metadata']['order_id']}", status='succeeded')
+
+        mock_stripe_create.side_effect = charge
+        orders = [
+            self.valid_data,
+            dict(self.valid_data, amount=0),
+            dict(self.valid_data, payment_method_id='pm_card_declined'),
+            {"product_name": "Missing product id"},
+            self.valid_data,
+        ]
+
+        response = self.client.post(self.url, {"orders": orders}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data["succeeded"], 2)
+        self.assertEqual(response.data["failed"], 3)
+        results = response.data["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual(
+            [r["status"] for r in results],
+            [Order.COMPLETED, Order.FAILED, Order.FAILED, Order.FAILED, Order.COMPLETED],
+        )
+        self.assertIn("Amount must be greater than zero", results[1]["error"])
+        self.assertIn("declined", results[2]["error"])
+
+        self.assertEqual(Order.objects.filter(status=Order.COMPLETED).count(), 2)
+        self.assertEqual(Order.objects.get(pk=results[2]["order_id"]).status, Order.FAILED)
+        completed = Order.objects.get(pk=results[0]["order_id"])
+        self.assertEqual(completed.stripe_payment_id, f"pi_{completed.pk}")
+        self.assertEqual(completed.split_rules.count(), 2)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_batch_all_succeeded(self, mock_stripe_create):
+        mock_stripe_create.return_value = MagicMock(id='pi_123', status='succeeded')
+
+        response = self.client.post(self.url, {"orders": [self.valid_data] * 3}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["succeeded"], 3)
+        self.assertEqual(SplitRule.objects.count(), 6)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_batch_splits_in_one_call_and_isolates_invalid_rules(self, mock_stripe_create):
+        mock_stripe_create.return_value = MagicMock(id='pi_123', status='succeeded')
+        custom = dict(self.valid_data, amount=100.01, split_rules=[
+            {"recipient_id": "fixed", "type": SplitRule.FIXED, "value": "10.00"},
+            {"recipient_id": "rest", "type": SplitRule.PERCENTAGE, "value": 95},
+        ])
+        unbalanced = dict(custom, split_rules=[{"recipient_id": "rest", "type": SplitRule.PERCENTAGE, "value": 90}])
+
+        with patch('src.splits.compute_splits_batch', wraps=compute_splits_batch) as batch:
+            response = self.client.post(self.url, {"orders": [custom, self.valid_data]}, format='json')
+        self.assertEqual(batch.call_count, 1)
+        self.assertEqual(response.data["succeeded"], 2)
+        order = Order.objects.get(pk=response.data["results"][0]["order_id"])
+        self.assertEqual(
+            [rule.amount for rule in order.split_rules.order_by("id")],
+            [Decimal("10.00"), Decimal("85.51"), Decimal("4.50")],
+        )
+
+        response = self.client.post(self.url, {"orders": [custom, unbalanced, self.valid_data]}, format='json')
+        self.assertEqual([r["status"] for r in response.data["results"]], [Order.COMPLETED, Order.FAILED, Order.COMPLETED])
+        self.assertIn("Percentage splits must sum to 100%", response.data["results"][1]["error"])
+        self.assertEqual(Order.objects.count(), 4)
+
+    def test_batch_requires_orders_list(self):
+        response = self.client.post(self.url, {"orders": []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, self.valid_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(REQUEST_BUDGETS={})
+class RequestBudgetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        order = Order.objects.create(product_id="prod_budget", product_name="Test Product", amount=Decimal('10.00'))
+        SplitRule.objects.create(order=order, recipient_id="recipient_a", type=SplitRule.PERCENTAGE, value=100)
+        self.payment = {
+            "product_id": "prod_budget",
+            "product_name": "Test Product",
+            "amount": 100.0,
+            "payment_method_id": "pm_card_visa",
+            "user_id": "user_creator",
+        }
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_observes_queries_per_view(self):
+        count = self.sample('request_queries_count', view='list_all_splits')
+        total = self.sample('request_queries_sum', view='list_all_splits')
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('list_all_splits'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.sample('request_queries_count', view='list_all_splits'), count + 1)
+        self.assertEqual(self.sample('request_queries_sum', view='list_all_splits'), total + len(captured))
+        self.assertGreater(self.sample('request_db_seconds_sum', view='list_all_splits'), 0)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_observes_gateway_time(self, mock_create):
+        def slow_charge(params, idempotency_key):
+            time.sleep(0.02)
+            return MagicMock(id='pi_slow', status='succeeded')
+        mock_create.side_effect = slow_charge
+        before = self.sample('request_gateway_seconds_sum', view='create_split')
+
+        response = self.client.post(reverse('create_split'), self.payment, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertGreaterEqual(self.sample('request_gateway_seconds_sum', view='create_split') - before, 0.02)
+
+    def test_logs_requests_over_budget_with_sql(self):
+        exceeded = self.sample('request_budget_exceeded_total', view='get_split_rules', budget='queries')
+
+        with self.settings(REQUEST_BUDGETS={'get_split_rules': {'queries': 0, 'total_ms': 60_000}}):
+            with self.assertLogs('src.profiling', level='WARNING') as logs:
+                self.client.get(reverse('get_split_rules', args=["prod_budget"]))
+
+        self.assertIn("Request budget exceeded (queries)", logs.output[0])
+        self.assertIn('"src_splitrule"', logs.output[0])
+        self.assertEqual(
+            self.sample('request_budget_exceeded_total', view='get_split_rules', budget='queries'), exceeded + 1
+        )
+
+    def test_requests_within_budget_are_not_logged(self):
+        with self.settings(REQUEST_BUDGETS={'get_split_rules': {'queries': 5, 'total_ms': 60_000}}):
+            with self.assertNoLogs('src.profiling', level='WARNING'):
+                self.client.get(reverse('get_split_rules', args=["prod_budget"]))
+
+    def test_batch_gateway_calls_count_towards_the_request(self):
+        items = [dict(self.payment, product_id=f"prod_batch_{index}") for index in range(3)]
+
+        with profile_request() as profile:
+            PaymentProcessor(gateway=FakeGateway(latency=0.01)).process_batch(items, max_workers=3)
+
+        self.assertGreaterEqual(profile.gateway_time, 0.03)
+        self.assertGreater(profile.queries, 0)
+
+    async def test_async_pipeline_is_profiled(self):
+        with profile_request() as profile:
+            await AsyncPaymentProcessor(gateway=FakeGateway(latency=0.01)).process_payment(self.payment)
+
+        self.assertGreaterEqual(profile.gateway_time, 0.01)
+        self.assertGreater(profile.queries, 0)
+
+
+class LoggingPipelineTest(TestCase):
+    def setUp(self):
+        self.written, self.writer_threads = [], set()
+        self.release = threading.Event()
+        self.release.set()
+
+        class Target(logging.Handler):
+            def emit(target, record):
+                self.release.wait(5)
+                self.written.append(record)
+                self.writer_threads.add(threading.get_ident())
+
+        self.target = Target()
+        self.target.name = 'test_target'
+        logging._handlers[self.target.name] = self.target
+        self.addCleanup(logging._handlers.pop, self.target.name, None)
+
+    def handler(self, **kwargs):
+        handler = QueueLogHandler(handlers=[self.target.name], **kwargs)
+        self.addCleanup(handler.close)
+        return handler
+
+    def record(self, name='src.test', level=logging.INFO, msg='message %s', args=(1,), **extra):
+        record = logging.LogRecord(name, level, __file__, 0, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_records_are_written_by_the_listener(self):
+        handler = self.handler()
+
+        handler.handle(self.record(order_id=7))
+        handler.flush()
+
+        self.assertEqual(len(self.written), 1)
+        self.assertEqual(self.written[0].getMessage(), 'message 1')
+        self.assertEqual(self.written[0].order_id, 7)
+        self.assertNotIn(threading.get_ident(), self.writer_threads)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        self.release.clear()
+        handler = self.handler(maxsize=1)
+
+        started = time.perf_counter()
+        for _ in range(5):
+            handler.handle(self.record())
+        elapsed = time.perf_counter() - started
+        self.release.set()
+        handler.flush()
+
+        self.assertLess(elapsed, 1)
+        self.assertGreater(handler.dropped, 0)
+        self.assertEqual(len(self.written) + handler.dropped, 5)
+
+    def test_close_drains_the_queue(self):
+        handler = QueueLogHandler(handlers=[self.target.name])
+        for _ in range(100):
+            handler.handle(self.record())
+
+        handler.close()
+
+        self.assertEqual(len(self.written), 100)
+
+    def test_unknown_handler_is_deferred_by_dict_config(self):
+        with self.assertRaisesMessage(ValueError, "target not configured yet"):
+            QueueLogHandler(handlers=['missing'])
+
+    def test_sampling_filter(self):
+        sampling = SamplingFilter({'django.db.backends': 0})
+
+        self.assertFalse(sampling.filter(self.record('django.db.backends', logging.DEBUG)))
+        self.assertFalse(sampling.filter(self.record('django.db.backends.schema', logging.DEBUG)))
+        self.assertTrue(sampling.filter(self.record('django.db.backends', logging.WARNING)))
+        self.assertTrue(sampling.filter(self.record('django.request', logging.DEBUG)))
+        self.assertTrue(SamplingFilter({'django.db.backends': 1}).filter(self.record('django.db.backends', logging.DEBUG)))
+
+
+class AsyncPaymentPipelineTest(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.valid_data = {
+            "product_id": "prod_async",
+            "product_name": "Test Product",
+            "amount": 150.0,
+            "payment_method_id": "pm_card_visa",
+            "user_id": "user_creator",
+        }
+        idempotency_store.cache.clear()
+
+    @patch('src.gateways.FakeGateway.acreate_payment', new_callable=AsyncMock)
+    async def test_async_process_payment(self, mock_create_async):
+        mock_create_async.return_value = MagicMock(id='pi_async', status='succeeded')
+
+        order = await AsyncPaymentProcessor().process_payment(self.valid_data)
+
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(order.stripe_payment_id, 'pi_async')
+        self.assertEqual(await SplitRule.objects.filter(order=order).acount(), 2)
+
+    @patch('src.gateways.FakeGateway.acreate_payment', new_callable=AsyncMock)
+    async def test_async_process_payment_loads_configuration_off_the_loop(self, mock_create_async):
+        mock_create_async.return_value = MagicMock(id='pi_async', status='succeeded')
+        await SplitConfiguration.objects.acreate(recipient_id="platform_v2", fee_percentage=Decimal("10.00"),
+                                                 effective_from=timezone.now() - timedelta(days=1))
+        # Cold cache, then a version bump: both reload the index with a query
+        split_configuration.clear()
+        self.addCleanup(split_configuration.clear)
+
+        first = await AsyncPaymentProcessor().process_payment(self.valid_data)
+        version_key = split_configuration.version_key
+        split_configuration.cache.set(version_key, split_configuration.cache.get(version_key, 0) + 1)
+        second = await AsyncPaymentProcessor().process_payment(self.valid_data)
+
+        for order in (first, second):
+            self.assertEqual(order.status, Order.COMPLETED)
+            fee = await SplitRule.objects.aget(order=order, recipient_id="platform_v2")
+            self.assertEqual(fee.amount, Decimal("15.00"))
+
+    @patch('src.gateways.FakeGateway.acreate_payment', new_callable=AsyncMock)
+    async def test_async_process_payment_gateway_error(self, mock_create_async):
+        mock_create_async.side_effect = Exception("Stripe API error")
+
+        with self.assertRaises(Exception):
+            await AsyncPaymentProcessor().process_payment(self.valid_data)
+
+        order = await Order.objects.aget(product_id='prod_async')
+        self.assertEqual(order.status, Order.FAILED)
+
+    @patch('src.gateways.FakeGateway.acreate_payment', new_callable=AsyncMock)
+    async def test_async_view_replays_idempotency_key(self, mock_create_async):
+        mock_create_async.return_value = MagicMock(id='pi_async', status='succeeded')
+
+        responses = []
+        for _ in range(2):
+            request = self.factory.post(
+                '/api/v1/splits/', self.valid_data, content_type='application/json',
+                headers={'Idempotency-Key': 'async-key'},
+            )
+            responses.append(await AsyncSplitPaymentView.create_split_payment(request))
+
+        self.assertEqual(mock_create_async.call_count, 1)
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(json.loads(responses[0].content), json.loads(responses[1].content))
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+
+    @patch('src.gateways.FakeGateway.acreate_payment', new_callable=AsyncMock)
+    async def test_async_view_accepts_unknown_outcome(self, mock_create_async):
+        mock_create_async.side_effect = GatewayError("read timeout")
+
+        responses = []
+        for _ in range(2):
+            request = self.factory.post(
+                '/api/v1/splits/', self.valid_data, content_type='application/json',
+                headers={'Idempotency-Key': 'async-pending'},
+            )
+            responses.append(await AsyncSplitPaymentView.create_split_payment(request))
+            await Order.objects.aupdate(status=Order.COMPLETED)
+
+        order = await Order.objects.aget()
+        bodies = [json.loads(response.content) for response in responses]
+        self.assertEqual(mock_create_async.call_count, 1)
+        self.assertEqual([r.status_code for r in responses], [202, 201])
+        self.assertEqual([body['order_id'] for body in bodies], [order.id, order.id])
+        self.assertEqual([body['status'] for body in bodies], [Order.PROCESSING, Order.COMPLETED])
+
+    @patch('src.gateways.FakeGateway.acreate_payment', new_callable=AsyncMock)
+    async def test_async_batch_partial_failure(self, mock_create_async):
+        async def charge(params, idempotency_key):
+            if params['payment_method'] == 'pm_card_declined':
+                raise Exception("Your card was declined")
+            return MagicMock(id='pi_async', status='succeeded')
+
+        mock_create_async.side_effect = charge
+        orders = [self.valid_data, dict(self.valid_data, payment_method_id='pm_card_declined'), {}]
+        request = self.factory.post('/api/v1/splits/batch/', {"orders": orders}, content_type='application/json')
+
+        response = await AsyncSplitPaymentView.create_split_payments_batch(request)
+
+        body = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r["status"] for r in body["results"]], [Order.COMPLETED, Order.FAILED, Order.FAILED])
+
+
+class IdempotencyKeyAPITest(APITestCase):
+    def setUp(self):
+        self.url = reverse('create_split')
+        self.valid_data = {
+            "product_id": "prod_abc123",
+            "product_name": "Test Product",
+            "amount": 150.0,
+            "payment_method_id": "pm_card_visa",
+            "user_id": "user_creator",
+        }
+        idempotency_store.cache.clear()
+
+    @patch('src.views.PaymentProcessor.process_payment')
+    def test_replayed_key_returns_stored_response(self, mock_process):
+        mock_process.return_value = MagicMock(id=42, status=Order.COMPLETED)
+
+        first = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        idempotency_store.cache.clear()  # force the replay through the database
+        second = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(mock_process.call_count, 1)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    @patch('src.views.PaymentProcessor.process_payment')
+    def test_key_reused_with_different_payload(self, mock_process):
+        mock_process.return_value = MagicMock(id=42, status=Order.COMPLETED)
+
+        self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        other_data = dict(self.valid_data, amount=99.0)
+        response = self.client.post(self.url, other_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(mock_process.call_count, 1)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_unknown_outcome_is_accepted_and_resolved_on_replay(self, mock_create):
+        mock_create.side_effect = GatewayError("read timeout")
+
+        first = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        order = Order.objects.get()
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(first.data['order_id'], order.id)
+        self.assertEqual(first.data['status'], Order.PROCESSING)
+
+        still_pending = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(still_pending.status_code, status.HTTP_202_ACCEPTED)
+
+        # recover_stale_orders found the charge
+        Order.objects.filter(pk=order.pk).update(status=Order.COMPLETED)
+        resolved = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(mock_create.call_count, 1)
+        self.assertEqual(resolved.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resolved.data['order_id'], order.id)
+        self.assertEqual(resolved.data['status'], Order.COMPLETED)
+        self.assertEqual(resolved['Idempotent-Replayed'], 'true')
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_server_errors_are_not_stored(self, mock_create):
+        mock_create.side_effect = [GatewayUnavailable("circuit open"), MagicMock(id='pi_123', status='succeeded')]
+
+        first = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(first.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        second = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', second)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_stale_key_takeover_resumes_the_crashed_order(self, mock_create):
+        mock_create.side_effect = lambda params, idempotency_key: MagicMock(id=f'pi_{idempotency_key}', status='succeeded')
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            key='key-1', request_fingerprint=request_fingerprint(self.valid_data), locked_at=now, expires_at=now + timedelta(days=1),
+        )
+        # The first owner charges the card and dies before phase 3
+        with patch.object(PaymentProcessor, '_complete_order', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                PaymentProcessor().process_payment(dict(self.valid_data, user_account_info={}, split_rules=None), 'key-1')
+        order = Order.objects.get()
+        self.assertEqual(IdempotencyKey.objects.get().order_id, order.pk)
+
+        IdempotencyKey.objects.update(locked_at=now - timedelta(hours=1))
+        response = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['order_id'], order.pk)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(order.split_rules.count(), 2)
+        self.assertEqual({call.args[1] for call in mock_create.call_args_list}, {f'order-{order.pk}'})
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.COMPLETED)
+        self.assertEqual(order.stripe_payment_id, f'pi_order-{order.pk}')
+
+    @patch('src.views.PaymentProcessor.process_payment')
+    def test_replayed_pending_response_of_a_removed_order(self, mock_process):
+        mock_process.side_effect = PaymentPending(Order(id=42, status=Order.PROCESSING), GatewayError("read timeout"))
+
+        first = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        replayed = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(replayed.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(replayed.data, first.data)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+
+    @patch('src.views.PaymentProcessor.process_payment')
+    def test_expired_key_is_executed_again(self, mock_process):
+        mock_process.return_value = MagicMock(id=42, status=Order.COMPLETED)
+
+        self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        idempotency_store.cache.clear()
+        response = self.client.post(self.url, self.valid_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(mock_process.call_count, 2)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.order_data = {
+            'product_id': 'prod_outbox',
+            'product_name': 'Test Product',
+            'payment_method_id': 'pm_card_visa',
+            'amount': 100.0,
+            'user_id': 'user_creator',
+        }
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_payment_events_recorded_in_outbox(self, mock_stripe_create):
+        mock_stripe_create.return_value = MagicMock(id='pi_123', status='succeeded')
+
+        order = PaymentProcessor().process_payment(self.order_data)
+
+        events = {event.event_type: event.payload for event in OutboxEvent.objects.all()}
+        self.assertEqual(set(events), {"payment_processed", "payout_triggered"})
+        self.assertEqual(events["payment_processed"]["order_id"], order.id)
+        self.assertEqual(len(events["payout_triggered"]["split_rules"]), 2)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_batch_events_inserted_in_bulk(self, mock_stripe_create):
+        mock_stripe_create.return_value = MagicMock(id='pi_123', status='succeeded')
+
+        with CaptureQueriesContext(connection) as queries:
+            PaymentProcessor().process_batch([self.order_data] * 5, max_workers=1)
+
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "src_outboxevent"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(OutboxEvent.objects.count(), 10)
+
+    def test_worker_delivers_pending_events(self):
+        outbox.publish("payment_processed", {"order_id": 1, "product_id": "p", "amount": "10.00", "stripe_payment_id": "pi_1"})
+        outbox.publish("payment_failed", {"order_id": None, "error": "boom"})
+
+        with self.assertLogs('src.events', level='INFO') as logs:
+            call_command('run_outbox_worker', '--once', '--concurrency', '1', stdout=io.StringIO())
+
+        self.assertFalse(OutboxEvent.objects.exclude(status=OutboxEvent.DONE).exists())
+        self.assertIn("Payment processed for order 1", logs.output[0])
+
+    def test_failed_event_retried_with_backoff_then_dead(self):
+        handler = MagicMock(side_effect=RuntimeError("payout provider down"))
+        event = outbox.publish("flaky", {})
+        worker = OutboxWorker(max_attempts=2, retry_base=60)
+
+        with patch.dict(outbox._handlers, {"flaky": handler}):
+            self.assertEqual(worker.process_batch(), 1)
+            event.refresh_from_db()
+            self.assertEqual(event.status, OutboxEvent.PENDING)
+            self.assertEqual(event.last_error, "payout provider down")
+            self.assertGreater(event.available_at, timezone.now() + timedelta(seconds=20))
+
+            # Not claimable until the backoff expires
+            self.assertEqual(worker.process_batch(), 0)
+            OutboxEvent.objects.filter(pk=event.pk).update(available_at=timezone.now())
+            worker.process_batch()
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.DEAD)
+        self.assertEqual(event.attempts, 2)
+        self.assertEqual(handler.call_count, 2)
+
+
+class IdempotencyStoreTest(TransactionTestCase):
+    def test_concurrent_duplicates_execute_once(self):
+        store = IdempotencyStore()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_request():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 201, {"order_id": 1}
+
+        results = []
+
+        def run():
+            try:
+                results.append(store.execute('key-concurrent', 'fingerprint', slow_request))
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=run)
+        first.start()
+        started.wait(5)
+        duplicates = [threading.Thread(target=run) for _ in range(3)]
+        for thread in duplicates:
+            thread.start()
+        release.set()
+        for thread in [first] + duplicates:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(sorted(replayed for replayed, _, _ in results), [False, True, True, True])
+
+
+class OrderExportTest(APITestCase):
+    def setUp(self):
+        self.url = reverse('export_splits')
+        self.completed = Order.objects.create(
+            product_id="prod_export", product_name="Produto Ação", amount=Decimal('150.00'), status=Order.COMPLETED
+        )
+        SplitRule.objects.create(
+            order=self.completed, recipient_id="user_creator", type=SplitRule.PERCENTAGE,
+            value=Decimal('95.00'), account_info={"bank": "001"}
+        )
+        SplitRule.objects.create(
+            order=self.completed, recipient_id="cakto_fee_account", type=SplitRule.PERCENTAGE,
+            value=Decimal('5.00')
+        )
+        self.failed = Order.objects.create(
+            product_id="prod_other", product_name="Other", amount=Decimal('10.00'), status=Order.FAILED
+        )
+
+    def test_export_ndjson(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['order_id'] for row in rows], [self.completed.id, self.failed.id])
+        self.assertEqual(rows[0]['amount'], '150.00')
+        self.assertEqual(rows[0]['product_name'], 'Produto Ação')
+        self.assertEqual([rule['value'] for rule in rows[0]['split_rules']], ['95.00', '5.00'])
+        self.assertEqual(rows[1]['split_rules'], [])
+
+    def test_export_csv_with_filters(self):
+        response = self.client.get(self.url, {'output': 'csv', 'status': Order.COMPLETED})
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['order_id'] for row in rows}, {str(self.completed.id)})
+        self.assertEqual(rows[0]['recipient_id'], 'user_creator')
+        self.assertEqual(json.loads(rows[0]['account_info']), {"bank": "001"})
+
+    def test_export_date_range(self):
+        Order.objects.filter(pk=self.failed.pk).update(created_at=timezone.now() - timedelta(days=10))
+        today = timezone.localdate().isoformat()
+
+        response = self.client.get(self.url, {'created_from': today, 'created_to': today})
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [self.completed.id])
+
+    def test_export_invalid_params(self):
+        self.assertEqual(self.client.get(self.url, {'output': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'created_from': 'yesterday'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_export_orders_command(self):
+        out = io.StringIO()
+        call_command('export_orders', '--product-id', 'prod_other', stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [self.failed.id])
+
+
+class OrderExportASGITest(TransactionTestCase):
+    """PAYMENT_PIPELINE=async serves the export through configs.asgi."""
+
+    def test_export_streams_in_chunks_over_asgi(self):
+        Order.objects.bulk_create([
+            Order(product_id=f"prod_{i}", product_name="Stream", amount=Decimal('1.00')) for i in range(12)
+        ])
+        pulled, pulled_at_first_body, bodies = [], [], []
+        ndjson_lines = exports.ndjson_lines
+
+        def counting_lines(rows):
+            for line in ndjson_lines(rows):
+                pulled.append(line)
+                yield line
+
+        requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()  # the client never disconnects
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                if not bodies:
+                    pulled_at_first_body.append(len(pulled))
+                bodies.append(message["body"])
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": reverse('export_splits'), "query_string": b"",
+            "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+        }
+        with patch('src.exports.DEFAULT_CHUNK_SIZE', 5), patch('src.exports.ndjson_lines', counting_lines):
+            async_to_sync(ASGIHandler())(scope, receive, send)
+
+        rows = [json.loads(line) for line in b''.join(bodies).decode().splitlines()]
+        self.assertEqual(len(rows), 12)
+        # Only the first chunk was read when the first bytes went out
+        self.assertEqual(pulled_at_first_body, [5])
+
+
+class ReplayWorkloadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        order = Order.objects.create(product_id="prod_replay", product_name="Test Product", amount=Decimal('10.00'))
+        SplitRule.objects.create(order=order, recipient_id="recipient_a", type=SplitRule.PERCENTAGE, value=100)
+
+    def replay(self, *entries, args=()):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as workload:
+            workload.write("\n".join(json.dumps(entry) for entry in entries))
+        self.addCleanup(os.unlink, workload.name)
+        out = io.StringIO()
+        call_command('replay_workload', workload.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_endpoints_and_plans(self):
+        report = self.replay(
+            {"path": reverse('list_all_splits'), "params": {"page_size": 10}},
+            {"path": reverse('get_split_rules', args=["PROD_REPLAY"])},
+            {"request_id": "not-a-request", "title": "skipped"},
+            args=('--repeat', '2'),
+        )
+
+        self.assertIn("Replayed 4 requests (1 skipped lines, 0 writes skipped)", report)
+        self.assertRegex(report, r"GET list_all_splits: 2 req, .* \[200x2\]")
+        self.assertRegex(report, r"GET get_split_rules: 2 req, .* \[200x2\]")
+        self.assertIn('FROM "src_splitrule"', report)
+        self.assertRegex(report, r"order_product_upper_id_idx|src_order_\w+_upper_id_idx")
+
+    @override_settings(PAYMENT_GATEWAY='stripe')
+    def test_writes_skipped_unless_allowed_and_rolled_back(self):
+        payment = {"method": "POST", "path": reverse('create_split'), "body": {
+            "product_id": "prod_replay", "product_name": "Test Product", "amount": 10.0,
+            "payment_method_id": "pm_card_visa", "user_id": "user_creator",
+        }}
+        lookup = {"path": reverse('get_split_rules', args=["PROD_REPLAY"])}
+
+        report = self.replay(payment, lookup)
+        self.assertIn("Replayed 1 requests (0 skipped lines, 1 writes skipped)", report)
+        self.assertNotIn("create_split", report)
+
+        with patch('src.gateways.StripeGateway.create_payment') as stripe_create:
+            report = self.replay(payment, lookup, args=('--allow-writes',))
+
+        # Charged through the fake gateway, and nothing kept
+        stripe_create.assert_not_called()
+        self.assertRegex(report, r"POST create_split: 1 req, .* \[201x1\]")
+        self.assertEqual(Order.objects.count(), 1)
+        # Not even the lookup cached from the rolled-back order
+        self.assertIsNone(split_rules_cache.cache.get(split_rules_cache.key("prod_replay")))
+        self.assertEqual(split_rules_cache.alias, 'default')
+        self.assertEqual(self.client.get(lookup["path"]).data["split_rules"][0]["recipient_id"], "recipient_a")
+
+    def test_failed_explain_does_not_abort_the_replay(self):
+        explain_query_prefix = connection.ops.explain_query_prefix
+        prefixes = iter(["EXPLAIN NOT VALID SQL"])
+
+        def first_explain_fails(**options):
+            return next(prefixes, None) or explain_query_prefix(**options)
+
+        with patch.object(connection.ops, 'explain_query_prefix', side_effect=first_explain_fails):
+            report = self.replay(
+                {"path": reverse('get_split_rules', args=["PROD_REPLAY"])},
+                {"path": reverse('list_all_splits'), "params": {"page_size": 10}},
+            )
+
+        self.assertEqual(report.count("EXPLAIN failed"), 1)
+        self.assertRegex(report, r"order_product_upper_id_idx|src_order_\w+_upper_id_idx|src_order")
+
+    def test_invalid_workload(self):
+        with self.assertRaises(CommandError):
+            self.replay({"title": "no path"})
+        with self.assertRaises(CommandError):
+            call_command('replay_workload', '/nonexistent/workload.jsonl')
+
+
+class SplitEngineTest(TestCase):
+    def test_to_cents_avoids_float_truncation(self):
+        self.assertEqual(to_cents(0.29), 29)
+        self.assertEqual(to_cents("19.99"), 1999)
+        self.assertEqual(to_cents(Decimal("150")), 15000)
+
+    def test_remainder_goes_to_largest_fraction(self):
+        rules = [Rule("user", SplitRule.PERCENTAGE, 95), Rule("cakto", SplitRule.PERCENTAGE, 5)]
+        self.assertEqual(compute_split(10001, rules), [9501, 500])
+
+        thirds = [Rule(f"r{i}", SplitRule.PERCENTAGE, value) for i, value in enumerate(["33.33", "33.33", "33.34"])]
+        self.assertEqual(compute_split(100, thirds), [33, 33, 34])
+
+    def test_ties_broken_by_rule_order(self):
+        halves = [Rule("a", SplitRule.PERCENTAGE, 50), Rule("b", SplitRule.PERCENTAGE, 50)]
+        self.assertEqual(compute_split(101, halves), [51, 50])
+
+    def test_fixed_rules_paid_before_percentages(self):
+        rules = [
+            Rule("shipping", SplitRule.FIXED, "10.00"),
+            Rule("a", SplitRule.PERCENTAGE, 50),
+            Rule("b", SplitRule.PERCENTAGE, 50),
+        ]
+        self.assertEqual(compute_split(10000, rules), [1000, 4500, 4500])
+        self.assertEqual(compute_split(3000, [Rule("a", SplitRule.FIXED, 10), Rule("b", SplitRule.FIXED, 20)]), [1000, 2000])
+
+    def test_invalid_rule_sets(self):
+        with self.assertRaisesMessage(SplitError, "sum to 100%"):
+            compute_split(10000, [Rule("a", SplitRule.PERCENTAGE, 90)])
+        with self.assertRaisesMessage(SplitError, "exceed"):
+            compute_split(1000, [Rule("a", SplitRule.FIXED, 20), Rule("b", SplitRule.PERCENTAGE, 100)])
+        with self.assertRaisesMessage(SplitError, "sum to the order amount"):
+            compute_split(1000, [Rule("a", SplitRule.FIXED, 5)])
+        with self.assertRaisesMessage(SplitError, "2 decimal places"):
+            compute_split(1000, [Rule("a", SplitRule.PERCENTAGE, "99.999")])
+
+    def test_batch_matches_single_order(self):
+        import random
+        rng = random.Random(42)
+        amounts, fixed, bps, expected = [], [], [], []
+        for _ in range(500):
+            amount = rng.randint(100, 10_000_000)
+            fixed_cents = rng.randint(0, amount // 2) if rng.random() < 0.5 else 0
+            cut = sorted(rng.randint(0, 10_000) for _ in range(2))
+            row_bps = [0, cut[0], cut[1] - cut[0], 10_000 - cut[1]]
+            rules = [Rule("fixed", SplitRule.FIXED, Decimal(fixed_cents) / 100)] + [
+                Rule(f"r{i}", SplitRule.PERCENTAGE, Decimal(points) / 100) for i, points in enumerate(row_bps[1:])
+            ]
+            amounts.append(amount)
+            fixed.append([fixed_cents, 0, 0, 0])
+            bps.append([to_basis_points(rule.value) if rule.type == SplitRule.PERCENTAGE else 0 for rule in rules])
+            expected.append(compute_split(amount, rules))
+
+        result = compute_splits_batch(amounts, fixed, bps)
+
+        self.assertEqual(result.tolist(), expected)
+        self.assertEqual(result.sum(axis=1).tolist(), amounts)
+
+    def test_compute_splits_pads_rule_sets_of_any_length(self):
+        rule_sets = [
+            [Rule("user", SplitRule.PERCENTAGE, 95), Rule("cakto", SplitRule.PERCENTAGE, 5)],
+            [Rule(f"r{i}", SplitRule.PERCENTAGE, value) for i, value in enumerate(["33.33", "33.33", "33.34"])],
+            [Rule("fee", SplitRule.FIXED, "0.99"), Rule("a", SplitRule.PERCENTAGE, 50), Rule("b", SplitRule.PERCENTAGE, 50)],
+            [Rule("only", SplitRule.FIXED, "12.34")],
+        ]
+        amounts = [10001, 100, 1000, 1234]
+
+        self.assertEqual(
+            compute_splits(amounts, rule_sets),
+            [compute_split(amount, rules) for amount, rules in zip(amounts, rule_sets)],
+        )
+        self.assertEqual(compute_splits([], []), [])
+        with self.assertRaises(SplitError):
+            compute_splits([1000, 1000], [rule_sets[0], [Rule("half", SplitRule.PERCENTAGE, 50)]])
+
+    def test_batch_rejects_invalid_rows(self):
+        with self.assertRaisesMessage(SplitError, "first at index 1"):
+            compute_splits_batch([1000, 1000], [[0, 0], [0, 0]], [[5000, 5000], [5000, 4000]])
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_process_payment_with_custom_rules(self, mock_stripe_create):
+        mock_stripe_create.return_value = MagicMock(id='pi_123', status='succeeded')
+
+        order = PaymentProcessor().process_payment({
+            'product_id': 'prod_custom',
+            'product_name': 'Test Product',
+            'payment_method_id': 'pm_card_visa',
+            'amount': '100.01',
+            'user_id': 'user_creator',
+            'split_rules': [
+                {'recipient_id': 'shipping', 'type': SplitRule.FIXED, 'value': '10.00'},
+                {'recipient_id': 'creator', 'type': SplitRule.PERCENTAGE, 'value': 60},
+                {'recipient_id': 'affiliate', 'type': SplitRule.PERCENTAGE, 'value': 35},
+            ],
+        })
+
+        amounts = dict(order.split_rules.values_list('recipient_id', 'amount'))
+        self.assertEqual(amounts, {
+            'shipping': Decimal('10.00'),
+            'creator': Decimal('54.01'),
+            'affiliate': Decimal('31.50'),
+            PaymentProcessor.CAKTO_RECIPIENT_ID: Decimal('4.50'),
+        })
+        self.assertEqual(mock_stripe_create.call_args.args[0]['amount'], 10001)
+
+    def test_process_payment_rejects_rules_not_summing_to_100(self):
+        with self.assertRaisesMessage(ValueError, "sum to 100%"):
+            PaymentProcessor().process_payment({
+                'product_id': 'prod_custom',
+                'product_name': 'Test Product',
+                'payment_method_id': 'pm_card_visa',
+                'amount': 100,
+                'user_id': 'user_creator',
+                'split_rules': [{'recipient_id': 'creator', 'type': SplitRule.PERCENTAGE, 'value': 100}],
+            })
+        self.assertFalse(Order.objects.exists())
+
+
+class SplitConfigurationTest(TestCase):
+    def setUp(self):
+        split_configuration.clear()
+        self.addCleanup(split_configuration.clear)
+        self.now = timezone.now()
+        self.order_data = {
+            'product_id': 'prod_config',
+            'product_name': 'Test Product',
+            'payment_method_id': 'pm_card_visa',
+            'amount': 200,
+            'user_id': 'user_creator',
+        }
+
+    def config(self, recipient_id, fee, starts_in_days, ends_in_days=None):
+        return SplitConfiguration(
+            pk=len(recipient_id),
+            recipient_id=recipient_id,
+            fee_percentage=Decimal(fee),
+            effective_from=self.now + timedelta(days=starts_in_days),
+            effective_until=self.now + timedelta(days=ends_in_days) if ends_in_days is not None else None,
+        )
+
+    def test_index_resolves_overlapping_periods(self):
+        index = ConfigurationIndex([
+            self.config("base", "5.00", -30),
+            self.config("promo", "2.50", -5, 5),
+            self.config("next", "4.00", 10),
+        ])
+
+        self.assertIsNone(index.at(self.now - timedelta(days=31)))
+        self.assertEqual(index.at(self.now - timedelta(days=10)), FeeConfiguration("base", Decimal("5.00")))
+        self.assertEqual(index.at(self.now), FeeConfiguration("promo", Decimal("2.50")))
+        self.assertEqual(index.at(self.now + timedelta(days=5)), FeeConfiguration("base", Decimal("5.00")))
+        self.assertEqual(index.at(self.now + timedelta(days=365)), FeeConfiguration("next", Decimal("4.00")))
+
+    def test_defaults_without_configuration(self):
+        rules = PaymentProcessor()._split_rule_specs(self.order_data)
+        self.assertEqual(rules[-1]["recipient_id"], PaymentProcessor.CAKTO_RECIPIENT_ID)
+        self.assertEqual(rules[-1]["value"], PaymentProcessor.CAKTO_FEE_PERCENTAGE)
+
+    @patch('src.gateways.FakeGateway.create_payment')
+    def test_payment_uses_cached_configuration(self, mock_stripe_create):
+        mock_stripe_create.return_value = MagicMock(id='pi_123', status='succeeded')
+        with self.captureOnCommitCallbacks(execute=True):
+            SplitConfiguration.objects.create(recipient_id="platform_v2", fee_percentage=Decimal("7.50"),
+                                              effective_from=self.now - timedelta(days=1))
+        split_configuration.current()
+
+        with CaptureQueriesContext(connection) as queries:
+            order = PaymentProcessor().process_payment(self.order_data)
+
+        self.assertFalse(any('src_splitconfiguration' in query['sql'] for query in queries))
+        amounts = dict(order.split_rules.values_list('recipient_id', 'amount'))
+        self.assertEqual(amounts, {'user_creator': Decimal('185.00'), 'platform_v2': Decimal('15.00')})
+
+    def test_saving_configuration_bumps_version(self):
+        other_process = SplitConfigurationCache()
+        self.assertIsNone(other_process.current())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            config = SplitConfiguration.objects.create(recipient_id="platform_v2", fee_percentage=Decimal("6.00"),
+                                                       effective_from=self.now - timedelta(days=1))
+        self.assertEqual(other_process.current(), FeeConfiguration("platform_v2", Decimal("6.00")))
+
+        with CaptureQueriesContext(connection) as queries:
+            other_process.current()
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            config.is_active = False
+            config.save()
+        self.assertIsNone(other_process.current())
+
+
+class SettlementTest(TestCase):
+    def setUp(self):
+        for index in range(5):
+            self.create_order(Order.COMPLETED, [("seller_a", "60.00"), ("seller_b", "35.00"), ("cakto", "5.00")])
+        self.create_order(Order.FAILED, [("seller_a", "95.00"), ("cakto", "5.00")])
+        self.create_order(Order.PROCESSING, [("seller_b", "95.00"), ("cakto", "5.00")])
+
+    def create_order(self, order_status, rules):
+        order = Order.objects.create(product_id="prod_settle", product_name="Test Product",
+                                     amount=Decimal("100.00"), status=order_status)
+        SplitRule.objects.bulk_create([
+            SplitRule(order=order, recipient_id=recipient_id, type=SplitRule.PERCENTAGE,
+                      value=Decimal(amount), amount=Decimal(amount))
+            for recipient_id, amount in rules
+        ])
+        return order
+
+    def payout_totals(self, run):
+        return dict(run.payouts.values_list("recipient_id", "amount"))
+
+    def test_aggregates_completed_rules_per_recipient(self):
+        run = SettlementProcessor(chunk_size=4).settle()
+
+        self.assertEqual(run.status, SettlementRun.COMPLETED)
+        self.assertEqual(run.rules_settled, 15)
+        self.assertEqual(self.payout_totals(run), {
+            "seller_a": Decimal("300.00"),
+            "seller_b": Decimal("175.00"),
+            "cakto": Decimal("25.00"),
+        })
+        self.assertEqual(run.payouts.get(recipient_id="seller_a").item_count, 5)
+        self.assertEqual(PayoutItem.objects.count(), 15)
+        self.assertEqual(SplitRule.objects.filter(settled_at__isnull=True).count(), 4)
+
+    def test_rules_are_never_settled_twice(self):
+        SettlementProcessor().settle()
+        Order.objects.filter(status=Order.PROCESSING).update(status=Order.COMPLETED)
+
+        second = SettlementProcessor().settle()
+
+        self.assertEqual(self.payout_totals(second), {"seller_b": Decimal("95.00"), "cakto": Decimal("5.00")})
+        self.assertEqual(PayoutItem.objects.count(), 17)
+        # One payout per recipient and run, still to be paid
+        self.assertEqual(Payout.objects.count(), 5)
+        self.assertEqual(set(Payout.objects.values_list("status", flat=True)), {Payout.PENDING})
+
+    def test_window_end_excludes_later_rules(self):
+        SplitRule.objects.filter(recipient_id="seller_b").update(effective_date=timezone.now() + timedelta(days=1))
+
+        run = SettlementProcessor().settle(window_end=timezone.now())
+
+        self.assertNotIn("seller_b", self.payout_totals(run))
+
+    def test_resumes_after_crash(self):
+        processor = SettlementProcessor(chunk_size=3)
+        run = processor.start_run(timezone.now())
+        processor.settle_chunk(run.pk)
+
+        original = SettlementProcessor.settle_chunk
+        calls = []
+
+        def crash_on_second_chunk(self, run_id):
+            calls.append(run_id)
+            if len(calls) == 2:
+                raise RuntimeError("worker killed")
+            return original(self, run_id)
+
+        with patch.object(SettlementProcessor, "settle_chunk", crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                processor.settle()
+
+        out = io.StringIO()
+        call_command("settle_payouts", "--chunk-size", "3", stdout=out)
+
+        run.refresh_from_db()
+        self.assertIn(f"Resuming settlement run {run.pk}", out.getvalue())
+        self.assertEqual(run.status, SettlementRun.COMPLETED)
+        self.assertEqual(SettlementRun.objects.count(), 1)
+        self.assertEqual(run.rules_settled, 15)
+        self.assertEqual(self.payout_totals(run)["seller_a"], Decimal("300.00"))
+        # The resumed run adds to the payouts of the chunk settled before the crash
+        self.assertEqual(Payout.objects.count(), 3)
+        self.assertEqual(
+            {payout.recipient_id: payout.item_count for payout in Payout.objects.all()},
+            {"seller_a": 5, "seller_b": 5, "cakto": 5},
+        )
+
+
+class RecipientEarningsTest(APITestCase):
+    def complete_order(self, amounts, status=Order.COMPLETED):
+        order = Order.objects.create(
+            product_id="prod_earnings", product_name="Test Product", amount=sum(amounts.values()), status=status
+        )
+        rules = SplitRule.objects.bulk_create([
+            SplitRule(order=order, recipient_id=recipient_id, type=SplitRule.FIXED, value=amount, amount=amount)
+            for recipient_id, amount in amounts.items()
+        ])
+        if status == Order.COMPLETED:
+            payout_triggered.send(sender=self.__class__, order=order, split_rules=rules)
+        return order
+
+    def earnings(self):
+        return {
+            (row.recipient_id, row.day): (row.total, row.split_count)
+            for row in RecipientDailyEarning.objects.all()
+        }
+
+    def test_outbox_updates_rollup_once(self):
+        self.complete_order({"seller": Decimal("95.00"), "cakto": Decimal("5.00")})
+        self.complete_order({"seller": Decimal("47.50"), "cakto": Decimal("2.50")})
+        OutboxWorker().process_batch()
+
+        today = timezone.localdate()
+        self.assertEqual(self.earnings(), {
+            ("seller", today): (Decimal("142.50"), 2),
+            ("cakto", today): (Decimal("7.50"), 2),
+        })
+
+        # At-least-once delivery: a redelivered event is not counted again
+        OutboxEvent.objects.update(status=OutboxEvent.PENDING, available_at=timezone.now())
+        OutboxWorker().process_batch()
+        self.assertEqual(self.earnings()[("seller", today)], (Decimal("142.50"), 2))
+
+    def test_rebuild_matches_incremental(self):
+        self.complete_order({"seller": Decimal("95.00"), "cakto": Decimal("5.00")})
+        self.complete_order({"seller": Decimal("10.00")}, status=Order.FAILED)
+        OutboxWorker().process_batch()
+        incremental = self.earnings()
+
+        RecipientDailyEarning.objects.update(total=0)
+        out = io.StringIO()
+        call_command('rebuild_recipient_earnings', stdout=out)
+
+        self.assertIn("Rebuilt 2 recipient-day rows", out.getvalue())
+        self.assertEqual(self.earnings(), incremental)
+
+    def test_rebuild_skips_pending_events(self):
+        self.complete_order({"seller": Decimal("95.00")})
+        rebuild_earnings()
+        OutboxWorker().process_batch()
+
+        self.assertEqual(self.earnings(), {("seller", timezone.localdate()): (Decimal("95.00"), 1)})
+
+    def test_balance_and_daily_endpoints(self):
+        today = timezone.localdate()
+        RecipientDailyEarning.objects.bulk_create([
+            RecipientDailyEarning(recipient_id="seller", day=today - timedelta(days=days), total=Decimal("10.00"), split_count=2)
+            for days in (0, 1, 40)
+        ])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('recipient_balance', args=["seller"]))
+        self.assertEqual(response.data['total'], Decimal("30.00"))
+        self.assertEqual(response.data['split_count'], 6)
+        self.assertEqual(response.data['first_day'], today - timedelta(days=40))
+
+        response = self.client.get(reverse('recipient_daily_earnings', args=["seller"]))
+        self.assertEqual([day['day'] for day in response.data['days']], [today - timedelta(days=1), today])
+
+        response = self.client.get(reverse('recipient_balance', args=["seller"]), {'from': today.isoformat()})
+        self.assertEqual(response.data['total'], Decimal("10.00"))
+
+        response = self.client.get(reverse('recipient_balance', args=["nobody"]))
+        self.assertEqual(response.data['total'], Decimal("0.00"))
+
+    def test_daily_invalid_range(self):
+        url = reverse('recipient_daily_earnings', args=["seller"])
+        self.assertEqual(self.client.get(url, {'from': 'yesterday'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'from': '2026-02-01', 'to': '2026-01-01'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'from': '2020-01-01', 'to': '2026-01-01'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class ListAllModeTest(APITestCase):
+    ACCOUNT_INFOS = [
+        {},
+        {"bank": "001", "holder": "João \"Zé\" \\ Silva", "tabs": "a\tb\n\u0001", "line": "x\u2028y"},
+        {"nested": {"b": [1, 2.5, 1.0, -0.25, True, None, "s"], "a": {}}, "big": 12345678901234567890},
+        {"floats": [1.50, 1e-05, 1.5e-07, 1e+16, 1234567890123456.7, 1000000000000000.5, -1500000000000000.0]},
+        [],
+    ]
+
+    def setUp(self):
+        cache.clear()
+        for index, account_info in enumerate(self.ACCOUNT_INFOS):
+            order = Order.objects.create(
+                product_id=f"prod_{index}", product_name="Produto \u00e9 \"especial\"\u2029", amount=Decimal('1234.50')
+            )
+            SplitRule.objects.create(order=order, recipient_id=f"r_{index}", type=SplitRule.PERCENTAGE,
+                                     value=Decimal('33.33'), amount=None if index % 2 else Decimal('0.10'),
+                                     account_info=account_info)
+            SplitRule.objects.create(order=order, recipient_id="cakto", type=SplitRule.FIXED,
+                                     value=Decimal('5.00'), amount=Decimal('5.00'))
+        # Whole-second dates are rendered without a fraction
+        SplitRule.objects.filter(recipient_id="cakto").update(
+            effective_date=timezone.now().replace(microsecond=0) + timedelta(seconds=1)
+        )
+        Order.objects.create(product_id="prod_without_rules", product_name="", amount=Decimal('0.01'))
+
+    def get(self, mode, **params):
+        with self.settings(LIST_ALL_MODE=mode):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('list_all_splits'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_modes_fall_back_to_rows_without_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('Falls back only on other backends')
+        expected, _ = self.get('rows')
+        for mode in ('json_agg', 'prebuilt'):
+            self.assertEqual(self.get(mode)[0].content, expected.content)
+
+    def test_unknown_mode(self):
+        with self.settings(LIST_ALL_MODE='jsonb'):
+            with self.assertRaises(ValueError):
+                self.client.get(reverse('list_all_splits'))
+
+    def test_prebuilt_results_with_indent(self):
+        with patch('src.views.page_results', return_value=PrebuiltJSON(['{"order_id":1,"amount":"1.50"}'])):
+            compact = self.client.get(reverse('list_all_splits'), {'count': 'false'})
+            indented = self.client.get(reverse('list_all_splits'), {'count': 'false'},
+                                       HTTP_ACCEPT='application/json; indent=2')
+
+        self.assertTrue(compact.content.endswith(b',"results":[{"order_id":1,"amount":"1.50"}]}'))
+        self.assertEqual(json.loads(indented.content)['results'], [{"order_id": 1, "amount": "1.50"}])
+        self.assertIn(b'\n  "results": [', indented.content)
+
+    @skipUnless(connection.vendor == 'postgresql', 'json_agg requires PostgreSQL')
+    def test_sql_modes_are_byte_identical(self):
+        expected, rows_queries = self.get('rows', count='false')
+        self.assertEqual(rows_queries, 2)
+
+        for mode in ('json_agg', 'prebuilt'):
+            with self.subTest(mode=mode):
+                response, queries = self.get(mode, count='false')
+                self.assertEqual(queries, 1)
+                self.assertEqual(response.content, expected.content)
+
+    @skipUnless(connection.vendor == 'postgresql', 'json_agg requires PostgreSQL')
+    def test_sql_modes_paginate_and_filter_like_rows(self):
+        created_from = (timezone.now() - timedelta(days=1)).date().isoformat()
+        for params in ({'page_size': 2}, {'page': 2, 'page_size': 3}, {'created_from': created_from}):
+            expected, _ = self.get('rows', **params)
+            for mode in ('json_agg', 'prebuilt'):
+                with self.subTest(mode=mode, params=params):
+                    self.assertEqual(self.get(mode, **params)[0].content, expected.content)
+
+        # The cursor links are the same, and so is the page they lead to
+        next_url = self.get('rows', page_size=2)[0].json()['next']
+        pages = {}
+        for mode in ('rows', 'prebuilt'):
+            with self.settings(LIST_ALL_MODE=mode):
+                pages[mode] = self.client.get(next_url).content
+        self.assertEqual(pages['prebuilt'], pages['rows'])
+
+
+
+class DatabasePoolMetricsTest(TestCase):
+    def sample(self, name):
+        return REGISTRY.get_sample_value(name, {'alias': 'default'})
+
+    def test_reports_saturation_of_open_pools(self):
+        pool = MagicMock()
+        pool.get_stats.return_value = {
+            'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1,
+            'requests_waiting': 0, 'requests_num': 120, 'requests_wait_ms': 1500,
+        }
+
+        with patch('src.metrics._open_pools', return_value=[('default', pool)]):
+            self.assertEqual(self.sample('db_pool_size'), 4)
+            self.assertEqual(self.sample('db_pool_in_use'), 3)
+            self.assertEqual(self.sample('db_pool_saturation'), 0.3)
+            self.assertEqual(self.sample('db_pool_requests_total'), 120)
+            self.assertEqual(self.sample('db_pool_wait_seconds_total'), 1.5)
+            # Counters psycopg has not reported yet
+            self.assertEqual(self.sample('db_pool_timeouts_total'), 0)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Connection pooling requires PostgreSQL')
+    def test_scrape_does_not_open_a_pool(self):
+        pools = type(connections['default'])._connection_pools
+        with patch.dict(pools, clear=True), patch.dict(connection.settings_dict['OPTIONS'], {'pool': {'min_size': 1}}):
+            self.assertIsNone(self.sample('db_pool_size'))
+            self.assertEqual(pools, {})
+
+    @skipUnless(connection.vendor == 'postgresql', 'Connection pooling requires PostgreSQL')
+    def test_reads_psycopg_pool_stats(self):
+        from psycopg_pool import ConnectionPool
+
+        pool = ConnectionPool(kwargs=connection.get_connection_params(), min_size=1, max_size=2, open=True)
+        self.addCleanup(pool.close)
+        pool.wait()
+
+        with patch('src.metrics._open_pools', return_value=[('default', pool)]):
+            with pool.connection():
+                self.assertEqual(self.sample('db_pool_in_use'), 1)
+                self.assertEqual(self.sample('db_pool_saturation'), 0.5)
+            self.assertEqual(self.sample('db_pool_in_use'), 0)
+            self.assertEqual(self.sample('db_pool_requests_total'), 1)
+
+
+
+class GunicornConfigTest(TestCase):
+    def load(self, cpus=4, **env):
+        import importlib
+        from configs import gunicorn
+
+        self.addCleanup(importlib.reload, gunicorn)
+        with patch.dict(os.environ, env), patch('os.sched_getaffinity', return_value=set(range(cpus)), create=True):
+            return importlib.reload(gunicorn)
+
+    def test_workers_scale_with_cpus(self):
+        self.assertEqual(self.load(cpus=4).workers, 5)
+        self.assertEqual(self.load(cpus=16).workers, 17)
+        self.assertEqual(self.load(cpus=16, GUNICORN_WORKERS='3', GUNICORN_THREADS='2').threads, 2)
+
+    def test_serves_asgi_with_the_async_pipeline(self):
+        sync = self.load(PAYMENT_PIPELINE='sync')
+        self.assertEqual((sync.wsgi_app, sync.worker_class), ('configs.wsgi:application', 'gthread'))
+        async_config = self.load(PAYMENT_PIPELINE='async')
+        self.assertEqual(async_config.wsgi_app, 'configs.asgi:application')
+        self.assertEqual(async_config.worker_class, 'uvicorn_worker.UvicornWorker')
+
+
+
+class ApiProfileTest(APITestCase):
+    def test_settings_leave_out_the_apps_the_api_does_not_use(self):
+        from configs import settings_api
+
+        for app in ('django.contrib.admin', 'django.contrib.sessions', 'drf_yasg', 'log_hub'):
+            self.assertNotIn(app, settings_api.INSTALLED_APPS)
+        self.assertIn('src', settings_api.INSTALLED_APPS)
+        self.assertNotIn('django.contrib.sessions.middleware.SessionMiddleware', settings_api.MIDDLEWARE)
+        self.assertEqual(settings_api.ROOT_URLCONF, 'configs.urls_api')
+
+    @override_settings(ROOT_URLCONF='configs.urls_api')
+    def test_urls_serve_the_api_without_swagger_or_admin(self):
+        self.assertEqual(self.client.get(reverse('list_all_splits')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+        for path in ('/admin/', '/logs/', '/swagger.json'):
+            self.assertEqual(self.client.get(path).status_code, status.HTTP_404_NOT_FOUND, path)
+
+    def test_schema_annotations_are_inert_without_drf_yasg(self):
+        import importlib
+        from src import schema
+
+        self.addCleanup(importlib.reload, schema)
+        with self.modify_settings(INSTALLED_APPS={'remove': ['drf_yasg']}):
+            importlib.reload(schema)
+
+        def view(request):
+            pass
+
+        decorated = schema.swagger_auto_schema(
+            method='get', manual_parameters=[schema.openapi.Parameter('from', schema.openapi.IN_QUERY)],
+        )(view)
+        self.assertIs(decorated, view)
+
+    def test_preload_gateway_imports_the_client_libraries(self):
+        with patch('src.gateways.importlib.import_module') as import_module:
+            with self.settings(PAYMENT_GATEWAY='stripe'):
+                preload_gateway()
+            self.assertEqual([call.args[0] for call in import_module.call_args_list], ['httpx', 'requests', 'stripe'])
+
+            import_module.reset_mock()
+            with self.settings(PAYMENT_GATEWAY='fake'):
+                preload_gateway()
+            import_module.assert_not_called()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Table partitioning requires PostgreSQL')
+class PartitioningTest(TestCase):
+    def setUp(self):
+        self.current = month_start(timezone.now())
+
+    def create_order(self, created_at):
+        order = Order.objects.create(product_id="prod_partition", product_name="Test Product", amount=Decimal('10.00'))
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def create_rule(self, order, effective_date):
+        rule = SplitRule.objects.create(order=order, recipient_id="recipient_partition", type=SplitRule.PERCENTAGE,
+                                        value=Decimal('100.00'), amount=order.amount)
+        SplitRule.objects.filter(pk=rule.pk).update(effective_date=effective_date)
+        return rule
+
+    def partition_of(self, order):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM src_order WHERE id = %s', [order.pk])
+            return cursor.fetchone()[0]
+
+    def test_tables_are_partitioned_by_month(self):
+        for table in PARTITIONED_TABLES:
+            self.assertTrue(is_partitioned(connection, table))
+            self.assertIn(self.current, monthly_partitions(connection, table))
+
+        order = self.create_order(timezone.now())
+        self.assertEqual(self.partition_of(order), partition_name("src_order", self.current))
+
+    def test_new_partition_takes_rows_from_default(self):
+        month = add_months(self.current, 12)
+        order = self.create_order(month_bounds(month)[0] + timedelta(days=3))
+        self.assertEqual(self.partition_of(order), "src_order_default")
+
+        call_command('manage_partitions', '--months-ahead', '12', stdout=io.StringIO())
+
+        self.assertEqual(self.partition_of(order), partition_name("src_order", month))
+        self.assertTrue(Order.objects.filter(pk=order.pk).exists())
+
+    def test_old_partitions_detached(self):
+        old_month = add_months(self.current, -24)
+        order = self.create_order(month_bounds(old_month)[0])
+        create_partition(connection, "src_order", old_month)
+
+        plan = Order.objects.filter(created_at__gte=month_bounds(self.current)[0]).explain()
+        self.assertNotIn(partition_name("src_order", old_month), plan)
+
+        call_command('manage_partitions', '--retain-months', '12', '--drop', stdout=io.StringIO())
+
+        self.assertNotIn(old_month, monthly_partitions(connection, "src_order"))
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+        self.assertIn(self.current, monthly_partitions(connection, "src_order"))
+
+    def test_split_rules_detached_with_their_order_month(self):
+        old_month, next_month = add_months(self.current, -24), add_months(self.current, -23)
+        for table in PARTITIONED_TABLES:
+            for month in (old_month, next_month):
+                create_partition(connection, table, month)
+        month_end = month_bounds(old_month)[1]
+        # Created in the last second of the month, its rule in the next one
+        late_order = self.create_order(month_end - timedelta(seconds=1))
+        late_rule = self.create_rule(late_order, month_end)
+        next_order = self.create_order(month_end + timedelta(days=1))
+        next_rule = self.create_rule(next_order, month_end + timedelta(days=1))
+
+        call_command('manage_partitions', '--retain-months', '23', '--archive-schema', 'archive_test',
+                     stdout=io.StringIO())
+
+        self.assertNotIn(old_month, monthly_partitions(connection, "src_splitrule"))
+        self.assertIn(next_month, monthly_partitions(connection, "src_splitrule"))
+        self.assertEqual(list(SplitRule.objects.values_list('pk', flat=True)), [next_rule.pk])
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [next_order.pk])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id, order_id FROM archive_test.{partition_name("src_splitrule", old_month)}')
+            self.assertEqual(cursor.fetchall(), [(late_rule.pk, late_order.pk)])
+
+
 class SplitRuleModelTest(TestCase):
     def test_split_rule_creation(self):
         order = Order.objects.create(
@@ -252,6 +2207,18 @@ class SplitRuleModelTest(TestCase):
 
 
 class OrderModelTest(TestCase):
+    def test_latest_for_product_uses_index(self):
+        queryset = Order.objects.latest_for_product("prod_abc123")
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tiny test tables would otherwise always be seq-scanned
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+        plan = queryset.explain()
+
+        # On partitioned PostgreSQL tables each partition has its own copy
+        self.assertRegex(plan, r"order_product_upper_id_idx|src_order_\w+_upper_id_idx")
+
     def test_order_creation(self):
         order = Order.objects.create(
             product_id="test_product",
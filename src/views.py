@@ -1,13 +1,33 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.renderers import BrowsableAPIRenderer
 
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-
-from .services import PaymentProcessor
+from .schema import openapi, swagger_auto_schema
+from .gateways import GatewayUnavailable
+from .services import AsyncPaymentProcessor, PaymentPending, PaymentProcessor
 from .models import Order
+from .cache import etag_matches, split_rules_cache
+from .earnings import daily_earnings, parse_day, recipient_balance
+from .exports import CONTENT_TYPES, EXPORT_FORMATS, aexport_lines, export_lines, filter_orders
+from .idempotency import (
+    IdempotencyConflict,
+    IdempotencyInProgress,
+    idempotency_store,
+    request_fingerprint,
+)
+from .listing import list_all_mode, page_queryset, page_results
+from .renderers import FastJSONRenderer
 
 
 class LargeResultsSetPagination(PageNumberPagination):
@@ -16,11 +36,203 @@ class LargeResultsSetPagination(PageNumberPagination):
     max_page_size = 1000  # Maximum limit
 
 
+class KeysetPagination(CursorPagination):
+    """Cursor pagination keyed on the primary key.
+
+    Each page is a ``WHERE id > cursor ORDER BY id LIMIT n`` range scan, so
+    latency does not grow with depth and rows never shift between pages.
+    The total ``count`` is included unless the client passes ``count=false``.
+    """
+    page_size = 100  # Default page size
+    page_size_query_param = 'page_size'
+    max_page_size = 1000  # Maximum limit
+    ordering = 'id'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        include_count = request.query_params.get(self.count_query_param, 'true').lower()
+        self.count = queryset.count() if include_count not in ('false', '0') else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response_data = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response_data = {'count': self.count, **response_data}
+        return Response(response_data)
+
+
+def _order_data_from_payload(data):
+    # Order info
+    return {
+        "product_id": data["product_id"],
+        "product_name": data.get("product_name", ""),
+        "amount": data.get("amount"),
+        "payment_method_id": data.get("payment_method_id"),
+        "user_id": data.get("user_id"),  # required for recipient
+        "user_account_info": data.get("user_account_info", {}),
+        "split_rules": data.get("split_rules"),  # optional, defaults to 95% for user_id
+    }
+
+
+def _payment_response(order):
+    if order.status == Order.COMPLETED:
+        return status.HTTP_201_CREATED, {
+            "order_id": order.id,
+            "status": order.status,
+            "message": "Payment processed successfully"
+        }
+    if order.status == Order.FAILED:
+        return status.HTTP_400_BAD_REQUEST, {
+            "order_id": order.id,
+            "status": order.status,
+            "error": "Payment not confirmed by the gateway"
+        }
+    # Outcome unknown (e.g. gateway timeout): recover_stale_orders resolves it
+    return status.HTTP_202_ACCEPTED, {
+        "order_id": order.id,
+        "status": order.status,
+        "message": "Payment is being confirmed with the gateway; retry with the same Idempotency-Key for the outcome"
+    }
+
+
+def _error_response(error):
+    if isinstance(error, PaymentPending):
+        return _payment_response(error.order)
+    if isinstance(error, GatewayUnavailable):
+        # Never sent to the gateway; not stored under the Idempotency-Key
+        return status.HTTP_503_SERVICE_UNAVAILABLE, {"error": str(error)}
+    return status.HTTP_400_BAD_REQUEST, {"error": str(error)}
+
+
+def _replayed_response(status_code, body):
+    """A stored 202 is re-resolved against the order's current status."""
+    if status_code != status.HTTP_202_ACCEPTED:
+        return status_code, body
+    try:
+        order = Order.objects.only("status").get(pk=body["order_id"])
+    except Order.DoesNotExist:
+        # Deleted or in a detached partition: the stored answer is all we have
+        return status_code, body
+    return _payment_response(order)
+
+
+async def _aprocess_split_payment(data, idempotency_key=None):
+    try:
+        order_data = _order_data_from_payload(data)
+        order = await AsyncPaymentProcessor().process_payment(order_data, idempotency_key)
+
+        return _payment_response(order)
+
+    except Exception as e:
+        return _error_response(e)
+
+
+def _process_split_payment(request, idempotency_key=None):
+    try:
+        order_data = _order_data_from_payload(request.data)
+
+        processor = PaymentProcessor()
+        order = processor.process_payment(order_data, idempotency_key)
+
+        return _payment_response(order)
+
+    except Exception as e:
+        return _error_response(e)
+
+
+def _parse_batch(data):
+    """Split a batch payload into ``(index, order_data)`` pairs and per-item
+    errors; raises ValueError when the envelope itself is invalid."""
+    try:
+        payloads = data["orders"]
+    except Exception:
+        raise ValueError("Field 'orders' is required")
+
+    if not isinstance(payloads, list) or not payloads:
+        raise ValueError("Field 'orders' must be a non-empty list")
+
+    if len(payloads) > settings.PAYMENT_BATCH_MAX_SIZE:
+        raise ValueError(f"At most {settings.PAYMENT_BATCH_MAX_SIZE} orders per batch")
+
+    accepted, rejected = [], []
+    for index, payload in enumerate(payloads):
+        try:
+            accepted.append((index, _order_data_from_payload(payload)))
+        except Exception as e:
+            rejected.append({"index": index, "status": Order.FAILED, "error": str(e)})
+
+    return accepted, rejected
+
+
+def _load_split_rules(product_id):
+    """Split rules of the latest order for the product, or None."""
+    # Latest order for the product and its splits in a single round trip
+    rows = list(
+        Order.objects.filter(pk__in=Order.objects.latest_for_product(product_id).values("pk"))
+        .values(
+            "product_id",
+            "split_rules__recipient_id",
+            "split_rules__type",
+            "split_rules__value",
+            "split_rules__amount",
+            "split_rules__account_info",
+        )
+        .order_by("split_rules__id")
+    )
+    if not rows:
+        return None
+
+    # Build a list of dicts
+    rules_data = [
+        {
+            "recipient_id": row["split_rules__recipient_id"],
+            "type": row["split_rules__type"],
+            "value": row["split_rules__value"],
+            "amount": row["split_rules__amount"],
+            "account_info": row["split_rules__account_info"]
+        }
+        for row in rows
+        if row["split_rules__recipient_id"] is not None
+    ]
+
+    return {
+        "product_id": rows[0]["product_id"],
+        "split_rules": rules_data
+    }
+
+
+def _batch_response(accepted, rejected, processed):
+    for (index, _), result in zip(accepted, processed):
+        result["index"] = index
+    results = sorted(rejected + processed, key=lambda result: result["index"])
+
+    failed = sum(1 for result in results if result["status"] == Order.FAILED)
+
+    return status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED, {
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
+
+
 class SplitPaymentView:
 
     @swagger_auto_schema(
         method="post",
         operation_description="Cria um pagamento com regras de split",
+        manual_parameters=[
+            openapi.Parameter(
+                "Idempotency-Key",
+                openapi.IN_HEADER,
+                type=openapi.TYPE_STRING,
+                required=False,
+                description="Chave única por pagamento; retentativas com a mesma chave retornam a resposta original",
+            ),
+        ],
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
@@ -30,91 +242,290 @@ class SplitPaymentView:
                 "payment_method_id": openapi.Schema(type=openapi.TYPE_STRING, description="Stripe Payment Method ID"),
                 "user_id": openapi.Schema(type=openapi.TYPE_STRING, description="ID do usuário recebedor"),
                 "user_account_info": openapi.Schema(type=openapi.TYPE_OBJECT, description="Dados da conta do usuário"),
+                "split_rules": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description="Opcional: [{recipient_id, type (percentage|fixed), value, account_info}]; "
+                                "os fixos saem primeiro e os percentuais, somados à taxa de 5%, devem fechar 100%",
+                ),
             },
             required=["product_id", "amount", "payment_method_id", "user_id"],
         ),
         responses={
             201: openapi.Response("Pagamento criado com sucesso"),
+            202: openapi.Response("Resultado da cobrança ainda desconhecido; o pedido segue em processing"),
             400: "Erro de validação ou processamento",
+            409: "Requisição com a mesma Idempotency-Key ainda em processamento",
+            422: "Idempotency-Key reutilizada com outro payload",
+            503: "Gateway de pagamento indisponível (circuit breaker aberto)",
         }
     )    
 
     @api_view(['POST'])
     def create_split_payment(request):
-        try:
-            data = request.data
-
-            # Order info
-            order_data = {
-                "product_id": data["product_id"],
-                "product_name": data.get("product_name", ""),
-                "amount": data.get("amount"),
-                "payment_method_id": data.get("payment_method_id"),
-                "user_id": data.get("user_id"),  # required for recipient
-                "user_account_info": data.get("user_account_info", {})
-            }
-
-            processor = PaymentProcessor()
-            order = processor.process_payment(order_data)
-
-            return Response({
-                "order_id": order.id,
-                "status": order.status,
-                "message": "Payment processed successfully"
-            }, status=status.HTTP_201_CREATED)
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if not idempotency_key:
+            status_code, body = _process_split_payment(request)
+            return Response(body, status=status_code)
 
+        if len(idempotency_key) > 255:
+            return Response({"error": "Idempotency-Key must be at most 255 characters"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            fingerprint = request_fingerprint(request.data)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            replayed, status_code, body = idempotency_store.execute(
+                idempotency_key, fingerprint, lambda: _process_split_payment(request, idempotency_key)
+            )
+        except IdempotencyConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except IdempotencyInProgress as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        if replayed:
+            status_code, body = _replayed_response(status_code, body)
+        response = Response(body, status=status_code)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
+
+    @swagger_auto_schema(
+        method="post",
+        operation_description="Processa vários pagamentos com split em uma única requisição",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "orders": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description="Lista de pedidos no mesmo formato de POST /api/v1/splits/",
+                ),
+            },
+            required=["orders"],
+        ),
+        responses={
+            201: openapi.Response("Todos os pagamentos foram processados"),
+            207: openapi.Response("Processamento parcial; veja o status de cada item"),
+            400: "Payload inválido",
+        }
+    )
+
+    @api_view(['POST'])
+    def create_split_payments_batch(request):
+        try:
+            accepted, rejected = _parse_batch(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        processed = PaymentProcessor().process_batch([order_data for _, order_data in accepted])
+
+        status_code, body = _batch_response(accepted, rejected, processed)
+        return Response(body, status=status_code)
+
     @api_view(['GET'])
+    @renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
     def get_split_rules(request, product_id):
-        order = Order.objects.filter(product_id__iexact=product_id).first()
-        if not order:
+        entry = split_rules_cache.get_or_load(product_id, _load_split_rules)
+        if entry is None:
             return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        split_rules = order.split_rules.all()
-        
-        # Build a list of dicts
-        rules_data = [
-            {
-                "recipient_id": rule.recipient_id,
-                "type": rule.type,
-                "value": float(rule.value),
-                "account_info": rule.account_info
-            }
-            for rule in split_rules
-        ]
-
-        return Response({
-            "product_id": order.product_id,
-            "split_rules": rules_data
-        }, status=status.HTTP_200_OK)
+        payload, etag = entry
+        # Polling clients revalidate with If-None-Match and get an empty 304
+        if etag_matches(etag, request.headers.get("If-None-Match")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(payload, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
 
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Lista todos os pagamentos com paginação por cursor",
+        manual_parameters=[
+            openapi.Parameter("cursor", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Cursor retornado em next/previous"),
+            openapi.Parameter("page_size", openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description="Itens por página (máximo 1000)"),
+            openapi.Parameter("count", openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description="Use false para omitir o total (evita o COUNT(*))"),
+            openapi.Parameter("page", openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description="Paginação por offset legada"),
+            openapi.Parameter("created_from", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Data/hora ISO inicial (inclusiva)"),
+            openapi.Parameter("created_to", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Data/hora ISO final (exclusiva; uma data inclui o dia inteiro)"),
+        ],
+    )
 
     @api_view(['GET'])
+    @renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
     def list_all(request):
-        orders = Order.objects.prefetch_related("split_rules").all()
-        paginator = LargeResultsSetPagination()
+        # Date filters let PostgreSQL skip the monthly partitions outside the range
+        created_from = request.query_params.get("created_from")
+        try:
+            orders = filter_orders(created_from=created_from, created_to=request.query_params.get("created_to"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        mode = list_all_mode()
+        orders = page_queryset(orders, mode, created_from)
+
+        # ?page=N keeps the legacy offset pagination for existing clients
+        if "page" in request.query_params:
+            paginator = LargeResultsSetPagination()
+        else:
+            paginator = KeysetPagination()
         page = paginator.paginate_queryset(orders, request)
 
-        data = []
-        for order in page:
-            rules_data = [
-                {
-                    "recipient_id": rule.recipient_id,
-                    "type": rule.type,
-                    "value": rule.value,
-                    "account_info": rule.account_info,
-                    "effective_date": rule.effective_date
-                }
-                for rule in order.split_rules.all()
-            ]
-            data.append({
-                "order_id": order.id,
-                "product_id": order.product_id,
-                "product_name": order.product_name,
-                "status": order.status,
-                "amount": order.amount,
-                "split_rules": rules_data
-            })
+        # Rows or database-built JSON, never model instances (src/listing.py)
+        data = page_results(page, mode, created_from)
         return paginator.get_paginated_response(data)
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Exporta pedidos e regras de split em streaming (NDJSON ou CSV)",
+        manual_parameters=[
+            openapi.Parameter("output", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=list(EXPORT_FORMATS), description="Formato de saída (padrão: ndjson)"),
+            openapi.Parameter("status", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter("product_id", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter("created_from", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Data/hora ISO inicial (inclusiva)"),
+            openapi.Parameter("created_to", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Data/hora ISO final (exclusiva; uma data inclui o dia inteiro)"),
+        ],
+    )
+
+    @api_view(['GET'])
+    def export(request):
+        params = request.query_params
+        export_format = params.get("output", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            orders = filter_orders(
+                status=params.get("status"),
+                product_id=params.get("product_id"),
+                created_from=params.get("created_from"),
+                created_to=params.get("created_to"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Under ASGI (PAYMENT_PIPELINE=async) a sync iterator would be read
+        # whole into memory before the first byte is sent
+        lines = aexport_lines if isinstance(request._request, ASGIRequest) else export_lines
+        response = StreamingHttpResponse(
+            lines(export_format, orders, created_from=params.get("created_from")),
+            content_type=CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="orders.{export_format}"'
+        return response
+
+
+def _day_range(params):
+    since, until = params.get("from"), params.get("to")
+    return (parse_day(since) if since else None, parse_day(until) if until else None)
+
+
+class RecipientEarningsView:
+    """Earnings per recipient, read from the RecipientDailyEarning rollup:
+    cost grows with the number of days, not of split rules."""
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Total recebido por um recipient (pedidos concluídos)",
+        manual_parameters=[
+            openapi.Parameter("from", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Dia inicial YYYY-MM-DD (inclusivo)"),
+            openapi.Parameter("to", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Dia final YYYY-MM-DD (inclusivo)"),
+        ],
+    )
+
+    @api_view(['GET'])
+    def balance(request, recipient_id):
+        try:
+            since, until = _day_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(recipient_balance(recipient_id, since, until))
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Recebimentos de um recipient por dia",
+        manual_parameters=[
+            openapi.Parameter("from", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Dia inicial YYYY-MM-DD (padrão: 30 dias antes de 'to')"),
+            openapi.Parameter("to", openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Dia final YYYY-MM-DD (padrão: hoje)"),
+        ],
+    )
+
+    @api_view(['GET'])
+    def daily(request, recipient_id):
+        try:
+            since, until = _day_range(request.query_params)
+            return Response(daily_earnings(recipient_id, since, until))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncSplitPaymentView:
+    """ASGI-native variants of the payment endpoints (PAYMENT_PIPELINE=async).
+
+    Same request and response formats as SplitPaymentView; the gateway
+    calls are awaited instead of pinning a worker thread.
+    """
+
+    @csrf_exempt
+    @require_POST
+    async def create_split_payment(request):
+        try:
+            data = json.loads(request.body)
+        except ValueError as e:
+            return JsonResponse({"error": f"JSON parse error - {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if not idempotency_key:
+            status_code, body = await _aprocess_split_payment(data)
+            return JsonResponse(body, status=status_code)
+
+        if len(idempotency_key) > 255:
+            return JsonResponse({"error": "Idempotency-Key must be at most 255 characters"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            replayed, status_code, body = await idempotency_store.aexecute(
+                idempotency_key, request_fingerprint(data), lambda: _aprocess_split_payment(data, idempotency_key)
+            )
+        except IdempotencyConflict as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except IdempotencyInProgress as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        if replayed:
+            status_code, body = await sync_to_async(_replayed_response)(status_code, body)
+        response = JsonResponse(body, status=status_code)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
+
+    @csrf_exempt
+    @require_POST
+    async def create_split_payments_batch(request):
+        try:
+            accepted, rejected = _parse_batch(json.loads(request.body))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        processed = await AsyncPaymentProcessor().process_batch([order_data for _, order_data in accepted])
+
+        status_code, body = _batch_response(accepted, rejected, processed)
+        return JsonResponse(body, status=status_code)